@@ -17,7 +17,9 @@ from bson import ObjectId
 from services.mcpServices.LLMs.Groq.ToolService import get_tool_service, ToolService
 from services.mcpServices.LLMs.Groq.GroqSerivce import get_groq_service, GroqService
 from services.mcpServices.LLMs.Groq.LoggerService import get_logger
-from services.mcpServices.LLMs.Groq.DatabaseService import get_database_service, DatabaseService
+from services.mcpServices.LLMs.Groq.DatabaseService import (
+    get_database_service, DatabaseService, start_database_service, close_database_service, mongo_pool_options
+)
 
 # Import routers directly
 from routes.report import router as report_router
@@ -38,12 +40,17 @@ from routes.mcp_router import router as mcp_router
 from routes.dynamic_audit import router as dynamic_audit_router
 # Import RAG router
 from rag.router import router as rag_router
+from rag.ingestion import check_single_worker, shutdown_ingestion_manager
 
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from fastapi_utils.tasks import repeat_every
 from services.auth import SessionManager
+from services.question_index import get_question_index
+from services.aggregation_queue import start_aggregation_queue, stop_aggregation_queue
+from services.ghgService import GHGService
+from services.name_index import ensure_name_keys
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -94,6 +101,7 @@ class MessageRequest(BaseModel):
 class ChatRequest(BaseModel):
     sessionId: str
     message: str
+    stream: bool = False  # Stream large query results as NDJSON pages
 
 
 def convert_objectid(obj):
@@ -107,6 +115,17 @@ def convert_objectid(obj):
         return {k: convert_objectid(v) for k, v in obj.items()}
     return obj
 
+async def stream_find_pages(tool_service: ToolService, find_spec):
+    """Documents of a large find as NDJSON, one {"page": n, "reply": [...]} line per page"""
+    try:
+        page_number = 0
+        async for page in tool_service.iter_find_pages(*find_spec):
+            page_number += 1
+            yield json.dumps({"page": page_number, "reply": convert_objectid(page)}) + "\n"
+    except Exception as e:
+        logger.error("Error streaming database query: %s", e)
+        yield json.dumps({"error": f"Error executing database query: {str(e)}"}) + "\n"
+
 @app.post("/api/chat")
 async def chat_endpoint(
     request: ChatRequest,
@@ -131,7 +150,10 @@ async def chat_endpoint(
             try:
                 if isinstance(result, str):
                     result = json.loads(result)
-                db_result = tool_service.db_call(result, user_prompt=request.message)
+                find_spec = tool_service.find_spec(result, user_prompt=request.message) if request.stream else None
+                if find_spec is not None:
+                    return StreamingResponse(stream_find_pages(tool_service, find_spec), media_type="application/x-ndjson")
+                db_result = await tool_service.db_call(result, user_prompt=request.message)
                 logger.info("Database query result: %s", db_result)
                 db_result = convert_objectid(db_result)
                 return JSONResponse({"reply": db_result})
@@ -152,7 +174,8 @@ async def chat_endpoint(
 # Database connection handler
 @app.on_event("startup")
 async def startup_db_client():
-    app.mongodb_client = AsyncIOMotorClient(MONGODB_URL)
+    check_single_worker()
+    app.mongodb_client = AsyncIOMotorClient(MONGODB_URL, **mongo_pool_options())
     app.mongodb = app.mongodb_client[DB_NAME]
     
     # Create indexes for Reports collection
@@ -191,6 +214,26 @@ async def startup_db_client():
     ], unique=True)
     app.mongodb.user_access.create_index("role")
 
+    # Uploads are looked up by content hash to skip re-indexing identical files
+    await app.mongodb.rag_files.create_index([("company_id", 1), ("content_hash", 1)])
+
+    # Create indexes for GHG reports and the ghg_totals view, and build the view if it is empty
+    ghg_service = GHGService(app.mongodb)
+    await ghg_service.create_indices()
+    await ghg_service.ensure_totals()
+
+    # Normalized company and plant names, looked up by the MCP chat tools
+    await ensure_name_keys(app.mongodb)
+
+    # Index moduleData.json once so requests never re-parse it
+    get_question_index()
+
+    # Roll plant answers up into C001 in the background
+    start_aggregation_queue(app.mongodb)
+
+    # The MCP chat tools share this client's connection pool
+    await start_database_service(app.mongodb_client)
+
 # Chatbot endpoints
 @app.get("/api/messages")
 async def get_messages():
@@ -293,6 +336,9 @@ app.add_middleware(
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await stop_aggregation_queue()
+    shutdown_ingestion_manager()
+    close_database_service()
     app.mongodb_client.close()
 
 # Root endpoint
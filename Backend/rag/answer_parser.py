@@ -0,0 +1,182 @@
+# Parsing of table-extraction answers
+#
+# Gemini answers one cell per line (or per JSON value) in free text such as
+# "95", "[Y]", "3. Male x Current Year: 1,204 t", "Nil" or "N.A.". Each value is
+# tokenized in one pass with precompiled patterns and normalized to Y, N, a
+# plain number, "0" for nil answers, or "" when nothing usable is found.
+# Numbers followed by a unit are converted to the row's unit with pint when
+# both units are known and compatible; a mismatch leaves the number as it is
+# and is reported as a warning.
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+try:
+    from pint import UnitRegistry
+except ImportError:
+    UnitRegistry = None  # If pint is not installed, skip unit conversion
+
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# One token per match, in a single left-to-right scan: a bracketed value, a
+# whole-word number (space or line start before it, space, % or line end after
+# it), any other number such as a "3." list marker, or a nil indicator.
+# Numbers capture the unit written right after them.
+NUMBER = r'\d[\d,]*(?:\.\d+)?'
+UNIT = r'(?:\s*(%|[A-Za-zµ°][\w²³/.\-]*))?'
+TOKEN_RE = re.compile(
+    # Only positions that can start a token are tried against the alternatives
+    r'(?=[\[\dnNzZ])'
+    r'(?:\[([^\]]+)\]'
+    rf'|(?<!\S)({NUMBER})(?=[\s%]|$){UNIT}'
+    rf'|({NUMBER}){UNIT}'
+    r'|(?i:\b(nil|zero|none)\b|(not applicable|n/a)))'
+)
+
+# Answers in the requested format are just the value, e.g. "95", "95%" or "1,204 t"
+VALUE_ONLY_RE = re.compile(rf'({NUMBER}){UNIT}')
+YES_VALUES = frozenset(['Y', 'YES'])
+NO_VALUES = frozenset(['N', 'NO', 'N.A.', 'NA'])
+
+# Spellings used in BRSR disclosures that pint does not know under that name
+UNIT_ALIASES = {
+    "t": "tonne", "mt": "tonne", "ton": "tonne", "tons": "tonne", "tonne": "tonne", "tonnes": "tonne",
+    "kl": "kiloliter", "kilolitre": "kiloliter", "kilolitres": "kiloliter", "kiloliters": "kiloliter",
+    "megalitres": "megaliter", "megaliters": "megaliter",
+    "gj": "GJ", "tj": "TJ", "mj": "MJ", "kwh": "kWh", "mwh": "MWh", "gwh": "GWh",
+    "kg": "kg", "g": "g", "kgs": "kg", "l": "liter", "litres": "liter", "liters": "liter",
+    "m3": "m**3", "%": "percent",
+}
+# Aliases whose case matters: "ML" is megaliters, "ml" or "mL" milliliters
+CASE_SENSITIVE_UNIT_ALIASES = {"ML": "megaliter"}
+
+
+# Words that follow numbers in prose and happen to be pint units ("in" is inches)
+NOT_UNITS = frozenset(['in', 'at', 'a', 'per', 'for', 'of', 'to', 'and', 'or', 'from', 'by', 'on'])
+
+
+class ParsedValue(NamedTuple):
+    value: str  # Y, N, a plain number, "0" for nil, or "" when nothing was found
+    warning: Optional[str] = None  # Set when a unit could not be converted to the row's unit
+
+
+def clean_html(text: str) -> str:
+    return HTML_TAG_RE.sub('', text or '')
+
+
+_ureg = None
+
+def get_unit_registry():
+    """pint registry, built on first use since loading its definitions is slow; None without pint"""
+    global _ureg
+    if _ureg is None and UnitRegistry is not None:
+        _ureg = UnitRegistry()
+    return _ureg
+
+
+def _unit_alias(text: str) -> str:
+    return CASE_SENSITIVE_UNIT_ALIASES.get(text) or UNIT_ALIASES.get(text.lower(), text)
+
+
+@lru_cache(maxsize=512)
+def _parse_unit(text: str):
+    ureg = get_unit_registry()
+    if ureg is None or not text:
+        return None
+    text = text.strip().rstrip('.')
+    if text.lower() in NOT_UNITS:
+        return None
+    name = _unit_alias(text)
+    # Rates such as "kg/year" or "tonnes/yr" are parsed part by part
+    parts = [_unit_alias(part.strip()) for part in name.split('/')]
+    try:
+        return ureg.parse_units(' / '.join(parts))
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=512)
+def _conversion_factor(source: str, target: str):
+    """Multiplier from source to target units; None if either is unknown, False if incompatible"""
+    source_units, target_units = _parse_unit(source), _parse_unit(target)
+    if source_units is None or target_units is None:
+        return None
+    if source_units == target_units:
+        return 1.0
+    try:
+        return (1 * source_units).to(target_units).magnitude
+    except Exception:
+        return False
+
+
+def _format_number(value: float) -> str:
+    text = format(round(value, 6), 'f')
+    return text.rstrip('0').rstrip('.') if '.' in text else text
+
+
+def _number_value(number: str, unit: str, target_unit: Optional[str]) -> ParsedValue:
+    number = number.replace(',', '')
+    if not unit or not target_unit:
+        return ParsedValue(number)
+    factor = _conversion_factor(unit, target_unit)
+    if factor is None or factor == 1.0:
+        # Unknown words after a number ("95 for men") are not units
+        return ParsedValue(number)
+    if factor is False:
+        return ParsedValue(number, f"'{number} {unit}' is not convertible to {target_unit}")
+    return ParsedValue(_format_number(float(number) * factor), f"Converted '{number} {unit}' to {target_unit}")
+
+
+def parse_answer_value(line: str, target_unit: Optional[str] = None) -> ParsedValue:
+    """
+    Normalize one extracted cell value. A bracketed value such as [95] wins;
+    otherwise Y/N answers, then the last number on the line (whole-word
+    numbers preferred over list markers like "3."), then nil indicators,
+    which count as "0". Numbers with a unit are converted to target_unit
+    when possible.
+    """
+    line = line.strip()
+    if not line:
+        return ParsedValue("")
+    upper = line.upper()
+    if upper in YES_VALUES:
+        return ParsedValue("Y")
+    if upper in NO_VALUES:
+        return ParsedValue("N")
+    value_only = VALUE_ONLY_RE.fullmatch(line)
+    if value_only:
+        return _number_value(*value_only.groups(), target_unit)
+
+    last_number = last_standalone = None
+    has_nil = False
+    for bracket, standalone, standalone_unit, number, unit, nil_word, nil_phrase in TOKEN_RE.findall(line):
+        if bracket:
+            return _parse_bracket(bracket, target_unit)
+        if standalone:
+            last_standalone = (standalone, standalone_unit)
+        elif number:
+            last_number = (number, unit)
+        else:
+            has_nil = True
+
+    number = last_standalone or last_number
+    if number is not None:
+        return _number_value(*number, target_unit)
+    return ParsedValue("0" if has_nil else "")
+
+
+def _parse_bracket(content: str, target_unit: Optional[str]) -> ParsedValue:
+    content = content.strip()
+    upper = content.upper()
+    if upper in YES_VALUES:
+        return ParsedValue("Y")
+    if upper in NO_VALUES:
+        return ParsedValue("N")
+    has_nil = False
+    for _, standalone, standalone_unit, number, unit, _, _ in TOKEN_RE.findall(content):
+        if standalone or number:
+            # Inside brackets the first number is the value
+            return _number_value(standalone or number, standalone_unit or unit, target_unit)
+        has_nil = True
+    return ParsedValue("0" if has_nil else "")
@@ -0,0 +1,342 @@
+# Background ingestion jobs for RAG uploads
+#
+# Parsing, embedding and indexing an upload is CPU-bound and can take tens of
+# seconds, so it runs in a process pool instead of on the event loop. Each
+# upload becomes a job with a status and progress that clients can poll; the
+# file is registered in rag_files only once its index is complete on disk.
+# Uploads are identified by the SHA-256 of their bytes: a file the company has
+# already indexed, or is indexing right now, resolves to that file_id.
+#
+# Jobs and the content reservations that deduplicate concurrent uploads live
+# in the memory of the server process that accepted the upload, so the API
+# must run as a single process (one uvicorn worker) for status polls and dedup
+# to see them; check_single_worker() refuses to start otherwise. A restart
+# forgets unfinished jobs.
+
+import os
+import uuid
+import time
+import hashlib
+import asyncio
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from .instrumentation import get_logger
+
+logger = get_logger("ingestion")
+
+INGEST_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "1"))
+INGEST_MAX_QUEUE = int(os.getenv("RAG_INGEST_MAX_QUEUE", "8"))  # Queued plus running jobs
+INGEST_JOB_HISTORY = int(os.getenv("RAG_INGEST_JOB_HISTORY", "200"))  # Finished jobs kept for status polls
+UPLOAD_READ_SIZE = 1024 * 1024
+
+
+class IngestionQueueFull(Exception):
+    """Raised when the ingestion queue is at capacity"""
+
+
+def check_single_worker():
+    """
+    Refuse to start when the server is configured with several worker
+    processes (WEB_CONCURRENCY, read by uvicorn and gunicorn): each would
+    keep its own jobs and reservations.
+    """
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or "1")
+    if workers > 1:
+        raise RuntimeError(
+            f"RAG ingestion keeps jobs in process memory and needs a single worker, got WEB_CONCURRENCY={workers}"
+        )
+
+
+async def save_upload(upload) -> Tuple[str, str]:
+    """
+    Copy an UploadFile to a temporary file in 1 MB reads, so neither the
+    server nor the worker holds the whole upload in memory. Returns the path
+    and the SHA-256 of the content, hashed along the way.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="rag_upload_", suffix=suffix)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                data = await upload.read(UPLOAD_READ_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+                f.write(data)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def _run_ingestion(job_id: str, upload_path: str, filename: str, file_id: str, company_id: str, progress) -> dict:
+    """Worker-process entry point: index the file into its company's store, publishing progress under job_id"""
+    from .rag_service import build_file_index
+
+    state = {}
+
+    def on_progress(fields):
+        state.update(fields)
+        # Manager dicts only see assignments, so publish a fresh copy each time
+        progress[job_id] = dict(state)
+
+    return build_file_index(upload_path, filename, file_id, company_id, on_progress=on_progress)
+
+
+class IngestionJob:
+    def __init__(self, filename: str, file_size: int, company_id: str, content_hash: str):
+        self.job_id = str(uuid.uuid4())
+        self.file_id = str(uuid.uuid4())
+        self.company_id = company_id
+        self.content_hash = content_hash
+        self.filename = filename
+        self.file_size = file_size
+        self.deduplicated = False  # Resolved to an already indexed file without running
+        self.status = "queued"  # queued -> running -> completed | failed
+        self.error = None
+        self.progress = {}
+        self.created_at = time.time()
+        self.finished_at = None
+        self.done = asyncio.Event()
+        self.accepted = asyncio.Event()  # Set once the job is queued, resolved as a duplicate or released
+        self.released = False  # Its reservation was given up before it was queued
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "status": self.status,
+            "deduplicated": self.deduplicated,
+            "error": self.error,
+            "progress": self.progress,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+
+class IngestionManager:
+    """Runs upload ingestion jobs in a bounded process pool and tracks their progress"""
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, max_queue: int = INGEST_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._jobs = OrderedDict()
+        self._active = 0
+        self._in_flight = {}  # (company_id, content_hash) -> reserved or unfinished job
+        self.uploads = 0
+        self.duplicate_uploads = 0
+        self.chunks_indexed = 0
+        self.chunks_reused = 0
+
+    def _ensure_pool(self):
+        if self._executor is None:
+            # Spawned workers start clean instead of inheriting the server's event loop and clients
+            context = multiprocessing.get_context("spawn")
+            self._manager = context.Manager()
+            self._progress = self._manager.dict()
+            self._executor = self._new_pool()
+            logger.info("Started ingestion pool with %d worker(s)", self.max_workers)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_broken_pool(self, executor: ProcessPoolExecutor):
+        """
+        Shut down a pool whose worker died (killed, out of memory), so the next
+        job starts a fresh one. Every job of the broken pool fails; only the
+        first to notice replaces it.
+        """
+        if self._executor is not executor:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_pool()
+        logger.warning("Ingestion worker died, restarted the pool with %d worker(s)", self.max_workers)
+
+    def is_full(self) -> bool:
+        return self._active >= self.max_queue
+
+    async def find_duplicate(self, filename: str, file_size: int, company_id: str, content_hash: str, db) -> Optional[IngestionJob]:
+        """
+        The job for an upload identical to one the company already made: the
+        unfinished job indexing it, or a completed job for the indexed file.
+        None if the content is new, in which case it stays reserved for this
+        upload until submit() or release(); identical uploads arriving
+        meanwhile wait for it. Counts towards the dedup hit rate.
+        """
+        from .rag_service import find_file_by_hash
+
+        self.uploads += 1
+        key = (company_id, content_hash)
+        job = self._in_flight.get(key)
+        while job is not None:
+            await job.accepted.wait()
+            if not job.released:
+                break
+            # The upload it was reserved for never got queued
+            job = self._in_flight.get(key)
+
+        if job is None:
+            # Reserve the content before the first await, so an identical upload arriving meanwhile finds it
+            job = IngestionJob(filename, file_size, company_id, content_hash)
+            self._in_flight[key] = job
+            try:
+                existing = await find_file_by_hash(company_id, content_hash, db)
+            except Exception:
+                self.release(job)
+                raise
+            if existing is None:
+                return None
+            del self._in_flight[key]
+            job.file_id = existing["_id"]
+            job.deduplicated = True
+            job.status = "completed"
+            job.finished_at = job.created_at
+            job.done.set()
+            job.accepted.set()
+            self._jobs[job.job_id] = job
+            self._forget_finished()
+        self.duplicate_uploads += 1
+        logger.info("Upload of %s is identical to file_id %s, skipping ingestion", filename, job.file_id)
+        return job
+
+    def release(self, job: IngestionJob):
+        """Give up the reservation find_duplicate made for an upload that will not be queued"""
+        if self._in_flight.get((job.company_id, job.content_hash)) is job:
+            del self._in_flight[(job.company_id, job.content_hash)]
+        job.released = True
+        job.accepted.set()
+
+    def submit(self, upload_path: str, filename: str, file_size: int, company_id: str, content_hash: str, db) -> IngestionJob:
+        """
+        Queue a file saved at upload_path for ingestion into the company's
+        vector store and return its job immediately, taking over the content's
+        reservation from find_duplicate. The job deletes the file when it
+        finishes.
+        """
+        key = (company_id, content_hash)
+        job = self._in_flight.get(key)
+        if job is None or job.accepted.is_set():
+            job = IngestionJob(filename, file_size, company_id, content_hash)
+        if self.is_full():
+            self.release(job)
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.max_queue} jobs), please retry shortly")
+        try:
+            self._ensure_pool()
+        except Exception:
+            self.release(job)
+            raise
+
+        self._jobs[job.job_id] = job
+        self._in_flight[key] = job
+        self._active += 1
+        job.accepted.set()
+        asyncio.create_task(self._run(job, upload_path, db))
+        logger.info("Queued ingestion job %s for %s (%d bytes)", job.job_id, filename, file_size)
+        return job
+
+    async def _run(self, job: IngestionJob, upload_path: str, db):
+        # Local import: rag_service loads the embedding stack, which this module's workers import lazily
+        from .rag_service import record_file_metadata, get_company_store
+
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            try:
+                index_info = await loop.run_in_executor(
+                    executor, _run_ingestion, job.job_id, upload_path, job.filename, job.file_id, job.company_id,
+                    self._progress
+                )
+            except BrokenProcessPool as e:
+                self._replace_broken_pool(executor)
+                raise RuntimeError("Ingestion worker stopped unexpectedly, please upload the file again") from e
+            job.progress = self._progress.get(job.job_id, job.progress)
+            await record_file_metadata(job.file_id, job.filename, job.file_size, job.content_hash, index_info, db)
+            self.chunks_indexed += index_info["chunk_count"]
+            self.chunks_reused += index_info["chunks_reused"]
+            job.status = "completed"
+            logger.info("Ingestion job %s completed, file_id: %s", job.job_id, job.file_id)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error("Ingestion job %s failed: %s", job.job_id, e)
+            # Chunks of a failed job must not outlive it, even if its worker died mid-way
+            try:
+                get_company_store(job.company_id).remove_file(job.file_id)
+            except Exception as cleanup_error:
+                logger.error("Could not clean up chunks of %s: %s", job.file_id, cleanup_error)
+        finally:
+            self._active -= 1
+            if self._in_flight.get((job.company_id, job.content_hash)) is job:
+                del self._in_flight[(job.company_id, job.content_hash)]
+            try:
+                os.remove(upload_path)
+            except OSError:
+                pass
+            job.finished_at = time.time()
+            self._progress.pop(job.job_id, None)
+            job.done.set()
+            self._forget_finished()
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        job = self._jobs.get(job_id)
+        if job is not None and not job.done.is_set():
+            progress = self._progress.get(job_id)
+            if progress:
+                job.status = "running"
+                job.progress = progress
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self._active
+        }
+
+    def dedup_stats(self) -> dict:
+        """Share of uploads resolved to an existing file and of chunks served from the embedding cache"""
+        return {
+            "uploads": self.uploads,
+            "duplicate_uploads": self.duplicate_uploads,
+            "file_hit_rate": self.duplicate_uploads / self.uploads if self.uploads else 0.0,
+            "chunks_indexed": self.chunks_indexed,
+            "chunks_reused": self.chunks_reused,
+            "chunk_hit_rate": self.chunks_reused / self.chunks_indexed if self.chunks_indexed else 0.0
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = None
+            self._manager = None
+
+
+_ingestion_manager = None
+
+def get_ingestion_manager() -> IngestionManager:
+    global _ingestion_manager
+    if _ingestion_manager is None:
+        _ingestion_manager = IngestionManager()
+    return _ingestion_manager
+
+def shutdown_ingestion_manager():
+    global _ingestion_manager
+    if _ingestion_manager is not None:
+        _ingestion_manager.shutdown()
+        _ingestion_manager = None
@@ -0,0 +1,135 @@
+# Logging and stage timings for the RAG subsystem
+#
+# Every rag module logs through a child of the "rag" logger. Messages use
+# %-style arguments so they are only formatted when their level is enabled:
+# chunk previews, prompts and per-row details are DEBUG, request summaries
+# INFO. RAG_LOG_LEVEL sets the level and RAG_LOG_FORMAT=json switches to one
+# JSON object per line, with any `extra` fields included.
+#
+# Stages of a request (embed, retrieve, llm, parse...) are timed into
+# fixed-bucket latency histograms, served by GET /rag/metrics.
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+RAG_LOG_LEVEL = os.getenv("RAG_LOG_LEVEL", "INFO").upper()
+RAG_LOG_FORMAT = os.getenv("RAG_LOG_FORMAT", "text")  # text | json
+
+# Upper bounds of the histogram buckets in milliseconds; slower samples land in the last, open bucket
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Attributes every LogRecord has; anything else on a record came in through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _configure_root() -> logging.Logger:
+    root = logging.getLogger("rag")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        if RAG_LOG_FORMAT == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(name)s: %(message)s"))
+        root.addHandler(handler)
+        # The handler above already writes these records; the root logger must not print them again
+        root.propagate = False
+    root.setLevel(RAG_LOG_LEVEL)
+    return root
+
+_configure_root()
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger for a rag module, e.g. get_logger("service") -> rag.service"""
+    return logging.getLogger(f"rag.{name}")
+
+
+class StageHistogram:
+    """Latency histogram of one stage: bucket counts plus count, sum, min and max"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def observe(self, elapsed_ms: float):
+        index = len(BUCKETS_MS)
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.min_ms = elapsed_ms if self.min_ms is None else min(self.min_ms, elapsed_ms)
+        self.max_ms = elapsed_ms if self.max_ms is None else max(self.max_ms, elapsed_ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the max for the open bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        buckets = {f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum_ms": round(self.total_ms, 1),
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "min_ms": round(self.min_ms, 1) if self.min_ms is not None else None,
+            "max_ms": round(self.max_ms, 1) if self.max_ms is not None else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "buckets": buckets
+        }
+
+
+_histograms: Dict[str, StageHistogram] = {}
+_histograms_lock = threading.Lock()
+
+def record_stage(stage: str, elapsed_ms: float):
+    with _histograms_lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = StageHistogram()
+        histogram.observe(elapsed_ms)
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time the enclosed block into the stage's histogram, whether or not it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, (time.perf_counter() - started) * 1000)
+
+def stage_metrics() -> dict:
+    with _histograms_lock:
+        return {stage: histogram.to_dict() for stage, histogram in sorted(_histograms.items())}
@@ -12,12 +12,6 @@ import os
 os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')  # Suppress TensorFlow info/warning logs
 os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')  # Disable oneDNN for consistent results
 
-try:
-    from pint import UnitRegistry
-    ureg = UnitRegistry()
-except ImportError:
-    ureg = None  # If pint is not installed, skip unit conversion
-
 # Standard library imports
 import os
 import uuid
@@ -25,19 +19,30 @@ import datetime
 import shutil
 import re
 import time
+import json
+import asyncio
 import hashlib
-from typing import List
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
 from io import BytesIO
 
 # Third-party imports
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from langchain_community.vectorstores import FAISS
+import numpy as np
+from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from pypdf import PdfReader
-from google import genai
 from google.genai import types
+from services.llm_gateway import get_llm_gateway, LLMError
+from services.llm_cache import get_response_cache, cache_key
+from .vector_store import CompanyVectorStore, company_store_dir, chunk_hash
+from .answer_parser import parse_answer_value, clean_html
+from .instrumentation import get_logger, timed_stage
 
 # For Word and Excel support
 try:
@@ -48,84 +53,30 @@ try:
 except ImportError:
     DOCX_AVAILABLE = False
     EXCEL_AVAILABLE = False
-    print("⚠️ [RAG] docx or openpyxl not available. Word/Excel support disabled.")
+
+logger = get_logger("service")
+if not DOCX_AVAILABLE:
+    logger.warning("docx or openpyxl not available. Word/Excel support disabled.")
 
 # Load environment variables
 load_dotenv()
 GEMINI_API_KEY_RAG = os.getenv("GEMINI_API_KEY_RAG")
 GEMINI_MODEL = "gemini-2.0-flash"
 
-# Global variables for caching and rate limiting
-API_CACHE = {}
-LAST_API_CALL = {}
-MIN_API_INTERVAL = 2.0  # Minimum 2 seconds between API calls per endpoint
-CACHE_DURATION = 3600  # Cache for 1 hour
-
-def get_cache_key(content: str, question: str) -> str:
-    """Generate a cache key for the request"""
-    combined = f"{content}|{question}"
-    return hashlib.md5(combined.encode()).hexdigest()
-
-def is_api_rate_limited(endpoint: str) -> bool:
-    """Check if we need to wait before making an API call"""
-    if endpoint not in LAST_API_CALL:
-        return False
-    
-    time_since_last = time.time() - LAST_API_CALL[endpoint]
-    return time_since_last < MIN_API_INTERVAL
-
-def wait_for_rate_limit(endpoint: str):
-    """Wait if necessary to respect rate limits"""
-    if endpoint in LAST_API_CALL:
-        time_since_last = time.time() - LAST_API_CALL[endpoint]
-        if time_since_last < MIN_API_INTERVAL:
-            sleep_time = MIN_API_INTERVAL - time_since_last
-            print(f"Rate limiting: waiting {sleep_time:.2f} seconds before API call")
-            time.sleep(sleep_time)
-
-def update_last_api_call(endpoint: str):
-    """Update the timestamp of the last API call"""
-    LAST_API_CALL[endpoint] = time.time()
-
-def get_cached_response(cache_key: str):
-    """Get cached response if available and not expired"""
-    if cache_key in API_CACHE:
-        cached_data = API_CACHE[cache_key]
-        if time.time() - cached_data['timestamp'] < CACHE_DURATION:
-            print(f"Using cached response for key: {cache_key[:8]}...")
-            return cached_data['response']
-        else:
-            # Remove expired cache
-            del API_CACHE[cache_key]
-    return None
-
-def cache_response(cache_key: str, response):
-    """Cache the API response"""
-    API_CACHE[cache_key] = {
-        'response': response,
-        'timestamp': time.time()
-    }
-    print(f"Cached response for key: {cache_key[:8]}...")
 MONGODB_URL = os.getenv("MONGODB_URL")
 DB_NAME = os.getenv("DB_NAME")
 
 # Global variables for lazy loading
 _embeddings = None
 _text_splitter = None
-_genai_client = None
-
-# Cache for API responses to avoid duplicate calls
-_api_response_cache = {}
-_last_api_call_time = 0
-_min_api_call_interval = 1.0  # Minimum 1 second between API calls
 
 def get_embeddings():
     """Lazy load embeddings to avoid slow startup times."""
     global _embeddings
     if _embeddings is None:
-        print("🔍 [RAG] Loading embeddings model (first time only)...")
+        logger.info("Loading embeddings model (first time only)...")
         _embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        print("🔍 [RAG] Embeddings model loaded successfully")
+        logger.info("Embeddings model loaded successfully")
     return _embeddings
 
 def get_text_splitter():
@@ -135,45 +86,159 @@ def get_text_splitter():
         _text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     return _text_splitter
 
-def get_genai_client():
-    """Lazy load Gemini client."""
-    global _genai_client
-    if _genai_client is None:
-        _genai_client = genai.Client(api_key=GEMINI_API_KEY_RAG)
-    return _genai_client
+def get_gemini_gateway():
+    """Rate-limited async Gemini endpoint for RAG answers"""
+    return get_llm_gateway("gemini_qa", api_key=GEMINI_API_KEY_RAG)
 
 async def get_file_metadata(file_id: str, db):
     return await db.rag_files.find_one({"_id": file_id})
 
-def get_vector_store(file_id: str):
-    faiss_path = os.path.join(FAISS_INDEX_DIR, f"faiss_index_{file_id}")
-    embeddings = get_embeddings()  # Use lazy-loaded embeddings
-    return FAISS.load_local(faiss_path, embeddings, allow_dangerous_deserialization=True)
+class VectorStoreCache:
+    """
+    Process-wide LRU of opened company vector stores, keyed by
+    company_<company_id>. The budget is an on-disk budget: each store is
+    weighed by the size of its index file when it is cached, not by the
+    vectors it holds in memory (memory-mapped IVF lists are not resident,
+    and an index that grows later keeps its original weight). The least
+    recently used stores are evicted once the total exceeds max_bytes or
+    there are more than max_entries of them.
+    """
 
-def retrieve_relevant_chunks(file_id: str, question: str, k: int = 3):
-    print(f"🔍 [RAG] Retrieving chunks for file_id: {file_id}, question: {question[:100]}...")
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._stores = OrderedDict()  # company_<company_id> -> (vector_store, index file bytes when cached)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._stores.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._stores.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, vector_store, size_bytes: int):
+        if size_bytes > self.max_bytes:
+            logger.warning("Index of %s (%d bytes on disk) exceeds the cache budget, not caching", key, size_bytes)
+            return
+        with self._lock:
+            previous = self._stores.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._stores[key] = (vector_store, size_bytes)
+            self._bytes += size_bytes
+            while self._bytes > self.max_bytes or len(self._stores) > self.max_entries:
+                evicted_key, (_, evicted_size) = self._stores.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+                logger.info("Evicted vector store %s from cache", evicted_key)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            entry = self._stores.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._stores),
+                "bytes": self._bytes,  # Index files on disk, as weighed when cached
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+_vector_store_cache = VectorStoreCache(
+    max_bytes=int(float(os.getenv("RAG_VECTOR_CACHE_MAX_MB", "512")) * 1024 * 1024),
+    max_entries=int(os.getenv("RAG_VECTOR_CACHE_MAX_ENTRIES", "64"))
+)
+
+def get_vector_store_cache() -> VectorStoreCache:
+    return _vector_store_cache
+
+def get_company_store(company_id: str) -> CompanyVectorStore:
+    """The company's consolidated vector store; it reloads itself when a worker writes to it"""
+    key = f"company_{company_id}"
+    store = _vector_store_cache.get(key)
+    if store is None:
+        store = CompanyVectorStore(company_store_dir(FAISS_INDEX_DIR, company_id))
+        _vector_store_cache.put(key, store, store.size_bytes)
+    return store
+
+def search_company_documents(
+    company_id: str,
+    questions: List[str],
+    k: int = 3,
+    file_ids: Optional[Sequence[str]] = None
+) -> List[Tuple[Document, float]]:
+    """
+    Search a company's store for several queries at once, limited to file_ids
+    or across all of its documents when None. Chunks come back as Documents
+    whose metadata holds file_id and the chunk's location, deduplicated under
+    their best (lowest) distance and ordered best match first. Query embedding
+    is timed as the "embed" stage and the whole search as "retrieve".
+    """
+    with timed_stage("retrieve"):
+        with timed_stage("embed"):
+            vectors = np.asarray(get_embeddings().embed_documents(questions), dtype=np.float32)
+        best = {}
+        for row in get_company_store(company_id).search(vectors, k, file_ids):
+            for chunk, distance in row:
+                if chunk["id"] not in best or distance < best[chunk["id"]][1]:
+                    best[chunk["id"]] = (chunk, distance)
+    ranked = sorted(best.values(), key=lambda item: item[1])
+    return [
+        (Document(page_content=chunk["text"], metadata={"file_id": chunk["file_id"], **chunk["location"]}), distance)
+        for chunk, distance in ranked
+    ]
+
+def retrieve_relevant_chunks(file_id: str, question: str, company_id: str, k: int = 3):
+    logger.debug("Retrieving chunks for file_id: %s, question: %.100s", file_id, question)
     try:
-        vector_store = get_vector_store(file_id)
-        docs = vector_store.similarity_search(question, k=k)
-        print(f"🔍 [RAG] Found {len(docs)} relevant chunks")
-        for i, doc in enumerate(docs):
-            print(f"🔍 [RAG] Chunk {i+1}: {doc.page_content[:100]}...")
+        docs = [doc for doc, _ in search_company_documents(company_id, [question], k, [file_id])]
+        logger.info("Found %d relevant chunks for file_id: %s", len(docs), file_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, doc in enumerate(docs):
+                logger.debug("Chunk %d: %.100s", i + 1, doc.page_content)
         return docs
-    except Exception as e:
-        print(f"❌ [RAG] Error retrieving chunks: {e}")
+    except Exception:
+        logger.exception("Error retrieving chunks for file_id: %s", file_id)
         return []
 
-def ask_gemini_with_context(context: str, question: str) -> str:
-    print(f"🔍 [RAG] Asking Gemini with context length: {len(context)}")
-    
-    # Generate cache key
-    cache_key = get_cache_key(context, question)
-    
-    # Check cache first
-    cached_response = get_cached_response(cache_key)
-    if cached_response:
-        return cached_response
-    
+def retrieve_relevant_chunks_multi(
+    file_id: str,
+    questions: List[str],
+    company_id: str,
+    k: int = 3
+) -> List[Tuple[Document, float]]:
+    """
+    Retrieve chunks for several queries with one batched embedding pass and a
+    single FAISS search over the (queries x dim) matrix. Chunks matched by more
+    than one query are kept once, under their best score, and the merged
+    result is ordered best match first.
+    """
+    try:
+        docs = search_company_documents(company_id, questions, k, [file_id])
+        logger.info("Found %d unique relevant chunks for file_id: %s from %d queries", len(docs), file_id, len(questions))
+        return docs
+    except Exception:
+        logger.exception("Error retrieving chunks for file_id: %s", file_id)
+        return []
+
+async def ask_gemini_with_context(context: str, question: str) -> str:
     prompt = (
         "You are a chatbot that answers questions strictly based on the provided document. "
         "Do not use any external knowledge or assumptions.\n\n"
@@ -181,123 +246,255 @@ def ask_gemini_with_context(context: str, question: str) -> str:
         f"Question: {question}\n\n"
         "Answer:"
     )
-    print(f"🔍 [RAG] Full prompt: {prompt[:500]}...")
+    logger.debug("Prompt (%d chars of context): %.500s", len(context), prompt)
+    
+    # Check the shared response cache first
+    response_cache = get_response_cache()
+    key = cache_key(GEMINI_MODEL, prompt)
+    cached_response = await response_cache.get(key)
+    if cached_response:
+        logger.info("Using cached response for key: %.8s", key)
+        return cached_response
     
     try:
-        # Apply rate limiting
-        wait_for_rate_limit("gemini_qa")
-        
+        # The gateway rate-limits, caps concurrency and retries 429s without blocking the event loop
         generate_content_config = types.GenerateContentConfig(response_mime_type="text/plain")
-        genai_client = get_genai_client()  # Use lazy-loaded client
-        
-        # Update rate limit tracker
-        update_last_api_call("gemini_qa")
-        
-        response = genai_client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
-            config=generate_content_config,
-        )
-        if not response or not hasattr(response, 'text'):
-            print("❌ [RAG] No response from Gemini API")
+        with timed_stage("llm"):
+            result = await get_gemini_gateway().generate(GEMINI_MODEL, prompt, generate_content_config)
+        if not result:
+            logger.error("No response from Gemini API")
             return "No response from Gemini API."
         
-        result = str(response.text)
-        print(f"🔍 [RAG] Gemini response: {result}")
+        logger.debug("Gemini response: %s", result)
         
         # Cache the successful response
-        cache_response(cache_key, result)
+        await response_cache.set(key, result)
         
         return result
     except Exception as e:
         error_msg = str(e)
-        print(f"❌ [RAG] Error calling Gemini: {error_msg}")
+        status = e.status if isinstance(e, LLMError) else None
+        logger.error("Error calling Gemini: %s", error_msg)
         
         # Check for specific API quota errors
-        if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
+        if status == 429 or "RESOURCE_EXHAUSTED" in error_msg or "quota" in error_msg.lower():
             return "API_QUOTA_EXCEEDED: Please check your Gemini API quota and billing details."
-        elif "403" in error_msg or "permission" in error_msg.lower():
+        elif status == 403 or "permission" in error_msg.lower():
             return "API_PERMISSION_ERROR: Please check your Gemini API key permissions."
         else:
             return f"API_ERROR: {error_msg}"
 
-def extract_text_from_file(file_bytes: bytes, filename: str) -> str:
-    """Extract text from PDF, Word, or Excel files."""
-    print(f"🔍 [RAG] Extracting text from file: {filename}")
-    
+# Word paragraphs and Excel rows are grouped into sections of about this many characters
+SECTION_MAX_CHARS = 4000
+
+def _open_source(source):
+    """Files are passed either as their bytes or as a path on disk"""
+    return BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+def _grouped_lines(lines, make_location):
+    """Group (index, line) pairs into sections of about SECTION_MAX_CHARS"""
+    buffer, size, first = [], 0, None
+    for index, line in lines:
+        if first is None:
+            first = index
+        buffer.append(line)
+        size += len(line)
+        if size >= SECTION_MAX_CHARS:
+            yield "".join(buffer), make_location(first, index)
+            buffer, size, first = [], 0, None
+    if buffer:
+        yield "".join(buffer), make_location(first, index)
+
+def iter_file_sections(source, filename: str, on_progress=None):
+    """
+    Yield the text of a PDF, Word or Excel file as (text, location) sections,
+    one at a time: a PDF page, or a run of Word paragraphs or Excel rows.
+    location says where the text came from, e.g. {"page": 3},
+    {"paragraph_start": 10, "paragraph_end": 24} or
+    {"sheet": "Data", "row_start": 1, "row_end": 80}.
+    on_progress, if given, is called as on_progress(parts_done, parts_total)
+    after each PDF page, Word document or Excel sheet.
+    """
+    logger.info("Extracting text from file: %s", filename)
     file_ext = filename.lower().split('.')[-1]
-    text = ""
-    
+
     try:
         if file_ext == 'pdf':
-            pdf_reader = PdfReader(BytesIO(file_bytes))
+            pdf_reader = PdfReader(_open_source(source))
+            page_count = len(pdf_reader.pages)
             for page_num, page in enumerate(pdf_reader.pages):
                 page_text = page.extract_text() or ""
-                text += page_text
-                print(f"🔍 [RAG] Extracted {len(page_text)} chars from PDF page {page_num + 1}")
-        
+                logger.debug("Extracted %d chars from PDF page %d", len(page_text), page_num + 1)
+                yield page_text, {"page": page_num + 1}
+                if on_progress:
+                    on_progress(page_num + 1, page_count)
+
         elif file_ext in ['doc', 'docx'] and DOCX_AVAILABLE:
-            doc = docx.Document(BytesIO(file_bytes))
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            print(f"🔍 [RAG] Extracted {len(text)} chars from Word document")
-        
+            doc = docx.Document(_open_source(source))
+            yield from _grouped_lines(
+                ((i, paragraph.text + "\n") for i, paragraph in enumerate(doc.paragraphs)),
+                lambda first, last: {"paragraph_start": first, "paragraph_end": last}
+            )
+            logger.debug("Extracted %d paragraphs from Word document", len(doc.paragraphs))
+            if on_progress:
+                on_progress(1, 1)
+
         elif file_ext in ['xls', 'xlsx'] and EXCEL_AVAILABLE:
-            workbook = load_workbook(BytesIO(file_bytes), data_only=True)
-            for sheet_name in workbook.sheetnames:
-                sheet = workbook[sheet_name]
-                text += f"Sheet: {sheet_name}\n"
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = " | ".join([str(cell) if cell is not None else "" for cell in row])
-                    text += row_text + "\n"
-            print(f"🔍 [RAG] Extracted {len(text)} chars from Excel document")
-        
+            # Read-only workbooks stream rows instead of loading every sheet at once
+            workbook = load_workbook(_open_source(source), read_only=True, data_only=True)
+            try:
+                for sheet_num, sheet_name in enumerate(workbook.sheetnames):
+                    rows = workbook[sheet_name].iter_rows(values_only=True)
+                    lines = (
+                        (row_num, " | ".join([str(cell) if cell is not None else "" for cell in row]) + "\n")
+                        for row_num, row in enumerate(rows, start=1)
+                    )
+                    yield from _grouped_lines(
+                        itertools.chain([(0, f"Sheet: {sheet_name}\n")], lines),
+                        lambda first, last, sheet_name=sheet_name: {"sheet": sheet_name, "row_start": first, "row_end": last}
+                    )
+                    logger.debug("Extracted sheet %s from Excel document", sheet_name)
+                    if on_progress:
+                        on_progress(sheet_num + 1, len(workbook.sheetnames))
+            finally:
+                workbook.close()
+
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
-        
-        print(f"🔍 [RAG] Total extracted text length: {len(text)}")
-        print(f"🔍 [RAG] Text preview: {text[:300]}...")
-        return text
-        
-    except Exception as e:
-        print(f"❌ [RAG] Error extracting text from {filename}: {e}")
-        raise e
 
-async def process_file_and_store(file_bytes: bytes, filename: str, file_size: int, db) -> str:
-    """Extract text from any supported file type, split, embed, store in FAISS and MongoDB. Returns file_id."""
-    print(f"🔍 [RAG] Processing file: {filename} ({file_size} bytes)")
-    
-    # Extract text using the universal extractor
-    text = extract_text_from_file(file_bytes, filename)
-    
-    if not text.strip():
-        raise ValueError("No text could be extracted from the file")
-    
-    print(f"🔍 [RAG] Creating documents from text ({len(text)} characters)")
+    except Exception:
+        logger.exception("Error extracting text from %s", filename)
+        raise
+
+def extract_text_from_file(source, filename: str, on_progress=None) -> str:
+    """Extract the whole text of a PDF, Word, or Excel file (bytes or path)."""
+    text = "".join(section for section, _ in iter_file_sections(source, filename, on_progress))
+    logger.info("Total extracted text length: %d", len(text))
+    logger.debug("Text preview: %.300s", text)
+    return text
+
+# Chunks embedded per forward pass when building an index
+EMBED_BATCH_SIZE = 64
+
+def build_file_index(source, filename: str, file_id: str, company_id: str, on_progress=None) -> dict:
+    """
+    Extract, split and embed a file (bytes or path) into its company's vector
+    store. Sections stream from the extractor through the splitter to the
+    embedder in batches; chunk texts go straight to the store's docstore and
+    only the vectors are held until they are added to the index in one step,
+    so searches never see a half-indexed file. Chunks whose text the company
+    has embedded before reuse the cached vector instead of being re-embedded.
+    CPU-bound and synchronous, so ingestion jobs run it in a worker process.
+    on_progress, if given, is called with a dict of the fields that changed:
+    stage, pages_parsed, pages_total, chunks_embedded, chunks_reused, chunks_total.
+    Returns the facts rag_files records about the file.
+    """
+    def report(**fields):
+        if on_progress:
+            on_progress(fields)
+
     text_splitter = get_text_splitter()  # Use lazy-loaded text splitter
-    documents = text_splitter.create_documents([text])
-    print(f"🔍 [RAG] Created {len(documents)} document chunks")
-    
-    # Create vector store
     embeddings = get_embeddings()  # Use lazy-loaded embeddings
-    vector_store = FAISS.from_documents(documents, embeddings)
-    file_id = str(uuid.uuid4())
-    faiss_path = os.path.join(FAISS_INDEX_DIR, f"faiss_index_{file_id}")
-    vector_store.save_local(faiss_path)
-    print(f"🔍 [RAG] Saved vector store to: {faiss_path}")
+    store = CompanyVectorStore(company_store_dir(FAISS_INDEX_DIR, company_id))
+    pending = []  # Chunks waiting for the next embedding batch
+    chunk_ids = []
+    vectors = []
+    text_length = 0
+    chunk_count = 0
+    chunks_reused = 0
+
+    def embed_pending():
+        nonlocal chunks_reused
+        texts = [document.page_content for document in pending]
+        hashes = [chunk_hash(text) for text in texts]
+        cached = store.cached_vectors(hashes)
+        missing = [i for i, text_hash in enumerate(hashes) if text_hash not in cached]
+        if missing:
+            fresh = np.asarray(embeddings.embed_documents([texts[i] for i in missing]), dtype=np.float32)
+            store.cache_vectors([hashes[i] for i in missing], fresh)
+            cached.update((hashes[i], vector) for i, vector in zip(missing, fresh))
+        chunks_reused += len(texts) - len(missing)
+        vectors.append(np.vstack([cached[text_hash] for text_hash in hashes]))
+        chunk_ids.extend(store.stage_chunks(file_id, texts, [document.metadata for document in pending]))
+        pending.clear()
+        report(chunks_embedded=chunk_count, chunks_reused=chunks_reused)
+
+    try:
+        report(stage="processing", chunks_embedded=0, chunks_reused=0)
+        sections = iter_file_sections(
+            source,
+            filename,
+            on_progress=lambda done, total: report(pages_parsed=done, pages_total=total)
+        )
+        for text, location in sections:
+            text_length += len(text)
+            if not text.strip():
+                continue
+            # Chunks carry the location of the section they were split from
+            for document in text_splitter.create_documents([text], metadatas=[location]):
+                pending.append(document)
+                chunk_count += 1
+                if len(pending) >= EMBED_BATCH_SIZE:
+                    embed_pending()
+        if pending:
+            embed_pending()
+
+        if not chunk_ids:
+            raise ValueError("No text could be extracted from the file")
+        logger.info("Embedded %d chunks (%d from cache) from %d characters", chunk_count, chunks_reused, text_length)
+        report(stage="indexing", chunks_total=chunk_count)
+
+        store.add_vectors(chunk_ids, np.vstack(vectors))
+        logger.info("Added %d vectors to company store: %s", chunk_count, store.directory)
+    except Exception:
+        # Staged chunks of a failed file must not linger in the docstore
+        store.remove_file(file_id)
+        raise
+    finally:
+        store.close()
+
+    return {
+        "text_length": text_length,
+        "chunk_count": chunk_count,
+        "chunks_reused": chunks_reused,
+        "company_id": company_id,
+        "faiss_path": store.directory
+    }
 
-    # Store metadata in MongoDB
+async def record_file_metadata(file_id: str, filename: str, file_size: int, content_hash: str, index_info: dict, db):
+    """Register a file in rag_files; only called once its index is complete on disk"""
     await db.rag_files.insert_one({
         "_id": file_id,
         "filename": filename,
+        "company_id": index_info["company_id"],
+        "content_hash": content_hash,
         "content_length": file_size,
-        "text_length": len(text),
-        "chunk_count": len(documents),
-        "faiss_path": faiss_path,
+        "text_length": index_info["text_length"],
+        "chunk_count": index_info["chunk_count"],
+        "faiss_path": index_info["faiss_path"],
         "upload_date": datetime.datetime.now().timestamp()
     })
-    print(f"🔍 [RAG] Stored metadata for file_id: {file_id}")
+    logger.info("Stored metadata for file_id: %s", file_id)
 
+async def find_file_by_hash(company_id: str, content_hash: str, db):
+    """rag_files document of a file the company already uploaded with the same SHA-256, if any"""
+    return await db.rag_files.find_one({"company_id": company_id, "content_hash": content_hash})
+
+async def process_file_and_store(file_bytes: bytes, filename: str, file_size: int, company_id: str, db) -> str:
+    """
+    Extract text from any supported file type, split, embed, store in FAISS and MongoDB. Returns file_id.
+    A file the company already uploaded resolves to the existing file_id.
+    Runs on the calling thread; the upload endpoint goes through rag.ingestion instead.
+    """
+    logger.info("Processing file: %s (%d bytes)", filename, file_size)
+    content_hash = hashlib.sha256(file_bytes).hexdigest()
+    existing = await find_file_by_hash(company_id, content_hash, db)
+    if existing is not None:
+        logger.info("Identical file already indexed as %s", existing["_id"])
+        return existing["_id"]
+    file_id = str(uuid.uuid4())
+    index_info = build_file_index(file_bytes, filename, file_id, company_id)
+    await record_file_metadata(file_id, filename, file_size, content_hash, index_info, db)
     return file_id
 
 
@@ -305,51 +502,123 @@ async def delete_file_and_index(file_id: str, db) -> bool:
     file_metadata = await db.rag_files.find_one({"_id": file_id})
     if not file_metadata:
         return False
-    faiss_path = os.path.join(FAISS_INDEX_DIR, f"faiss_index_{file_id}")
-    try:
-        shutil.rmtree(faiss_path)
-    except Exception:
-        pass  # Ignore errors if directory does not exist
+    if file_metadata.get("company_id"):
+        removed = get_company_store(file_metadata["company_id"]).remove_file(file_id)
+        logger.info("Removed %d vectors of %s from company store", removed, file_id)
+    else:
+        # Unmigrated legacy upload: its directory is never loaded, just remove it
+        shutil.rmtree(os.path.join(FAISS_INDEX_DIR, f"faiss_index_{file_id}"), ignore_errors=True)
     await db.rag_files.delete_one({"_id": file_id})
     return True
 
 
-async def extract_table_values(file_id: str, table_metadata: dict, question: str):
+# Tables with more editable rows than this are extracted block by block
+TABLE_CHUNKED_MIN_ROWS = int(os.getenv("RAG_TABLE_CHUNKED_MIN_ROWS", "40"))
+TABLE_BLOCK_ROWS = int(os.getenv("RAG_TABLE_BLOCK_ROWS", "15"))
+
+API_ERROR_MARKERS = [
+    "API_QUOTA_EXCEEDED", "API_PERMISSION_ERROR", "API_ERROR",
+    "Error calling Gemini:", "429 RESOURCE_EXHAUSTED", "quota exceeded"
+]
+
+def parse_block_answer(answer: str) -> dict:
+    """{row index: {column key: raw value}} from a block's JSON answer, tolerating code fences and prose around it"""
+    start, end = answer.find("{"), answer.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in answer")
+    data = json.loads(answer[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("Answer JSON is not an object")
+    return {str(row_idx): cells for row_idx, cells in data.items() if isinstance(cells, dict)}
+
+async def extract_table_block(
+    file_id: str,
+    company_id: str,
+    question: str,
+    block: List[Tuple[int, str, str]],
+    columns: List[dict]
+) -> Tuple[dict, List[str], dict]:
+    """
+    Extract one block of (row index, parameter, unit) rows: retrieve context
+    for the block's own parameters, ask for a JSON object keyed by row index
+    and column key, and normalize each value to its row's unit. Returns the
+    values, unit warnings and the block's timing report.
+    """
+    started = time.perf_counter()
+    report = {"rows": [row_idx for row_idx, _, _ in block], "latency_ms": None, "error": None}
+    values = {}
+    warnings = []
+    units = {str(row_idx): unit for row_idx, _, unit in block}
+    try:
+        queries = [question] + [param for _, param, _ in block]
+        # Embedding and searching are CPU-bound; keep them off the event loop so blocks overlap
+        ranked_docs = await asyncio.to_thread(retrieve_relevant_chunks_multi, file_id, queries, company_id, 3)
+        context = "\n".join(doc.page_content for doc, _ in ranked_docs)
+
+        rows_spec = "\n".join(f'- "{row_idx}": {param}' for row_idx, param, _ in block)
+        columns_spec = "\n".join(f'- "{col["key"]}": {col["label"]}' for col in columns)
+        block_question = f"""From the document, extract the value of each cell of the rows below for each column.
+
+Question: {question}
+
+Rows (id: parameter):
+{rows_spec}
+
+Columns (key: label):
+{columns_spec}
+
+Respond with only a JSON object mapping each row id to an object mapping each column key to the value as a string, e.g. {{"{block[0][0]}": {{"{columns[0]['key'] if columns else 'value'}": "95"}}}}.
+- If a cell shows "Y", use "Y"; if it shows "N" or "N.A.", use "N"
+- If a cell shows a percentage like "95%", use just the number "95"
+- If a value is not found, use an empty string"""
+
+        answer = await ask_gemini_with_context(context, block_question)
+        if any(marker in answer for marker in API_ERROR_MARKERS):
+            raise RuntimeError(answer)
+        with timed_stage("parse"):
+            for row_idx, cells in parse_block_answer(answer).items():
+                values[row_idx] = {}
+                for col_key, value in cells.items():
+                    parsed = parse_answer_value(str(value), units.get(row_idx))
+                    values[row_idx][col_key] = parsed.value
+                    if parsed.warning:
+                        warnings.append(f"Row {row_idx} {col_key}: {parsed.warning}")
+    except Exception as e:
+        report["error"] = str(e)
+        logger.error("Block with rows %s failed: %s", report["rows"], e)
+    report["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return values, warnings, report
+
+async def extract_table_values(file_id: str, table_metadata: dict, question: str, company_id: str, mode: str = "auto"):
     """
     Extracts values for each editable cell in the table using RAG and Gemini.
-    Returns: { 'suggested_values': {rowIdx: {colKey: value, ...}, ...}, 'unit_warnings': [ ... ] }
+    mode "single" asks for every cell in one prompt, "chunked" extracts blocks
+    of rows concurrently, and "auto" picks chunked for tables with more than
+    TABLE_CHUNKED_MIN_ROWS editable rows.
+    Returns: { 'suggested_values': {rowIdx: {colKey: value, ...}, ...}, 'unit_warnings': [ ... ], 'timing': {...} }
     """
-    print(f"🔍 [RAG] Starting table extraction for file_id: {file_id}")
-    print(f"🔍 [RAG] Question: {question}")
-    print(f"🔍 [RAG] Table metadata keys: {list(table_metadata.keys())}")
-    
     # Only process if rows and columns exist
     rows = table_metadata.get('rows', [])
     columns = table_metadata.get('columns', [])
-    print(f"🔍 [RAG] Found {len(rows)} rows and {len(columns)} columns")
-    print(f"🔍 [RAG] All rows:")
-    for idx, row in enumerate(rows):
-        print(f"  Row {idx}: {row}")
-    print(f"🔍 [RAG] All columns:")
-    for idx, col in enumerate(columns):
-        print(f"  Col {idx}: {col}")
+    logger.info("Starting table extraction for file_id: %s (%d rows, %d columns)", file_id, len(rows), len(columns))
+    logger.debug("Question: %s", question)
+    if logger.isEnabledFor(logging.DEBUG):
+        for idx, row in enumerate(rows):
+            logger.debug("Row %d: %s", idx, row)
+        for idx, col in enumerate(columns):
+            logger.debug("Col %d: %s", idx, col)
     
     # Identify editable rows (not auto-calculated)
-    # Remove HTML tags from parameter text for keyword checking
-    import re
-    def clean_html(text):
-        return re.sub(r'<[^>]+>', '', text)
+    # For dynamic modules the row parameter is in 'label', for environment modules in 'parameter';
+    # HTML tags are removed once here for keyword checks, prompts and display
+    row_params = [clean_html(row.get('label') or row.get('parameter', '')) for row in rows]
     
     editable_row_indices = []
     for idx, row in enumerate(rows):
         if row.get('isHeader') or row.get('isSectionHeader'):
             continue
         
-        # For dynamic modules, check if row has a 'label' field (row parameter)
-        # For environment modules, check 'parameter' field
-        param = row.get('label') or row.get('parameter', '')
-        param_clean = clean_html(param).lower()
-        print(f"🔍 [RAG] Row {idx}: '{param}' -> cleaned: '{param_clean}'")
+        param_clean = row_params[idx].lower()
         
         # Check if it's auto-calculated (very specific checks)
         is_auto_calc = (
@@ -366,57 +635,43 @@ async def extract_table_values(file_id: str, table_metadata: dict, question: str
         
         if not is_auto_calc:
             editable_row_indices.append(idx)
-            print(f"🔍 [RAG] Row {idx} marked as editable")
         else:
-            print(f"🔍 [RAG] Row {idx} marked as auto-calculated")
+            logger.debug("Row %d '%s' marked as auto-calculated", idx, param_clean)
     
-    print(f"🔍 [RAG] Editable row indices: {editable_row_indices}")
+    logger.debug("Editable row indices: %s", editable_row_indices)
     
     # Identify year columns (e.g., 'current_year', 'previous_year')
     year_col_keys = [col.get('key') for col in columns if col.get('key') not in ('parameter', 'unit')]
     # If dynamicYear, fallback to all except parameter/unit
     if not year_col_keys:
         year_col_keys = [col.get('key') for col in columns if col.get('key') not in ('parameter', 'unit')]
-    print(f"🔍 [RAG] Year column keys: {year_col_keys}")
+    logger.debug("Year column keys: %s", year_col_keys)
     
     suggested_values = {}
     unit_warnings = []
+    started = time.perf_counter()
     
-    # A.1 Initialize context cache to avoid redundant chunk retrievals
-    context_cache = {}
+    if mode == "chunked" or (mode == "auto" and len(editable_row_indices) > TABLE_CHUNKED_MIN_ROWS):
+        return await extract_table_values_chunked(
+            file_id, rows, row_params, columns, editable_row_indices, year_col_keys, question, company_id, started
+        )
     
-    # A.2 Get document context once for the entire table extraction
-    print(f"🔍 [RAG] Retrieving document context for table extraction...")
+    # A.1 Get document context once for the entire table extraction
     main_context_queries = [
         question,  # Use the user's question
         "emissions air pollutants",  # Generic search for emissions data
         "NOx SOx PM VOC POP HAP",  # Search for specific pollutants
         "kg/year g/year",  # Search by units
     ]
-    
-    # Build comprehensive context from all queries
-    all_docs = []
-    for search_query in main_context_queries:
-        cache_key = f"{file_id}_{search_query}"
-        if cache_key not in context_cache:
-            docs = retrieve_relevant_chunks(file_id, search_query, k=3)
-            context_cache[cache_key] = docs
-        else:
-            docs = context_cache[cache_key]
-        all_docs.extend(docs)
-    
-    # Remove duplicates and get unique content
-    unique_content = []
-    seen_content = set()
-    for doc in all_docs:
-        if doc.page_content not in seen_content:
-            unique_content.append(doc.page_content)
-            seen_content.add(doc.page_content)
+
+    # A.2 Embed and search all queries at once; chunks come back deduplicated, best match first
+    ranked_docs = retrieve_relevant_chunks_multi(file_id, main_context_queries, company_id, k=3)
+    unique_content = [doc.page_content for doc, _ in ranked_docs]
     
     # Use the same context for all cells to avoid redundant API calls
     shared_context = "\n".join(unique_content)
-    print(f"🔍 [RAG] Built shared context: {len(shared_context)} chars from {len(unique_content)} unique chunks")
-    print(f"🔍 [RAG] Context preview: {shared_context[:300]}...")
+    logger.info("Built shared context: %d chars from %d unique chunks", len(shared_context), len(unique_content))
+    logger.debug("Context preview: %.300s", shared_context)
     
     # Initialize suggested_values structure
     for row_idx in editable_row_indices:
@@ -425,20 +680,13 @@ async def extract_table_values(file_id: str, table_metadata: dict, question: str
             suggested_values[str(row_idx)][col_key] = ""
     
     # C. SINGLE API CALL APPROACH - Extract all cell values in one go
-    print(f"🔍 [RAG] Making single API call to extract all table cell values...")
-    print(f"🔍 [RAG] This replaces {len(editable_row_indices)} * {len(year_col_keys)} = {len(editable_row_indices) * len(year_col_keys)} individual API calls with just 1 call!")
-    
     # Build comprehensive question for all parameter-column combinations
     all_params = []
     all_columns = []
     cell_combinations = []
     
     for row_idx in editable_row_indices:
-        row = rows[row_idx]
-        param = row.get('label') or row.get('parameter', '')
-        param_clean = clean_html(param)
-        all_params.append(param_clean)
-        print(f"🔍 [RAG] Parameter {len(all_params)}: {param_clean}")
+        all_params.append(row_params[row_idx])
     
     for col in columns:
         if col.get('key') in year_col_keys:
@@ -446,7 +694,6 @@ async def extract_table_values(file_id: str, table_metadata: dict, question: str
                 'key': col.get('key'),
                 'label': col.get('label', ''),
             })
-            print(f"🔍 [RAG] Column: {col.get('key')} - {col.get('label', '')}")
     
     # Create all parameter-column combinations
     for param_idx, param in enumerate(all_params):
@@ -458,7 +705,7 @@ async def extract_table_values(file_id: str, table_metadata: dict, question: str
                 'col_label': col['label']
             })
     
-    print(f"🔍 [RAG] Total cell combinations to extract: {len(cell_combinations)}")
+    logger.info("Extracting %d cells in a single API call", len(cell_combinations))
     
     # Create a single comprehensive question that asks for all cell values
     comprehensive_question = f"""From the document, extract the specific values for each parameter-column combination in this retirement benefits table.
@@ -500,142 +747,102 @@ Y
 Y
 ..."""
     
-    print(f"🔍 [RAG] Making single comprehensive API call...")
-    print(f"🔍 [RAG] Question preview: {comprehensive_question[:800]}...")
+    logger.debug("Question preview: %.800s", comprehensive_question)
     
     # SINGLE API CALL for all cell combinations
-    answer = ask_gemini_with_context(shared_context, comprehensive_question)
-    print(f"🔍 [RAG] ✅ Single API call completed!")
-    print(f"🔍 [RAG] Raw answer: {answer}")
+    answer = await ask_gemini_with_context(shared_context, comprehensive_question)
+    logger.debug("Raw answer: %s", answer)
     
     # Check if the answer contains an error
-    if any(error_indicator in answer for error_indicator in [
-        "API_QUOTA_EXCEEDED", "API_PERMISSION_ERROR", "API_ERROR", 
-        "Error calling Gemini:", "429 RESOURCE_EXHAUSTED", "quota exceeded"
-    ]):
-        print(f"❌ [RAG] Gemini API error detected in comprehensive call")
-        print(f"❌ [RAG] Error details: {answer}")
-        print(f"❌ [RAG] All table values will remain empty due to API error")
+    if any(error_indicator in answer for error_indicator in API_ERROR_MARKERS):
+        logger.error("Gemini API error in table extraction, all values left empty: %s", answer)
         # Keep all values empty if API fails (already initialized above)
     else:
         # Parse the comprehensive answer
-        print(f"🔍 [RAG] Parsing comprehensive answer...")
         answer_lines = answer.strip().split('\n')
+        if len(answer_lines) < len(cell_combinations):
+            logger.warning("Only %d of %d values returned", len(answer_lines), len(cell_combinations))
         
-        # Extract all values from the answer
-        extracted_values = []
-        for i, line in enumerate(answer_lines):
-            line = line.strip()
-            print(f"🔍 [RAG] Parsing line {i+1}: '{line}'")
-            
-            if not line:
-                extracted_values.append("")
-                print(f"🔍 [RAG] Empty line -> empty value")
-                continue
-            
-            # Look for values in brackets first [95], [Yes], [N.A.], etc.
-            bracket_match = re.search(r'\[([^\]]+)\]', line)
-            if bracket_match:
-                bracket_value = bracket_match.group(1).strip()
-                print(f"🔍 [RAG] Found bracketed value: '{bracket_value}'")
-                
-                # Handle different value types
-                if bracket_value.upper() in ['Y', 'YES']:
-                    extracted_values.append("Y")
-                    print(f"🔍 [RAG] Converted to: Y")
-                elif bracket_value.upper() in ['N', 'NO', 'N.A.', 'NA']:
-                    extracted_values.append("N")
-                    print(f"🔍 [RAG] Converted to: N")
-                else:
-                    # Try to extract number from bracketed value
-                    numbers = re.findall(r'[\d,]+(?:\.[\d]+)?', bracket_value)
-                    if numbers:
-                        value = numbers[0].replace(',', '')
-                        try:
-                            float(value)  # Validate it's a number
-                            extracted_values.append(value)
-                            print(f"🔍 [RAG] Converted to number: {value}")
-                        except ValueError:
-                            extracted_values.append("")
-                            print(f"🔍 [RAG] Invalid number format -> empty value")
-                    else:
-                        # Check for nil/zero indicators in bracket
-                        if any(word in bracket_value.lower() for word in ['nil', 'zero', 'not applicable', 'n/a', 'none']):
-                            extracted_values.append("0")
-                            print(f"🔍 [RAG] Found nil/zero indicator -> 0")
-                        else:
-                            extracted_values.append("")
-                            print(f"🔍 [RAG] No recognizable value in brackets -> empty value")
-                continue
-            
-            # Fallback: Handle different value types without brackets
-            if line.upper() in ['Y', 'YES']:
-                extracted_values.append("Y")
-                print(f"🔍 [RAG] Found Y/Yes -> Y")
-            elif line.upper() in ['N', 'NO', 'N.A.', 'NA']:
-                extracted_values.append("N")
-                print(f"🔍 [RAG] Found N/No/N.A. -> N")
-            else:
-                # Find numbers in the line (avoid line numbers at the beginning)
-                # Look for numbers that are not at the very start of the line
-                numbers = re.findall(r'(?:^|\s)(\d+(?:\.\d+)?)(?:\s|$|%)', line)
-                if not numbers:
-                    # If no spaced numbers found, try any numbers
-                    numbers = re.findall(r'[\d,]+(?:\.[\d]+)?', line)
-                
-                if numbers:
-                    # Take the last number found (more likely to be the value, not line number)
-                    value = numbers[-1].replace(',', '')
-                    try:
-                        float(value)  # Validate it's a number
-                        extracted_values.append(value)
-                        print(f"🔍 [RAG] Found number: {value}")
-                    except ValueError:
-                        extracted_values.append("")
-                        print(f"🔍 [RAG] Invalid number format -> empty value")
-                else:
-                    # Check for nil/zero indicators
-                    if any(word in line.lower() for word in ['nil', 'zero', 'not applicable', 'n/a', 'none']):
-                        extracted_values.append("0")
-                        print(f"🔍 [RAG] Found nil/zero indicator -> 0")
-                    else:
-                        extracted_values.append("")
-                        print(f"🔍 [RAG] No recognizable value -> empty value")
-        
-        print(f"🔍 [RAG] Final extracted values: {extracted_values}")
-        
-        # Assign extracted values to the specific cells
-        for i, combo in enumerate(cell_combinations):
-            if i < len(extracted_values):
-                value = extracted_values[i]
-                param_idx = combo['param_idx']
-                row_idx = editable_row_indices[param_idx]
+        # Line i answers combination i; each value is normalized to its row's unit
+        with timed_stage("parse"):
+            for line, combo in zip(answer_lines, cell_combinations):
+                row_idx = editable_row_indices[combo['param_idx']]
                 col_key = combo['col_key']
-                
-                print(f"🔍 [RAG] Assigning value '{value}' to [{row_idx}][{col_key}] (Parameter: {combo['param']}, Column: {combo['col_label']})")
-                suggested_values[str(row_idx)][col_key] = value
-            else:
-                print(f"🔍 [RAG] No value available for combination {i+1}")
-                # Values already initialized as empty above
-    
-    # Add parameter names to the result for better display
-    parameters_info = {}
-    for row_idx in editable_row_indices:
-        row = rows[row_idx]
-        # Handle both dynamic module format ('label') and environment module format ('parameter')
-        param = row.get('label') or row.get('parameter', '')
-        unit = row.get('unit', '').strip()
-        # Clean HTML tags for display
-        param_clean = clean_html(param)
-        parameters_info[str(row_idx)] = {
-            'parameter': param_clean,
-            'unit': unit
-        }
+                parsed = parse_answer_value(line, rows[row_idx].get('unit'))
+                suggested_values[str(row_idx)][col_key] = parsed.value
+                if parsed.warning:
+                    unit_warnings.append(f"Row {row_idx} {col_key}: {parsed.warning}")
+        logger.debug("Extracted values: %s", suggested_values)
     
     result = {
         "suggested_values": suggested_values, 
         "unit_warnings": unit_warnings,
-        "parameters_info": parameters_info
+        "parameters_info": table_parameters_info(rows, row_params, editable_row_indices),
+        "timing": {"mode": "single", "wall_time_ms": round((time.perf_counter() - started) * 1000, 1)}
     }
-    print(f"🔍 [RAG] Final result: {result}")
+    logger.info("Table extraction finished in %s ms", result["timing"]["wall_time_ms"])
     return result
+
+def table_parameters_info(rows: list, row_params: List[str], editable_row_indices: List[int]) -> dict:
+    """Parameter names and units of the editable rows, for better display"""
+    return {
+        str(row_idx): {'parameter': row_params[row_idx], 'unit': (rows[row_idx].get('unit') or '').strip()}
+        for row_idx in editable_row_indices
+    }
+
+async def extract_table_values_chunked(
+    file_id: str,
+    rows: list,
+    row_params: List[str],
+    columns: list,
+    editable_row_indices: List[int],
+    year_col_keys: List[str],
+    question: str,
+    company_id: str,
+    started: float
+) -> dict:
+    """
+    Extract a large table in blocks of TABLE_BLOCK_ROWS editable rows. Each
+    block retrieves its own context and all blocks are asked concurrently;
+    the shared Gemini gateway paces the requests. Results are merged by row
+    index, so a failed block only leaves its own rows empty.
+    """
+    parameters_info = table_parameters_info(rows, row_params, editable_row_indices)
+    value_columns = [
+        {'key': col.get('key'), 'label': col.get('label', '')}
+        for col in columns if col.get('key') in year_col_keys
+    ]
+    block_rows = [
+        (row_idx, parameters_info[str(row_idx)]['parameter'], parameters_info[str(row_idx)]['unit'])
+        for row_idx in editable_row_indices
+    ]
+    blocks = [block_rows[i:i + TABLE_BLOCK_ROWS] for i in range(0, len(block_rows), TABLE_BLOCK_ROWS)]
+    logger.info("Chunked extraction: %d rows in %d blocks of up to %d", len(block_rows), len(blocks), TABLE_BLOCK_ROWS)
+
+    results = await asyncio.gather(*[
+        extract_table_block(file_id, company_id, question, block, value_columns) for block in blocks
+    ])
+
+    suggested_values = {str(row_idx): {col_key: "" for col_key in year_col_keys} for row_idx in editable_row_indices}
+    unit_warnings = []
+    for values, warnings, _ in results:
+        unit_warnings.extend(warnings)
+        for row_idx, cells in values.items():
+            # Only cells of the table's own rows and columns are kept
+            if row_idx in suggested_values:
+                for col_key, value in cells.items():
+                    if col_key in suggested_values[row_idx]:
+                        suggested_values[row_idx][col_key] = value
+
+    timing = {
+        "mode": "chunked",
+        "wall_time_ms": round((time.perf_counter() - started) * 1000, 1),
+        "blocks": [report for _, _, report in results]
+    }
+    logger.info("Chunked extraction finished in %s ms", timing["wall_time_ms"])
+    return {
+        "suggested_values": suggested_values,
+        "unit_warnings": unit_warnings,
+        "parameters_info": parameters_info,
+        "timing": timing
+    }
@@ -1,15 +1,48 @@
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body, Depends
-from .rag_service import process_file_and_store, retrieve_relevant_chunks, ask_gemini_with_context, delete_file_and_index, extract_table_values
+import os
+import asyncio
+from fastapi import APIRouter, UploadFile, File, HTTPException, Body, Depends, Query
+from .ingestion import IngestionQueueFull, get_ingestion_manager, save_upload
+from .rag_service import (
+    retrieve_relevant_chunks, ask_gemini_with_context, delete_file_and_index, extract_table_values,
+    get_vector_store_cache, get_file_metadata, search_company_documents
+)
 
 # Table Extraction Models
-from typing import Dict, Any, List, Optional
-from pydantic import BaseModel
-from dependencies import get_database
+from typing import Dict, Any, List, Literal, Optional
+from pydantic import BaseModel, Field
+from dependencies import get_database, get_current_active_user
+from services.llm_cache import get_response_cache
+from services.llm_gateway import llm_gateway_stats
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from .instrumentation import get_logger, stage_metrics
 
+logger = get_logger("api")
 router = APIRouter(prefix="/rag", tags=["RAG"])
 
+async def resolve_file_company(file_id: str, user: Dict, db) -> Optional[str]:
+    """
+    Company store holding a file, or None for a legacy per-file index.
+    Files of another company are reported as not found.
+    """
+    file_metadata = await get_file_metadata(file_id, db)
+    company_id = file_metadata.get("company_id") if file_metadata else None
+    if company_id and company_id != user.get("company_id"):
+        raise HTTPException(status_code=404, detail="File not found")
+    return company_id
+
+async def require_company_store(file_id: str, user: Dict, db) -> str:
+    """Company store to search for a file; legacy per-file indexes must be migrated first"""
+    company_id = await resolve_file_company(file_id, user, db)
+    if company_id is None:
+        if await get_file_metadata(file_id, db) is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        raise HTTPException(
+            status_code=409,
+            detail="File uses a legacy index; run scripts.migrate_faiss_indexes to move it into the company store"
+        )
+    return company_id
+
 # Request/Response models
 class ChatRequest(BaseModel):
     file_id: str
@@ -22,28 +55,79 @@ class ChatResponse(BaseModel):
 @router.post("/chat/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest = Body(...),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    user: Dict = Depends(get_current_active_user)
 ):
-    # Optionally check file exists using async db
-    # file_metadata = await get_file_metadata(request.file_id, db)
-    docs = retrieve_relevant_chunks(request.file_id, request.question, k=3)
+    company_id = await require_company_store(request.file_id, user, db)
+    docs = retrieve_relevant_chunks(request.file_id, request.question, company_id, k=3)
     if not docs:
         return ChatResponse(response="No relevant information found in the uploaded document.")
     context = "\n".join([doc.page_content for doc in docs])
-    answer = ask_gemini_with_context(context, request.question)
+    answer = await ask_gemini_with_context(context, request.question)
     return ChatResponse(response=answer)
 
+class SearchRequest(BaseModel):
+    question: str
+    k: int = Field(5, ge=1, le=50)
+    file_ids: Optional[List[str]] = None  # None searches every document of the company
+
+# Cross-document search over the company's vector store
+@router.post("/search")
+async def search_documents(
+    request: SearchRequest = Body(...),
+    user: Dict = Depends(get_current_active_user)
+):
+    """Most relevant chunks across the company's documents, with the file and location each came from"""
+    company_id = user.get("company_id")
+    if not company_id:
+        raise HTTPException(status_code=400, detail="User is not associated with a company")
+    # Embedding the query and searching FAISS are CPU-bound
+    docs = await asyncio.to_thread(
+        search_company_documents, company_id, [request.question], k=request.k, file_ids=request.file_ids
+    )
+    return {
+        "results": [
+            {"file_id": doc.metadata.get("file_id"), "location": doc.metadata, "content": doc.page_content, "score": score}
+            for doc, score in docs
+        ]
+    }
+
 @router.get("/ping")
 def ping():
     return {"message": "RAG module is up!"}
 
+@router.get("/cache/stats")
+def vector_store_cache_stats(user: Dict = Depends(get_current_active_user)):
+    """Hit/miss/eviction counters and the on-disk size of the FAISS indexes in the store cache"""
+    return get_vector_store_cache().stats()
+
+@router.get("/llm/stats")
+def llm_stats(user: Dict = Depends(get_current_active_user)):
+    """Hit ratio and size of the LLM response cache, and call/retry counts per Gemini endpoint"""
+    return {"response_cache": get_response_cache().stats(), "gateways": llm_gateway_stats()}
+
+@router.get("/metrics")
+def rag_metrics(user: Dict = Depends(get_current_active_user)):
+    """Latency histograms (ms) of the RAG stages in this worker: embed, retrieve, llm and parse"""
+    return {"stages": stage_metrics()}
+
 
 # File upload endpoint
-@router.post("/upload/")
+@router.post("/upload/", status_code=202)
 async def upload_file(
     file: UploadFile = File(...),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    wait: bool = Query(False, description="Respond only once the file is indexed"),
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    user: Dict = Depends(get_current_active_user)
 ):
+    """
+    Queue a document for ingestion and return its job immediately; poll
+    /rag/jobs/{job_id} for progress. The file_id can be used for chat and
+    extraction once the job has completed. With wait=true the response is
+    held until then, without blocking other requests. A file identical to
+    one the company already uploaded returns that file's job or file_id
+    instead of being indexed again; dedup reports the hit rates so far.
+    """
     # Support multiple file types
     allowed_extensions = ['.pdf', '.doc', '.docx', '.xls', '.xlsx']
     file_ext = '.' + file.filename.lower().split('.')[-1] if file.filename else ''
@@ -56,21 +140,63 @@ async def upload_file(
     
     if file.size is None:
         raise HTTPException(status_code=400, detail="File size is required")
+
+    company_id = user.get("company_id")
+    if not company_id:
+        raise HTTPException(status_code=400, detail="User is not associated with a company")
     
-    try:
-        file_bytes = await file.read()
-        print(f"🔍 [RAG API] Uploading file: {file.filename} ({file.size} bytes)")
-        file_id = await process_file_and_store(file_bytes, file.filename, file.size, db)
-        print(f"🔍 [RAG API] File uploaded successfully with ID: {file_id}")
-        return {"file_id": file_id}
-    except Exception as e:
-        print(f"❌ [RAG API] Error processing file: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    manager = get_ingestion_manager()
+    if manager.is_full():
+        raise HTTPException(status_code=429, detail="Ingestion queue is full, please retry shortly")
+
+    logger.info("Uploading file: %s (%d bytes)", file.filename, file.size)
+    upload_path, content_hash = await save_upload(file)
+    job = await manager.find_duplicate(file.filename, file.size, company_id, content_hash, db)
+    deduplicated = job is not None
+    if deduplicated:
+        os.remove(upload_path)
+    else:
+        try:
+            job = manager.submit(upload_path, file.filename, file.size, company_id, content_hash, db)
+        except IngestionQueueFull as e:
+            os.remove(upload_path)
+            raise HTTPException(status_code=429, detail=str(e))
+
+    if wait:
+        await job.done.wait()
+        if job.status == "failed":
+            logger.error("Error processing file %s: %s", file.filename, job.error)
+            raise HTTPException(status_code=500, detail=f"Error processing file: {job.error}")
+        logger.info("File uploaded successfully with ID: %s", job.file_id)
+    return {
+        "job_id": job.job_id,
+        "file_id": job.file_id,
+        "status": job.status,
+        "deduplicated": deduplicated,
+        "dedup": manager.dedup_stats()
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, user: Dict = Depends(get_current_active_user)):
+    """
+    Status and progress (pages parsed, chunks embedded) of an upload's
+    ingestion job. Jobs of another company are reported as not found. Jobs are
+    kept in memory by the process that accepted the upload (see rag.ingestion).
+    """
+    job = get_ingestion_manager().get(job_id)
+    if job is None or job.company_id != user.get("company_id"):
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job.to_dict()
 
 
 
 @router.delete("/file/{file_id}")
-async def delete_file(file_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
+async def delete_file(
+    file_id: str,
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    user: Dict = Depends(get_current_active_user)
+):
+    await resolve_file_company(file_id, user, db)
     success = await delete_file_and_index(file_id, db)
     if not success:
         raise HTTPException(status_code=404, detail="File not found")
@@ -83,34 +209,38 @@ class TableExtractionRequest(BaseModel):
     file_id: str
     table_metadata: Dict[str, Any]
     question: str
+    mode: Literal["auto", "single", "chunked"] = "auto"
 
 class TableExtractionResponse(BaseModel):
     suggested_values: Dict[str, Dict[str, Any]]
     unit_warnings: Optional[List[str]] = []
+    timing: Optional[Dict[str, Any]] = None  # Wall time, and per-block latency in chunked mode
 
 # Table extraction endpoint
 @router.post("/extract-table", response_model=TableExtractionResponse)
 async def extract_table(
     request: TableExtractionRequest = Body(...),
-    db: AsyncIOMotorDatabase = Depends(get_database)
+    db: AsyncIOMotorDatabase = Depends(get_database),
+    user: Dict = Depends(get_current_active_user)
 ):
     """
     Extracts table values from a document for a given table metadata and question.
     Returns a mapping of rowIdx -> {colKey: value, ...} for editable fields only.
     """
-    print(f"🔍 [RAG API] Table extraction request:")
-    print(f"🔍 [RAG API] File ID: {request.file_id}")
-    print(f"🔍 [RAG API] Question: {request.question}")
-    print(f"🔍 [RAG API] Table metadata keys: {list(request.table_metadata.keys()) if request.table_metadata else 'None'}")
+    logger.info("Table extraction request for file_id: %s (mode %s)", request.file_id, request.mode)
+    logger.debug("Table metadata keys: %s", list(request.table_metadata) if request.table_metadata else None)
     
+    company_id = await require_company_store(request.file_id, user, db)
     try:
         result = await extract_table_values(
             file_id=request.file_id,
             table_metadata=request.table_metadata,
-            question=request.question
+            question=request.question,
+            company_id=company_id,
+            mode=request.mode
         )
-        print(f"🔍 [RAG API] Extraction result: {result}")
+        logger.debug("Extraction result: %s", result)
         return result
     except Exception as e:
-        print(f"❌ [RAG API] Error in table extraction: {str(e)}")
+        logger.exception("Error in table extraction for file_id: %s", request.file_id)
         raise HTTPException(status_code=500, detail=f"Error extracting table values: {str(e)}")
\ No newline at end of file
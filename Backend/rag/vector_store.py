@@ -0,0 +1,283 @@
+# Consolidated FAISS vector store per company
+#
+# Every file a company uploads is indexed into one FAISS index. Vector ids are
+# the row ids of the chunks table in a SQLite docstore next to the index, where
+# each chunk keeps its text, file_id and source location (page, sheet rows...).
+# Searches can be limited to some files with an ID selector, a file's vectors
+# can be removed by file_id, and leaving the filter out searches across every
+# document of the company.
+#
+# The docstore also caches each chunk's embedding under the SHA-256 of its
+# text, so re-uploading a revised document only embeds the chunks that changed.
+#
+# Once a store is large enough to be IVF, readers memory-map its inverted
+# lists instead of reading them into the heap, so every uvicorn worker serving
+# the same company shares those pages through the OS page cache. Smaller, flat
+# stores (under IVF_MIN_VECTORS vectors) are read fully into each reader's
+# memory: faiss 1.8 can only map IVF lists, and a flat index that size holds
+# at most about 15 MB of 384-dimensional vectors. Writers load a private
+# in-memory copy, modify it and swap the file in atomically; mappings of the
+# old file stay valid until they reload.
+
+import os
+import json
+import hashlib
+import fcntl
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from .instrumentation import get_logger
+
+logger = get_logger("vector_store")
+
+# The index starts exact (flat) and is retrained as IVF once it holds this many vectors
+IVF_MIN_VECTORS = int(os.getenv("RAG_IVF_MIN_VECTORS", "10000"))
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+
+# Set RAG_INDEX_MMAP=0 to read IVF indexes fully into memory as well
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "1") != "0"
+# IO_FLAG_MMAP maps the inverted lists of IVF indexes only; flat indexes are read into memory regardless
+MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "chunks.sqlite"
+LOCK_FILE = ".lock"
+
+
+def company_store_dir(index_dir: str, company_id: str) -> str:
+    return os.path.join(index_dir, f"company_{company_id}")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CompanyVectorStore:
+    """
+    A company's chunks across all of its files: one FAISS index with an ID map
+    plus a SQLite docstore keyed by the same ids. Writers (ingestion workers,
+    deletes) serialize on a file lock and replace the index file atomically;
+    readers open it read-only (mapping IVF lists) and reopen it whenever its
+    modification time changes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self._db = sqlite3.connect(os.path.join(directory, DOCSTORE_FILE), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, file_id TEXT NOT NULL, location TEXT, text TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_file_id ON chunks (file_id)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(chunks)")}
+        if "text_hash" not in columns:
+            # Stores created before the embedding cache
+            self._db.execute("ALTER TABLE chunks ADD COLUMN text_hash TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_text_hash ON chunks (text_hash)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (text_hash TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_mtime = None
+
+    # -- index file handling -------------------------------------------------
+
+    def _refresh(self):
+        """Remap the index if another process has written a newer one"""
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            self._index, self._index_mtime = None, None
+            return
+        if mtime != self._index_mtime:
+            if INDEX_MMAP:
+                self._index = faiss.read_index(self.index_path, MMAP_IO_FLAGS)
+            else:
+                self._index = faiss.read_index(self.index_path)
+            self._index_mtime = mtime
+
+    def _save(self):
+        temp_path = self.index_path + ".tmp"
+        faiss.write_index(self._index, temp_path)
+        os.replace(temp_path, self.index_path)
+
+    @contextmanager
+    def _write_lock(self):
+        """
+        Hold the store's file lock with a writable, in-memory copy of the index
+        in self._index. Afterwards the copy is dropped and the next read maps
+        the saved file, so writers do not keep a private copy of the index.
+        """
+        with self._lock, open(os.path.join(self.directory, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._index = faiss.read_index(self.index_path) if os.path.exists(self.index_path) else None
+                yield
+            finally:
+                self._index, self._index_mtime = None, None
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @property
+    def size_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.index_path)
+        except OSError:
+            return 0
+
+    @property
+    def ntotal(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._index.ntotal if self._index is not None else 0
+
+    # -- writes ----------------------------------------------------------------
+
+    def stage_chunks(self, file_id: str, texts: Sequence[str], locations: Sequence[dict]) -> List[int]:
+        """
+        Store chunk texts for a file and return their ids. Staged chunks are
+        invisible to search until their vectors are added with add_vectors.
+        """
+        with self._lock:
+            ids = []
+            for text, location in zip(texts, locations):
+                cursor = self._db.execute(
+                    "INSERT INTO chunks (file_id, location, text, text_hash) VALUES (?, ?, ?, ?)",
+                    (file_id, json.dumps(location or {}), text, chunk_hash(text))
+                )
+                ids.append(cursor.lastrowid)
+            self._db.commit()
+            return ids
+
+    def cached_vectors(self, text_hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Embeddings cached for any of text_hashes, by hash"""
+        if not text_hashes:
+            return {}
+        placeholders = ",".join("?" * len(text_hashes))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE text_hash IN ({placeholders})", list(text_hashes)
+            ).fetchall()
+        return {text_hash: np.frombuffer(vector, dtype=np.float32) for text_hash, vector in rows}
+
+    def cache_vectors(self, text_hashes: Sequence[str], vectors: np.ndarray):
+        """Remember the embeddings of chunk texts by hash for later uploads"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings (text_hash, vector) VALUES (?, ?)",
+                [(text_hash, vector.tobytes()) for text_hash, vector in zip(text_hashes, vectors)]
+            )
+            self._db.commit()
+
+    def add_vectors(self, ids: Sequence[int], vectors: np.ndarray):
+        """Add staged chunks' vectors to the index and save it"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._write_lock():
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatL2(vectors.shape[1]))
+            self._index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+            self._maybe_train_ivf()
+            self._save()
+
+    def remove_file(self, file_id: str) -> int:
+        """Remove a file's vectors and chunks; returns how many were removed"""
+        with self._write_lock():
+            ids = self._file_ids([file_id])
+            removed = 0
+            if self._index is not None and len(ids):
+                removed = self._index.remove_ids(faiss.IDSelectorBatch(ids))
+                self._save()
+            self._db.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+            # Cached embeddings are kept only while some file still has that chunk
+            self._db.execute(
+                "DELETE FROM embeddings WHERE text_hash NOT IN "
+                "(SELECT text_hash FROM chunks WHERE text_hash IS NOT NULL)"
+            )
+            self._db.commit()
+            return removed
+
+    def _maybe_train_ivf(self):
+        """Swap the exact index for IVF once it is large enough for clustering to pay off"""
+        if isinstance(self._index, faiss.IndexIVF) or self._index.ntotal < IVF_MIN_VECTORS:
+            return
+        flat = self._index
+        ids = faiss.vector_to_array(flat.id_map).astype(np.int64)
+        vectors = flat.index.reconstruct_n(0, flat.ntotal)
+        nlist = max(1, int(4 * np.sqrt(len(ids))))
+        quantizer = faiss.IndexFlatL2(vectors.shape[1])
+        ivf = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_L2)
+        ivf.train(vectors)
+        ivf.add_with_ids(vectors, ids)
+        self._index = ivf
+        logger.info("Retrained %s as IVF with %d lists over %d vectors", self.directory, nlist, len(ids))
+
+    # -- reads -----------------------------------------------------------------
+
+    def _file_ids(self, file_ids: Sequence[str]) -> np.ndarray:
+        placeholders = ",".join("?" * len(file_ids))
+        rows = self._db.execute(f"SELECT id FROM chunks WHERE file_id IN ({placeholders})", list(file_ids))
+        return np.fromiter((row[0] for row in rows), dtype=np.int64)
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        file_ids: Optional[Sequence[str]] = None
+    ) -> List[List[Tuple[dict, float]]]:
+        """
+        Nearest chunks for each query vector, as (chunk, L2 distance) pairs
+        best first. file_ids limits the search to those files; None searches
+        every file of the company.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._refresh()
+            if self._index is None:
+                return [[] for _ in range(len(vectors))]
+
+            selector = None
+            if file_ids is not None:
+                ids = self._file_ids(file_ids)
+                if not len(ids):
+                    return [[] for _ in range(len(vectors))]
+                selector = faiss.IDSelectorBatch(ids)
+            if isinstance(self._index, faiss.IndexIVF):
+                params = faiss.SearchParametersIVF(sel=selector, nprobe=IVF_NPROBE)
+            else:
+                params = faiss.SearchParameters(sel=selector)
+            distances, positions = self._index.search(vectors, k, params=params)
+
+            chunks = self._get_chunks({int(i) for i in positions.ravel() if i != -1})
+        results = []
+        for row_distances, row_ids in zip(distances.tolist(), positions.tolist()):
+            # Ids whose chunk row is gone (removal in progress) are skipped
+            results.append([
+                (chunks[chunk_id], distance)
+                for distance, chunk_id in zip(row_distances, row_ids)
+                if chunk_id in chunks
+            ])
+        return results
+
+    def _get_chunks(self, ids) -> Dict[int, dict]:
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._db.execute(
+            f"SELECT id, file_id, location, text FROM chunks WHERE id IN ({placeholders})", list(ids)
+        )
+        return {
+            chunk_id: {"id": chunk_id, "file_id": file_id, "location": json.loads(location or "{}"), "text": text}
+            for chunk_id, file_id, location, text in rows
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status, Body
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from services.environment import EnvironmentService
+from services.aggregation_queue import get_aggregation_queue
 from dependencies import get_database, get_current_active_user, check_company_access
 from models.environment import EnvironmentReport, QuestionAnswer
 from pydantic import BaseModel, Field
@@ -219,6 +220,54 @@ async def bulk_update_answers(
         raise HTTPException(status_code=404, detail="Update failed")
     return {"message": "Answers updated successfully"}
 
+class RollupRebuild(BaseModel):
+    questionTitle: Optional[str] = None  # Left unchanged on C001 when not given
+    verify_only: bool = False
+
+@router.post("/reports/{financial_year}/rollups/{question_id}/rebuild")
+async def rebuild_table_rollup(
+    financial_year: str,
+    question_id: str,
+    rebuild: RollupRebuild = Body(default=RollupRebuild()),
+    service: EnvironmentService = Depends(get_environment_service),
+    user: Dict = Depends(get_current_active_user)
+):
+    """
+    Recompute C001's aggregated answer for a table question from every plant.
+    Reports any drift between the incremental roll-up and the recomputed totals;
+    with verify_only set, nothing is written.
+    """
+    if not user.get("company_id"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="User does not have company access"
+        )
+
+    try:
+        return await service.rebuild_table_rollup(
+            company_id=user["company_id"],
+            financial_year=financial_year,
+            question_id=question_id,
+            question_title=rebuild.questionTitle,
+            verify_only=rebuild.verify_only
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/aggregation/status")
+async def get_aggregation_status(
+    user: Dict = Depends(get_current_active_user)
+):
+    """
+    Status of the background C001 aggregation queue: how many questions are
+    waiting (depth), how long the oldest has waited (lag_seconds) and how many
+    edits were coalesced into shared roll-ups.
+    """
+    queue = get_aggregation_queue()
+    if queue is None:
+        return {"running": False, "depth": 0, "lag_seconds": 0.0}
+    return queue.status()
+
 class TableAnswerUpdate(BaseModel):
     questionId: str
     questionTitle: str
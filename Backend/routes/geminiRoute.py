@@ -79,9 +79,9 @@ async def get_stream(stream_id: str):
             stream = await gemini_service.generate_content_stream(prompt)
             
             async for chunk in stream:
-                if chunk.text:
-                    logger.info(f"Streaming chunk for {stream_id}: {chunk.text}")
-                    yield f"data: {chunk.text}\n\n"
+                if chunk:
+                    logger.info(f"Streaming chunk for {stream_id}: {chunk}")
+                    yield f"data: {chunk}\n\n"
             
             logger.info(f"Stream {stream_id} complete")
             yield "event: complete\ndata: \n\n"
@@ -140,9 +140,9 @@ async def get_stream_from_first(stream_id: str):
             stream = await gemini_service.generate_content_stream(prompt)
             
             async for chunk in stream:
-                if chunk.text:
-                    logger.info(f"Streaming chunk for {stream_id}: {chunk.text}")
-                    yield f"data: {chunk.text}\n\n"
+                if chunk:
+                    logger.info(f"Streaming chunk for {stream_id}: {chunk}")
+                    yield f"data: {chunk}\n\n"
             
             logger.info(f"Stream {stream_id} complete")
             yield "event: complete\ndata: \n\n"
@@ -1,11 +1,14 @@
 import json
 from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from services.mcpServices.LLMs.Groq.ToolService import get_tool_service, ToolService
 from services.mcpServices.LLMs.Groq.GroqSerivce import get_groq_service, GroqService
 from services.mcpServices.LLMs.Groq.LoggerService import get_logger
 from services.mcpServices.LLMs.Groq.DatabaseService import get_database_service, DatabaseService
+from services.mcpServices.LLMs.Groq.PromptService import prompt_stats
+from services.mcpServices.LLMs.Groq.IntentRouter import router_stats
+from services.llm_gateway import llm_gateway_stats
 from bson import ObjectId
 from datetime import datetime
 
@@ -16,6 +19,7 @@ router = APIRouter()
 class ChatRequest(BaseModel):
     sessionId: str
     message: str
+    stream: bool = False  # Stream large query results as NDJSON pages
 
 def convert_objectid(obj):
     if isinstance(obj, ObjectId):
@@ -28,6 +32,17 @@ def convert_objectid(obj):
         return {k: convert_objectid(v) for k, v in obj.items()}
     return obj
 
+async def stream_find_pages(tool_service: ToolService, find_spec):
+    """Documents of a large find as NDJSON, one {"page": n, "reply": [...]} line per page"""
+    try:
+        page_number = 0
+        async for page in tool_service.iter_find_pages(*find_spec):
+            page_number += 1
+            yield json.dumps({"page": page_number, "reply": convert_objectid(page)}) + "\n"
+    except Exception as e:
+        logger.error("Error streaming database query: %s", e)
+        yield json.dumps({"error": f"Error executing database query: {str(e)}"}) + "\n"
+
 @router.post("/api/chat")
 async def chat_endpoint(
     request: ChatRequest,
@@ -52,7 +67,10 @@ async def chat_endpoint(
             try:
                 if isinstance(result, str):
                     result = json.loads(result)
-                db_result = tool_service.db_call(result, user_prompt=request.message)
+                find_spec = tool_service.find_spec(result, user_prompt=request.message) if request.stream else None
+                if find_spec is not None:
+                    return StreamingResponse(stream_find_pages(tool_service, find_spec), media_type="application/x-ndjson")
+                db_result = await tool_service.db_call(result, user_prompt=request.message)
                 logger.info("Database query result: %s", db_result)
                 db_result = convert_objectid(db_result)
                 # --- Friendly message for plant count queries ---
@@ -79,3 +97,13 @@ async def chat_endpoint(
     except Exception as e:
         logger.error("Unexpected error in chat endpoint: %s", e)
         return JSONResponse({"reply": f"Unexpected error: {str(e)}"}, status_code=500)
+
+@router.get("/api/chat/prompt-stats")
+async def chat_prompt_stats():
+    """Prompt tokens the chat assistant sent, served from Gemini's cache and saved by sending only the relevant sections"""
+    return {"prompts": prompt_stats(), "gateway": llm_gateway_stats().get("gemini_mcp")}
+
+@router.get("/api/chat/router-stats")
+async def chat_router_stats():
+    """Share of chat messages answered by the fast-path templates without the LLM, and the latency of both paths"""
+    return router_stats()
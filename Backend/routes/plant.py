@@ -4,6 +4,7 @@ from dependencies import get_database, get_current_active_user ,get_current_user
 from models.plant import PlantCreate, Plant, PlantUpdate, PlantWithCompany, PlantWithAnswers
 from models.auth import User, DeleteEmployeeRequest
 from services.plant import PlantService
+from services.name_index import PLANT_NAMES, invalidate_name_index, with_name_key
 import uuid
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -58,7 +59,8 @@ async def create_plant(
             )
             
         # Insert plant into database
-        await db.plants.insert_one(plant_dict)
+        await db.plants.insert_one(with_name_key(PLANT_NAMES, plant_dict))
+        invalidate_name_index(PLANT_NAMES)
 
         # Initialize environment report for the new plant
         environment_report = {
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark of rag.answer_parser against the per-line regex parsing it
+replaced in rag_service.extract_table_values, over the recorded model answers
+in scripts/bench_data/table_answers.json.
+
+Both parsers run on every answer line first and any lines they read
+differently are listed; the new parser also converts units to the row's
+unit, which the legacy one ignored. Then each is timed over the corpus.
+
+Usage (from Backend/):
+    python -m scripts.bench_answer_parser --repeat 200
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from rag.answer_parser import parse_answer_value  # noqa: E402
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "bench_data", "table_answers.json")
+
+
+def legacy_parse(line):
+    line = line.strip()
+    if not line:
+        return ""
+    bracket_match = re.search(r'\[([^\]]+)\]', line)
+    if bracket_match:
+        bracket_value = bracket_match.group(1).strip()
+        if bracket_value.upper() in ['Y', 'YES']:
+            return "Y"
+        elif bracket_value.upper() in ['N', 'NO', 'N.A.', 'NA']:
+            return "N"
+        numbers = re.findall(r'[\d,]+(?:\.[\d]+)?', bracket_value)
+        if numbers:
+            value = numbers[0].replace(',', '')
+            try:
+                float(value)
+                return value
+            except ValueError:
+                return ""
+        if any(word in bracket_value.lower() for word in ['nil', 'zero', 'not applicable', 'n/a', 'none']):
+            return "0"
+        return ""
+    if line.upper() in ['Y', 'YES']:
+        return "Y"
+    elif line.upper() in ['N', 'NO', 'N.A.', 'NA']:
+        return "N"
+    numbers = re.findall(r'(?:^|\s)(\d+(?:\.\d+)?)(?:\s|$|%)', line)
+    if not numbers:
+        numbers = re.findall(r'[\d,]+(?:\.[\d]+)?', line)
+    if numbers:
+        value = numbers[-1].replace(',', '')
+        try:
+            float(value)
+            return value
+        except ValueError:
+            return ""
+    if any(word in line.lower() for word in ['nil', 'zero', 'not applicable', 'n/a', 'none']):
+        return "0"
+    return ""
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        answers = json.load(f)
+    return [(line, answer["unit"] or None) for answer in answers for line in answer["answer"].split("\n")]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the corpus per timing")
+    args = parser.parse_args()
+
+    lines = load_corpus()
+    print(f"{len(lines)} answer lines")
+    differences = 0
+    for line, unit in lines:
+        legacy = legacy_parse(line)
+        parsed = parse_answer_value(line, unit)
+        if legacy != parsed.value or parsed.warning:
+            differences += 1
+            note = f"  ({parsed.warning})" if parsed.warning else ""
+            print(f"  {line!r}: legacy {legacy!r} -> {parsed.value!r}{note}")
+    print(f"{differences} lines read differently or with a unit note")
+
+    legacy_time = timeit.timeit(lambda: [legacy_parse(line) for line, _ in lines], number=args.repeat)
+    plain_time = timeit.timeit(lambda: [parse_answer_value(line) for line, _ in lines], number=args.repeat)
+    unit_time = timeit.timeit(lambda: [parse_answer_value(line, unit) for line, unit in lines], number=args.repeat)
+    per_line = 1e6 / (args.repeat * len(lines))
+    print(f"{'parser':<24}{'us/line':>10}")
+    print(f"{'legacy':<24}{legacy_time * per_line:>10.2f}")
+    print(f"{'answer_parser':<24}{plain_time * per_line:>10.2f}")
+    print(f"{'answer_parser + units':<24}{unit_time * per_line:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
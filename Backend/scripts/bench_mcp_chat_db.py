@@ -0,0 +1,90 @@
+"""
+Benchmark the database side of an /api/chat request.
+
+Seeds a throwaway database with one company and its plants, then times what
+the endpoint does once the LLM has answered a count_plants question. The old
+path opened a new pymongo client, pinged the server and ran the lookup with
+blocking calls on every request; the new one awaits ToolService.db_call on
+the shared Motor pool. The Groq call is not included.
+
+Usage (from Backend/):
+    python -m scripts.bench_mcp_chat_db --repeats 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.mcpServices.LLMs.Groq.DatabaseService import DatabaseService  # noqa: E402
+from services.mcpServices.LLMs.Groq.ToolService import ToolService  # noqa: E402
+
+load_dotenv()
+
+PLANTS = 20
+
+
+def seed(db):
+    company_id = str(uuid.uuid4())
+    plant_ids = [str(uuid.uuid4()) for _ in range(PLANTS)]
+    db.companies.insert_one({"_id": company_id, "id": company_id, "name": "Bench Co", "plant_ids": plant_ids})
+    return company_id
+
+
+def percentiles(samples):
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+async def run(repeats: int):
+    uri = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+    db_name = f"brsr_bench_{uuid.uuid4().hex[:8]}"
+    admin = MongoClient(uri)
+    company_id = seed(admin[db_name])
+    legacy_clients = []
+
+    def legacy_request():
+        # What the endpoint did per request before the shared pool and Motor
+        client = MongoClient(uri)
+        client.admin.command('ping')
+        legacy_clients.append(client)
+        company = client[db_name]["companies"].find_one({"_id": company_id})
+        return len(company.get("plant_ids", []))
+
+    service = DatabaseService(uri, db_name)
+    await service.ping()
+    query = {"operation": "count_plants", "company_id": company_id}
+
+    try:
+        legacy, pooled = [], []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            legacy_request()
+            legacy.append((time.perf_counter() - start) * 1000)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            await ToolService(service.get_db()).db_call(query)
+            pooled.append((time.perf_counter() - start) * 1000)
+        print(f"{'path':<24}{'p50':>10}{'p95':>10}  (ms)")
+        print(f"{'pymongo client/request':<24}{percentiles(legacy)[0]:>10.2f}{percentiles(legacy)[1]:>10.2f}")
+        print(f"{'shared Motor pool':<24}{percentiles(pooled)[0]:>10.2f}{percentiles(pooled)[1]:>10.2f}")
+    finally:
+        for client in legacy_clients:
+            client.close()
+        service.close()
+        admin.drop_database(db_name)
+        admin.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.repeats))
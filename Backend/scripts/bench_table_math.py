@@ -0,0 +1,162 @@
+"""
+Micro-benchmark of services.table_math against the nested Python loops it
+replaced in AggregationService and EnvironmentService.update_table_answer.
+
+Both implementations run on the same synthetic plant tables; their outputs are
+checked for equality before timing.
+
+Usage (from Backend/):
+    python -m scripts.bench_table_math --plants 10 100 1000 --rows 30
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services import table_math  # noqa: E402
+from services.question_index import is_total_row, should_aggregate_row  # noqa: E402
+
+
+def make_rows(row_count: int):
+    rows = []
+    for i in range(row_count):
+        if i % 5 == 4:
+            rows.append({"parameter": f"<b>Total of section {i // 5}</b>"})
+        elif i % 7 == 6:
+            rows.append({"parameter": f"Energy intensity per rupee {i}"})
+        else:
+            rows.append({"parameter": f"Parameter {i}"})
+    return rows
+
+
+def make_tables(plant_count: int, row_count: int, with_units: bool):
+    rng = random.Random(plant_count * 1000 + row_count)
+    tables = []
+    for _ in range(plant_count):
+        table = []
+        for _ in range(row_count):
+            cells = {}
+            for key in table_math.YEAR_KEYS:
+                roll = rng.random()
+                if roll < 0.1:
+                    cells[key] = ""
+                elif roll < 0.15:
+                    cells[key] = "N.A."
+                else:
+                    value = f"{rng.uniform(0, 100000):,.2f}"
+                    cells[key] = f"{value} GJ" if with_units and roll < 0.6 else value
+            table.append(cells)
+        tables.append(table)
+    return tables
+
+
+def legacy_safe_float(value):
+    if not value:
+        return 0.0
+    try:
+        if isinstance(value, str):
+            value = value.replace(",", "")
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def legacy_rollup(rows, tables):
+    """Sum across plants, then fill section totals, re-formatting after each addition"""
+    aggregated = [{"current_year": "0", "previous_year": "0"} for _ in rows]
+    for table in tables:
+        for i, (row_data, row_metadata) in enumerate(zip(table, rows)):
+            if not should_aggregate_row(row_metadata):
+                continue
+            for key in table_math.YEAR_KEYS:
+                total = legacy_safe_float(aggregated[i][key]) + legacy_safe_float(row_data.get(key))
+                aggregated[i][key] = f"{total:.2f}"
+    for i, row_metadata in enumerate(rows):
+        if is_total_row(row_metadata):
+            start_idx = 0
+            for j in range(i - 1, -1, -1):
+                if is_total_row(rows[j]):
+                    start_idx = j + 1
+                    break
+            for key in table_math.YEAR_KEYS:
+                total = sum(legacy_safe_float(aggregated[j][key]) for j in range(start_idx, i))
+                aggregated[i][key] = f"{total:.2f}"
+    return aggregated
+
+
+def vectorized_rollup(rows, tables):
+    aggregate_rows = [should_aggregate_row(row) for row in rows]
+    total_rows = [is_total_row(row) for row in rows]
+    sums = table_math.sum_plants(table_math.to_array(tables, len(rows)), aggregate_rows)
+    sums = table_math.section_totals(sums, total_rows)
+    blank_rows = [not a and not t for a, t in zip(aggregate_rows, total_rows)]
+    return table_math.format_table(sums, blank_rows=blank_rows)
+
+
+def legacy_extract_number_and_unit(value):
+    if not value or value.strip() == "":
+        return 0.0, ""
+    parts = value.strip().split(maxsplit=1)
+    try:
+        return float(parts[0].replace(',', '')), parts[1] if len(parts) > 1 else ""
+    except (ValueError, IndexError):
+        return 0.0, ""
+
+
+def legacy_unit_sum(tables):
+    """The unit-aware sum update_table_answer used to run"""
+    aggregated = [{key: {"value": 0.0, "unit": ""} for key in table_math.YEAR_KEYS} for _ in tables[0]]
+    for table in tables:
+        for i, row in enumerate(table[:len(aggregated)]):
+            for key in table_math.YEAR_KEYS:
+                value, unit = legacy_extract_number_and_unit(row.get(key, "0"))
+                aggregated[i][key]["value"] += value
+                if not aggregated[i][key]["unit"] and unit:
+                    aggregated[i][key]["unit"] = unit
+    return [
+        {key: f"{row[key]['value']:.2f} {row[key]['unit']}".strip() for key in table_math.YEAR_KEYS}
+        for row in aggregated
+    ]
+
+
+def vectorized_unit_sum(tables):
+    array = table_math.to_array(tables, len(tables[0]), with_units=True)
+    return table_math.format_table(table_math.sum_plants(array), units=table_math.first_units(array))
+
+
+def bench(label, legacy, vectorized, args, repeats):
+    legacy_result = legacy(*args)
+    vectorized_result = vectorized(*args)
+    mismatches = sum(1 for a, b in zip(legacy_result, vectorized_result) if a != b)
+    legacy_ms = min(timeit.repeat(lambda: legacy(*args), number=1, repeat=repeats)) * 1000
+    vectorized_ms = min(timeit.repeat(lambda: vectorized(*args), number=1, repeat=repeats)) * 1000
+    print(f"{label:<28} {legacy_ms:>10.2f} {vectorized_ms:>12.2f} {legacy_ms / vectorized_ms:>8.1f}x {mismatches:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plants", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--rows", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{'case':<28} {'loops (ms)':>10} {'numpy (ms)':>12} {'speedup':>9} {'mismatches':>10}")
+    for plant_count in args.plants:
+        bench(
+            f"roll-up, {plant_count} plants",
+            legacy_rollup, vectorized_rollup,
+            (rows, make_tables(plant_count, args.rows, with_units=False)), args.repeats
+        )
+        bench(
+            f"unit sum, {plant_count} plants",
+            legacy_unit_sum, vectorized_unit_sum,
+            (make_tables(plant_count, args.rows, with_units=True),), args.repeats
+        )
+
+
+if __name__ == "__main__":
+    main()
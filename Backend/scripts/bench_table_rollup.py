@@ -0,0 +1,147 @@
+"""
+Benchmark the C001 roll-up in EnvironmentService.update_table_answer.
+
+Seeds a throwaway database with one company, its C001 plant and N regular
+plants, then times table saves against it. The old per-plant find_one fan-out
+is timed alongside the single projected query for comparison.
+
+Usage (from Backend/):
+    python -m scripts.bench_table_rollup --plants 10 100 1000
+    python -m scripts.bench_table_rollup --mock   # in-process mongomock, no server needed
+
+With --mock there are no network round trips, so the numbers show the
+Python-side cost only.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from models.plant import PlantType  # noqa: E402
+from services.environment import EnvironmentService  # noqa: E402
+
+load_dotenv()
+
+FINANCIAL_YEAR = "2024-2025"
+QUESTION_ID = "BENCH-1"
+TABLE_ROWS = 20
+
+
+def make_table(seed: int):
+    return [
+        {"current_year": f"{seed + row} kWh", "previous_year": f"{seed * 2 + row} kWh"}
+        for row in range(TABLE_ROWS)
+    ]
+
+
+async def seed(db, plant_count: int):
+    company_id = str(uuid.uuid4())
+    plants = [{
+        "id": str(uuid.uuid4()),
+        "company_id": company_id,
+        "plant_code": "C001",
+        "plant_type": PlantType.AGGREGATOR.value
+    }]
+    for i in range(plant_count):
+        plants.append({
+            "id": str(uuid.uuid4()),
+            "company_id": company_id,
+            "plant_code": f"P{i + 1:03d}",
+            "plant_type": PlantType.HOME.value if i == 0 else PlantType.REGULAR.value
+        })
+    await db.plants.insert_many(plants)
+    await db.environment.insert_many([
+        {
+            "companyId": company_id,
+            "plantId": plant["id"],
+            "financialYear": FINANCIAL_YEAR,
+            "answers": {
+                QUESTION_ID: {"questionId": QUESTION_ID, "updatedData": make_table(i)}
+            }
+        }
+        for i, plant in enumerate(plants)
+    ])
+    return company_id, [plant["id"] for plant in plants[1:]]
+
+
+async def legacy_fetch(collection, company_id: str, plant_ids):
+    """The per-plant round-trips update_table_answer used to make"""
+    for plant_id in plant_ids:
+        await collection.find_one({
+            "companyId": company_id,
+            "plantId": plant_id,
+            "financialYear": FINANCIAL_YEAR
+        })
+
+
+async def batched_fetch(collection, company_id: str, plant_ids):
+    """The single projected query update_table_answer makes now"""
+    cursor = collection.find(
+        {"companyId": company_id, "financialYear": FINANCIAL_YEAR, "plantId": {"$in": plant_ids}},
+        {"plantId": 1, f"answers.{QUESTION_ID}.updatedData": 1}
+    )
+    await cursor.to_list(length=None)
+
+
+async def timed(repeats: int, func, *args):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+async def run(plant_counts, repeats: int, mock: bool = False):
+    if mock:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    else:
+        client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    db_name = f"brsr_bench_{uuid.uuid4().hex[:8]}"
+    db = client[db_name]
+    service = EnvironmentService(db)
+    await service.create_indices()
+
+    print(f"{'plants':>8} {'fan-out p50':>12} {'query p50':>10} {'save p50':>10} {'save p95':>10}  (ms)")
+    try:
+        for plant_count in plant_counts:
+            company_id, plant_ids = await seed(db, plant_count)
+            source_plant_id = plant_ids[-1]
+            counter = iter(range(10 ** 9))
+
+            async def save():
+                await service.update_table_answer(
+                    company_id=company_id,
+                    plant_id=source_plant_id,
+                    financial_year=FINANCIAL_YEAR,
+                    question_id=QUESTION_ID,
+                    question_title="Benchmark table",
+                    table_data=make_table(next(counter))
+                )
+
+            legacy_p50, _ = await timed(repeats, legacy_fetch, db.environment, company_id, plant_ids)
+            batched_p50, _ = await timed(repeats, batched_fetch, db.environment, company_id, plant_ids)
+            save_p50, save_p95 = await timed(repeats, save)
+            print(f"{plant_count:>8} {legacy_p50:>12.2f} {batched_p50:>10.2f} {save_p50:>10.2f} {save_p95:>10.2f}")
+    finally:
+        await client.drop_database(db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plants", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--mock", action="store_true", help="Run against an in-process mongomock database")
+    args = parser.parse_args()
+    asyncio.run(run(args.plants, args.repeats, args.mock))
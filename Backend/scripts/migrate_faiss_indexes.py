@@ -0,0 +1,112 @@
+"""
+Fold the legacy per-file FAISS indexes (faiss_indexes/faiss_index_<file_id>/)
+into the consolidated per-company vector stores.
+
+Each file's vectors are copied as they are (no re-embedding) together with
+their chunk texts, the file's rag_files document gets its company_id, and
+chat, extraction and deletion switch to the company store from then on.
+Files already migrated are skipped, so the script can be re-run safely.
+The server no longer loads these pickled LangChain indexes, so files are
+only searchable again once migrated.
+
+The company of a file comes from its rag_files document; legacy uploads did
+not record one, so --company-id supplies it for those. Directories without a
+rag_files document are orphans of deleted or failed uploads and are skipped.
+
+Usage (from Backend/):
+    python -m scripts.migrate_faiss_indexes --company-id ID --dry-run
+    python -m scripts.migrate_faiss_indexes --company-id ID
+    python -m scripts.migrate_faiss_indexes --company-id ID --delete  # also remove migrated directories
+"""
+
+import argparse
+import asyncio
+import os
+import pickle
+import shutil
+import sys
+
+import faiss
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from rag.vector_store import CompanyVectorStore, company_store_dir  # noqa: E402
+
+load_dotenv()
+
+FAISS_INDEX_DIR = os.path.join(os.path.dirname(__file__), "..", "faiss_indexes")
+LEGACY_PREFIX = "faiss_index_"
+
+
+def load_legacy_index(path):
+    """Vectors, chunk texts and chunk metadata of a LangChain FAISS.save_local directory"""
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    # Written by this application's own uploads; unpickling needs langchain installed
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vectors = index.reconstruct_n(0, index.ntotal)
+    documents = [docstore.search(index_to_docstore_id[position]) for position in range(index.ntotal)]
+    return vectors, [doc.page_content for doc in documents], [dict(doc.metadata) for doc in documents]
+
+
+async def run(default_company_id, dry_run, delete):
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    stores = {}
+    migrated = skipped = 0
+    try:
+        db = client[os.getenv("DB_NAME", "brsr_db")]
+        for name in sorted(os.listdir(FAISS_INDEX_DIR)):
+            path = os.path.join(FAISS_INDEX_DIR, name)
+            if not name.startswith(LEGACY_PREFIX) or not os.path.isdir(path):
+                continue
+            file_id = name[len(LEGACY_PREFIX):]
+            file_metadata = await db.rag_files.find_one({"_id": file_id})
+            if file_metadata is None:
+                print(f"Skipping {file_id}: no rag_files document")
+                skipped += 1
+                continue
+            if file_metadata.get("company_id"):
+                print(f"Skipping {file_id}: already in company store {file_metadata['company_id']}")
+                skipped += 1
+                continue
+            company_id = file_metadata.get("company_id") or default_company_id
+            if not company_id:
+                print(f"Skipping {file_id}: no company recorded, pass --company-id")
+                skipped += 1
+                continue
+
+            vectors, texts, locations = load_legacy_index(path)
+            print(f"{'Would migrate' if dry_run else 'Migrating'} {file_id}: {len(texts)} chunks -> company {company_id}")
+            if dry_run:
+                migrated += 1
+                continue
+
+            store = stores.get(company_id)
+            if store is None:
+                store = stores[company_id] = CompanyVectorStore(company_store_dir(FAISS_INDEX_DIR, company_id))
+            # Clears chunks left by an earlier run interrupted before rag_files was updated
+            store.remove_file(file_id)
+            ids = store.stage_chunks(file_id, texts, locations)
+            store.add_vectors(ids, vectors)
+            await db.rag_files.update_one(
+                {"_id": file_id},
+                {"$set": {"company_id": company_id, "faiss_path": store.directory, "chunk_count": len(ids)}}
+            )
+            if delete:
+                shutil.rmtree(path)
+            migrated += 1
+    finally:
+        for store in stores.values():
+            store.close()
+        client.close()
+    print(f"{'Would migrate' if dry_run else 'Migrated'} {migrated} indexes, skipped {skipped}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--company-id", default=None, help="Company for files whose rag_files document has none")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated")
+    parser.add_argument("--delete", action="store_true", help="Remove each legacy directory once migrated")
+    args = parser.parse_args()
+    asyncio.run(run(args.company_id, args.dry_run, args.delete))
@@ -0,0 +1,44 @@
+"""
+Regenerate the ghg_totals view from ghg_reports.
+
+Run after restoring or bulk-editing ghg_reports outside the API, or if the
+totals are ever suspected to have drifted.
+
+Usage (from Backend/):
+    python -m scripts.rebuild_ghg_totals                 # every company, from scratch
+    python -m scripts.rebuild_ghg_totals --company-id ID # one company
+    python -m scripts.rebuild_ghg_totals --db New_Brsr   # the MCP tools' database
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from services.ghgService import GHGService  # noqa: E402
+
+load_dotenv()
+
+
+async def run(company_id, db_name):
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    try:
+        service = GHGService(client[db_name])
+        await service.create_indices()
+        count = await service.rebuild_totals(company_id)
+        scope = f"company {company_id}" if company_id else "all companies"
+        print(f"Rebuilt {count} ghg_totals documents for {scope}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--company-id", default=None, help="Only rebuild this company's totals")
+    parser.add_argument("--db", default=os.getenv("DB_NAME", "brsr_db"), help="Database to rebuild (default: DB_NAME)")
+    args = parser.parse_args()
+    asyncio.run(run(args.company_id, args.db))
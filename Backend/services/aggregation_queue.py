@@ -0,0 +1,307 @@
+"""
+Background aggregation of plant answers into C001.
+
+Answer writes submit an aggregation job instead of rolling C001 up inline.
+Jobs are coalesced per (company, financial year, question): repeated edits
+inside the debounce window collapse into one roll-up, and every pending job
+runs within max_delay_seconds of its first submission, so C001 converges
+within a bounded delay however busy the question is. A job that fails is
+rerun once as a full roll-up; if that fails too, the question's roll-up
+shadow is dropped so the next write rebuilds it.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .aggregation_service import AggregationService
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = float(os.getenv("AGGREGATION_DEBOUNCE_SECONDS", "0.5"))
+MAX_DELAY_SECONDS = float(os.getenv("AGGREGATION_MAX_DELAY_SECONDS", "5"))
+
+# (company_id, financial_year, question_id)
+AggregationKey = Tuple[str, str, str]
+
+# Kinds of roll-up a plant's change asks for
+ROLLUP = "rollup"  # AggregationService.aggregate_answers
+UNIT_SUM = "unit_sum"  # AggregationService.aggregate_table_units
+
+
+class PlantChange:
+    """One plant's net change to a question since its job was queued"""
+
+    __slots__ = ("kind", "previous_data", "answer_data", "incremental")
+
+    def __init__(self, kind: str, previous_data: Any, answer_data: Any, incremental: bool):
+        self.kind = kind
+        self.previous_data = previous_data
+        self.answer_data = answer_data
+        self.incremental = incremental
+
+    def merge(self, kind: str, answer_data: Any, incremental: bool) -> None:
+        # The first previous value is kept, so an incremental roll-up applies
+        # the net difference of every coalesced edit in one step
+        self.incremental = self.incremental and incremental and kind == self.kind
+        self.kind = kind
+        self.answer_data = answer_data
+
+
+class PendingAggregation:
+    """Coalesced aggregation job for one (company, financial year, question)"""
+
+    __slots__ = ("question_title", "changes", "first_submitted", "last_submitted", "submissions")
+
+    def __init__(self, question_title: str, now: float):
+        self.question_title = question_title
+        # Keyed by source plant id (None when unknown), in last-write order
+        self.changes: Dict[Optional[str], PlantChange] = {}
+        self.first_submitted = now
+        self.last_submitted = now
+        self.submissions = 0
+
+    def due_at(self, debounce_seconds: float, max_delay_seconds: float) -> float:
+        return min(self.last_submitted + debounce_seconds, self.first_submitted + max_delay_seconds)
+
+
+class AggregationQueue:
+    """Debounced, coalescing asyncio worker that keeps C001 roll-ups up to date"""
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        debounce_seconds: float = DEBOUNCE_SECONDS,
+        max_delay_seconds: float = MAX_DELAY_SECONDS
+    ):
+        self.aggregation_service = AggregationService(db)
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max(max_delay_seconds, debounce_seconds)
+        self._pending: Dict[AggregationKey, PendingAggregation] = {}
+        self._wakeup = asyncio.Event()
+        # Held while a batch is popped and processed, so a key never runs twice at once
+        self._lock = asyncio.Lock()
+        self._worker: Optional[asyncio.Task] = None
+        self._in_flight = 0
+        self._submitted = 0
+        self._coalesced = 0
+        self._processed = 0
+        self._failed = 0
+        self._repaired = 0
+        self._last_lag_seconds: Optional[float] = None
+        self._max_lag_seconds = 0.0
+
+    def start(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+            logger.info(
+                f"Aggregation queue started (debounce {self.debounce_seconds}s, "
+                f"max delay {self.max_delay_seconds}s)"
+            )
+
+    async def stop(self) -> None:
+        """Run everything still pending, then stop the worker"""
+        await self.flush()
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        logger.info("Aggregation queue stopped")
+
+    def submit(
+        self,
+        company_id: str,
+        financial_year: str,
+        question_id: str,
+        question_title: str,
+        answer_data: Any = None,
+        source_plant_id: Optional[str] = None,
+        previous_data: Any = None,
+        incremental: bool = False,
+        kind: str = ROLLUP
+    ) -> None:
+        """Queue a roll-up of one question into C001; takes the same arguments as aggregate_answers"""
+        now = time.monotonic()
+        key = (company_id, financial_year, question_id)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = PendingAggregation(question_title, now)
+        else:
+            self._coalesced += 1
+        entry.question_title = question_title
+        entry.last_submitted = now
+        entry.submissions += 1
+
+        change = entry.changes.pop(source_plant_id, None)
+        if change is None:
+            change = PlantChange(kind, previous_data, answer_data, incremental)
+        else:
+            change.merge(kind, answer_data, incremental)
+        entry.changes[source_plant_id] = change
+
+        self._submitted += 1
+        self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Run every pending job now and wait until C001 has caught up"""
+        async with self._lock:
+            while self._pending:
+                batch, self._pending = self._pending, {}
+                await self._process(batch)
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        oldest = min((entry.first_submitted for entry in self._pending.values()), default=None)
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "depth": len(self._pending),
+            "pending_changes": sum(entry.submissions for entry in self._pending.values()),
+            "in_flight": self._in_flight,
+            "lag_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+            "last_lag_seconds": self._last_lag_seconds,
+            "max_lag_seconds": round(self._max_lag_seconds, 3),
+            "submitted": self._submitted,
+            "coalesced": self._coalesced,
+            "processed": self._processed,
+            "failed": self._failed,
+            "repaired": self._repaired,
+            "debounce_seconds": self.debounce_seconds,
+            "max_delay_seconds": self.max_delay_seconds
+        }
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if not self._pending:
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            next_due = min(
+                entry.due_at(self.debounce_seconds, self.max_delay_seconds)
+                for entry in self._pending.values()
+            )
+            if next_due > now:
+                # Sleep until the next job is due, or until a new job arrives
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=next_due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            async with self._lock:
+                now = time.monotonic()
+                batch = {
+                    key: entry for key, entry in self._pending.items()
+                    if entry.due_at(self.debounce_seconds, self.max_delay_seconds) <= now
+                }
+                for key in batch:
+                    del self._pending[key]
+                await self._process(batch)
+
+    async def _process(self, batch: Dict[AggregationKey, PendingAggregation]) -> None:
+        """Run a batch of jobs; each is for a different question, so they run concurrently"""
+        if not batch:
+            return
+        self._in_flight = len(batch)
+        try:
+            await asyncio.gather(*(self._aggregate(key, entry) for key, entry in batch.items()))
+        finally:
+            self._in_flight = 0
+
+    async def _apply(
+        self,
+        key: AggregationKey,
+        entry: PendingAggregation,
+        source_plant_id: Optional[str],
+        change: PlantChange,
+        incremental: bool
+    ) -> None:
+        company_id, financial_year, question_id = key
+        if change.kind == UNIT_SUM:
+            await self.aggregation_service.aggregate_table_units(
+                company_id=company_id,
+                financial_year=financial_year,
+                question_id=question_id,
+                question_title=entry.question_title,
+                source_plant_id=source_plant_id
+            )
+        else:
+            await self.aggregation_service.aggregate_answers(
+                company_id=company_id,
+                financial_year=financial_year,
+                question_id=question_id,
+                question_title=entry.question_title,
+                answer_data=change.answer_data,
+                source_plant_id=source_plant_id,
+                previous_data=change.previous_data,
+                incremental=incremental
+            )
+
+    async def _repair(self, key: AggregationKey, entry: PendingAggregation) -> bool:
+        """
+        Roll a failed job up again from every plant, as its last writer would
+        without a delta. When that fails as well, discard the question's
+        roll-up shadow, so its next write rebuilds instead of adding to totals
+        that missed this job. Returns whether the roll-up was repaired.
+        """
+        company_id, financial_year, question_id = key
+        source_plant_id, change = next(reversed(entry.changes.items()))
+        try:
+            await self._apply(key, entry, source_plant_id, change, incremental=False)
+            logger.info(f"Rebuilt question {question_id} of company {company_id} after a failed aggregation")
+            return True
+        except Exception as e:
+            logger.exception(f"Rebuild failed for question {question_id} of company {company_id}: {str(e)}")
+        try:
+            await self.aggregation_service.discard_table_rollup(company_id, financial_year, question_id)
+        except Exception as e:
+            logger.exception(f"Could not discard the roll-up shadow of question {question_id}: {str(e)}")
+        return False
+
+    async def _aggregate(self, key: AggregationKey, entry: PendingAggregation) -> None:
+        company_id, financial_year, question_id = key
+        try:
+            # Plants are applied in the order they last wrote, as they would have been inline
+            for source_plant_id, change in entry.changes.items():
+                await self._apply(key, entry, source_plant_id, change, change.incremental)
+            self._processed += 1
+        except Exception as e:
+            logger.exception(f"Aggregation failed for question {question_id} of company {company_id}: {str(e)}")
+            if await self._repair(key, entry):
+                self._repaired += 1
+            else:
+                self._failed += 1
+        finally:
+            lag = time.monotonic() - entry.first_submitted
+            self._last_lag_seconds = round(lag, 3)
+            self._max_lag_seconds = max(self._max_lag_seconds, lag)
+            if entry.submissions > 1:
+                logger.info(f"Coalesced {entry.submissions} changes to question {question_id} into one aggregation")
+
+
+_queue: Optional[AggregationQueue] = None
+
+
+def get_aggregation_queue() -> Optional[AggregationQueue]:
+    """The running process-wide queue, or None when aggregation should run inline"""
+    return _queue
+
+
+def start_aggregation_queue(db: AsyncIOMotorDatabase, **kwargs) -> AggregationQueue:
+    global _queue
+    if _queue is None:
+        _queue = AggregationQueue(db, **kwargs)
+    _queue.start()
+    return _queue
+
+
+async def stop_aggregation_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
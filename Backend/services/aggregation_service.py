@@ -1,21 +1,24 @@
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Mapping, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
 from models.question import QuestionType, TableMetadata
 from models.plant import PlantType
 from models.environment import QuestionAnswer
-import json
-import os
+from .question_index import QuestionEntry, get_question_index, should_aggregate_row
+from . import table_math
+from .table_math import YEAR_KEYS
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Largest difference tolerated between incremental and rebuilt roll-ups
+ROLLUP_TOLERANCE = 0.005
+
 class AggregationService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.collection = db.environment
-        self._question_types = None  # Cache for question types
-        self._module_data = None  # Cache for module data
 
     async def get_company_aggregator_plant(self, company_id: str) -> Optional[Dict[str, Any]]:
         """Get the C001 (aggregator) plant for a company"""
@@ -41,65 +44,19 @@ class AggregationService:
         })
         return await cursor.to_list(length=None)
 
-    def _load_module_data(self) -> Dict[str, Any]:
-        """Load and cache the entire moduleData.json"""
-        if self._module_data is None:
-            try:
-                module_data_path = os.path.join(
-                    os.path.dirname(__file__),
-                    "..",
-                    "..",
-                    "Frontend",
-                    "BRSR",
-                    "Environment",
-                    "data",
-                    "moduleData.json"
-                )
-                
-                with open(module_data_path, 'r') as f:
-                    self._module_data = json.load(f)
-                logger.info("Successfully loaded moduleData.json")
-            except Exception as e:
-                logger.error(f"Error loading moduleData.json: {str(e)}")
-                self._module_data = {}
-        
-        return self._module_data
+    def _get_question(self, question_id: str) -> Optional[QuestionEntry]:
+        """Get the indexed moduleData.json entry for a question"""
+        return get_question_index().get(question_id)
 
-    def _get_question_metadata(self, question_id: str) -> Optional[Dict[str, Any]]:
+    def _get_question_metadata(self, question_id: str) -> Optional[Mapping[str, Any]]:
         """Get detailed question metadata from moduleData.json"""
-        module_data = self._load_module_data()
-        
-        for submodule in module_data.get("submodules", []):
-            for category in submodule.get("categories", []):
-                for question in category.get("questions", []):
-                    if question.get("id") == question_id:
-                        return question.get("metadata", {})
-        return None
-
-    def _load_question_types(self) -> Dict[str, str]:
-        """Load question types from moduleData.json"""
-        if self._question_types is None:
-            question_types = {}
-            module_data = self._load_module_data()
-            
-            for submodule in module_data.get("submodules", []):
-                for category in submodule.get("categories", []):
-                    for question in category.get("questions", []):
-                        question_id = question.get("id")
-                        metadata = question.get("metadata", {})
-                        question_type = metadata.get("type")
-                        if question_id and question_type:
-                            question_types[question_id] = question_type
-            
-            logger.info(f"Loaded {len(question_types)} question types from moduleData.json")
-            self._question_types = question_types
-        
-        return self._question_types
+        question = self._get_question(question_id)
+        return question.metadata if question else None
 
     def get_question_type(self, question_id: str) -> Optional[str]:
         """Get question type from moduleData.json"""
-        question_types = self._load_question_types()
-        question_type = question_types.get(question_id)
+        question = self._get_question(question_id)
+        question_type = question.type if question else None
         
         if question_type == "subjective":
             return QuestionType.SUBJECTIVE.value
@@ -134,22 +91,9 @@ class AggregationService:
         })
         return plant and plant.get("plant_code") == "C001"
 
-    def _should_aggregate_row(self, row_metadata: Dict[str, Any]) -> bool:
+    def _should_aggregate_row(self, row_metadata: Mapping[str, Any]) -> bool:
         """Determine if a row should be aggregated based on its metadata"""
-        # Don't aggregate header rows
-        if row_metadata.get("isHeader"):
-            return False
-            
-        # Don't aggregate rows that are marked as totals (containing "Total" in parameter)
-        parameter = row_metadata.get("parameter", "").lower()
-        if "total" in parameter or "<b>total" in parameter:
-            return False
-            
-        # Don't aggregate intensity metrics (containing "intensity" in parameter)
-        if "intensity" in parameter:
-            return False
-            
-        return True
+        return should_aggregate_row(row_metadata)
 
     def _safe_float_conversion(self, value: Any) -> float:
         """Safely convert a value to float, returning 0 if invalid"""
@@ -171,11 +115,17 @@ class AggregationService:
         question_id: str,
         question_title: str,
         answer_data: Dict[str, Any],
-        source_plant_id: Optional[str] = None
+        source_plant_id: Optional[str] = None,
+        previous_data: Any = None,
+        incremental: bool = False
     ) -> None:
         """
         Aggregate answers from all plants into C001 plant.
         This is called whenever any plant's answer is updated.
+
+        With incremental=True, answer_data and previous_data are the source
+        plant's new and old stored data, and table questions are rolled up by
+        applying their difference to C001 instead of re-reading every plant.
         """
         now = datetime.utcnow()
         
@@ -219,7 +169,7 @@ class AggregationService:
 
         # Get question type and metadata
         question_type = self.get_question_type(question_id)
-        question_metadata = self._get_question_metadata(question_id)
+        question = self._get_question(question_id)
         
         if not question_type:
             logger.warning(f"Question type not found for {question_id} in moduleData.json")
@@ -279,149 +229,468 @@ class AggregationService:
             else:
                 logger.warning(f"No answer found in P001 for question {question_id}")
         
-        # For tabular questions, aggregate data from all plants
+        # For tabular questions, roll the plants' data up into C001
         elif question_type == QuestionType.TABLE.value:
             logger.info(f"Handling tabular question {question_id}")
             
             # Get table structure from metadata
-            table_rows = question_metadata.get("rows", [])
-            if not table_rows:
+            if not question or not question.rows:
                 logger.error(f"No table structure found for question {question_id}")
                 return
 
-            # Get all plants except C001
-            all_plants = await self.get_all_regular_plants(company_id)
-            logger.info(f"Found {len(all_plants)} regular plants to aggregate data from")
+            # A single plant's change can be applied as a delta against the
+            # running C001 totals; anything else (or a missing shadow) rebuilds
+            if incremental:
+                applied = await self.apply_table_delta(
+                    company_id=company_id,
+                    financial_year=financial_year,
+                    aggregator_plant_id=aggregator_plant["id"],
+                    question_id=question_id,
+                    question_title=question_title,
+                    question=question,
+                    previous_data=previous_data,
+                    current_data=answer_data
+                )
+                if applied:
+                    return
+                logger.info(f"No roll-up shadow for question {question_id}, falling back to full rebuild")
+
+            await self.rebuild_table_rollup(
+                company_id=company_id,
+                financial_year=financial_year,
+                question_id=question_id,
+                question_title=question_title,
+                aggregator_plant=aggregator_plant,
+                question=question
+            )
+
+    def _rollup_from_tables(self, question: QuestionEntry, tables: List[Any]) -> Dict[str, List[float]]:
+        """Sum the aggregated rows of several plants' tables for one question"""
+        sums = table_math.sum_plants(
+            table_math.to_array(tables, len(question.rows)),
+            question.aggregate_rows
+        )
+        return {key: sums[:, j].tolist() for j, key in enumerate(YEAR_KEYS)}
+
+    def _materialize_rollup(self, question: QuestionEntry, rollup: Dict[str, List[float]]) -> List[Dict[str, str]]:
+        """Format a numeric roll-up as C001 table rows, filling in the total rows"""
+        sums = np.column_stack([np.asarray(rollup[key], dtype=np.float64) for key in YEAR_KEYS])
+        sums = table_math.section_totals(sums, question.total_rows)
+        blank_rows = [
+            not aggregate and not is_total
+            for aggregate, is_total in zip(question.aggregate_rows, question.total_rows)
+        ]
+        return table_math.format_table(sums, blank_rows=blank_rows)
 
-            # First get C001's existing data
-            c001_report = await self.collection.find_one({
+    async def _write_rollup(
+        self,
+        company_id: str,
+        financial_year: str,
+        aggregator_plant_id: str,
+        question_id: str,
+        question_title: str,
+        aggregated_data: List[Dict[str, str]],
+        version: int
+    ) -> bool:
+        """Write C001's answer, unless a newer roll-up of the same question got there first"""
+        now = datetime.utcnow()
+        question_answer = {
+            "questionId": question_id,
+            "questionTitle": question_title,
+            "updatedData": aggregated_data,
+            "lastUpdated": now
+        }
+        result = await self.collection.update_one(
+            {
+                "companyId": company_id,
+                "plantId": aggregator_plant_id,
+                "financialYear": financial_year,
+                f"rollups.{question_id}.version": version
+            },
+            {
+                "$set": {
+                    f"answers.{question_id}": question_answer,
+                    "updatedAt": now
+                }
+            }
+        )
+        return result.matched_count > 0
+
+    async def apply_table_delta(
+        self,
+        company_id: str,
+        financial_year: str,
+        aggregator_plant_id: str,
+        question_id: str,
+        question_title: str,
+        question: QuestionEntry,
+        previous_data: Any,
+        current_data: Any
+    ) -> bool:
+        """
+        Apply the row-wise difference between a plant's previous and current
+        table to C001's running totals with a single atomic $inc.
+        Returns False when C001 has no roll-up shadow yet, so the caller can rebuild.
+        """
+        tables = table_math.to_array([previous_data, current_data], len(question.rows))
+        delta = np.where(
+            np.asarray(question.aggregate_rows, dtype=bool)[:, None],
+            tables.values[1] - tables.values[0],
+            0.0
+        )
+        increments = {
+            f"rollups.{question_id}.{YEAR_KEYS[j]}.{i}": float(delta[i, j])
+            for i, j in zip(*np.nonzero(delta))
+        }
+
+        shadow_filter = {
+            "companyId": company_id,
+            "plantId": aggregator_plant_id,
+            "financialYear": financial_year,
+            f"rollups.{question_id}.version": {"$exists": True}
+        }
+
+        if not increments:
+            # Nothing numeric changed, but the shadow still has to exist
+            return await self.collection.count_documents(shadow_filter, limit=1) > 0
+
+        increments[f"rollups.{question_id}.version"] = 1
+        c001_report = await self.collection.find_one_and_update(
+            shadow_filter,
+            {"$inc": increments},
+            projection={f"rollups.{question_id}": 1},
+            return_document=True
+        )
+        if not c001_report:
+            return False
+
+        rollup = c001_report["rollups"][question_id]
+        if any(len(rollup.get(key, [])) != len(question.rows) for key in YEAR_KEYS):
+            # Table structure changed since the shadow was built
+            return False
+
+        await self._write_rollup(
+            company_id=company_id,
+            financial_year=financial_year,
+            aggregator_plant_id=aggregator_plant_id,
+            question_id=question_id,
+            question_title=question_title,
+            aggregated_data=self._materialize_rollup(question, rollup),
+            version=rollup["version"]
+        )
+        logger.info(f"Applied incremental roll-up to C001 for question {question_id}")
+        return True
+
+    def _iter_plant_reports(
+        self,
+        company_id: str,
+        financial_year: str,
+        plant_ids: List[str],
+        question_ids: List[str]
+    ):
+        """One cursor over the given plants' reports, projected down to the questions' data"""
+        projection = {"plantId": 1}
+        for question_id in question_ids:
+            projection[f"answers.{question_id}.updatedData"] = 1
+        return self.collection.find(
+            {
+                "companyId": company_id,
+                "financialYear": financial_year,
+                "plantId": {"$in": plant_ids}
+            },
+            projection
+        )
+
+    async def _compute_table_rollup(
+        self,
+        company_id: str,
+        financial_year: str,
+        question: QuestionEntry
+    ) -> Dict[str, List[float]]:
+        """Sum a table question over every regular plant's report"""
+        all_plants = await self.get_all_regular_plants(company_id)
+        logger.info(f"Found {len(all_plants)} regular plants to aggregate data from")
+
+        cursor = self._iter_plant_reports(
+            company_id, financial_year, [plant["id"] for plant in all_plants], [question.question_id]
+        )
+        tables = [
+            plant_report.get("answers", {}).get(question.question_id, {}).get("updatedData")
+            async for plant_report in cursor
+        ]
+        return self._rollup_from_tables(question, tables)
+
+    async def rebuild_table_rollup(
+        self,
+        company_id: str,
+        financial_year: str,
+        question_id: str,
+        question_title: Optional[str] = None,
+        aggregator_plant: Optional[Dict[str, Any]] = None,
+        question: Optional[QuestionEntry] = None
+    ) -> Optional[List[Dict[str, str]]]:
+        """
+        Recompute C001's answer for a table question from every plant's report
+        and reset its roll-up shadow. Used on first aggregation and for repair.
+        Without a question_title the stored title is kept.
+        """
+        if aggregator_plant is None:
+            aggregator_plant = await self.get_company_aggregator_plant(company_id)
+            if not aggregator_plant:
+                logger.warning(f"Aggregator plant not found for company {company_id}")
+                return None
+        if question is None:
+            question = self._get_question(question_id)
+            if not question or not question.rows:
+                logger.error(f"No table structure found for question {question_id}")
+                return None
+
+        rollup = await self._compute_table_rollup(company_id, financial_year, question)
+        aggregated_data = self._materialize_rollup(question, rollup)
+
+        now = datetime.utcnow()
+        if question_title is not None:
+            answer_fields = {
+                f"answers.{question_id}": {
+                    "questionId": question_id,
+                    "questionTitle": question_title,
+                    "updatedData": aggregated_data,
+                    "lastUpdated": now
+                }
+            }
+        else:
+            answer_fields = {
+                f"answers.{question_id}.questionId": question_id,
+                f"answers.{question_id}.updatedData": aggregated_data,
+                f"answers.{question_id}.lastUpdated": now
+            }
+        await self.collection.update_one(
+            {
                 "companyId": company_id,
                 "plantId": aggregator_plant["id"],
                 "financialYear": financial_year
-            })
+            },
+            {
+                "$set": {
+                    **answer_fields,
+                    f"rollups.{question_id}.current_year": rollup["current_year"],
+                    f"rollups.{question_id}.previous_year": rollup["previous_year"],
+                    "updatedAt": now
+                },
+                "$inc": {f"rollups.{question_id}.version": 1}
+            }
+        )
+        logger.info(f"Rebuilt aggregated data in C001 for question {question_id}")
+        return aggregated_data
 
-            # Initialize aggregated data with zeros
-            aggregated_data = []
-            for row in table_rows:
-                aggregated_data.append({
-                    "current_year": "0",
-                    "previous_year": "0"
-                })
-
-            # Collect and aggregate answers from all plants
-            for plant in all_plants:
-                plant_report = await self.collection.find_one({
-                    "companyId": company_id,
-                    "plantId": plant["id"],
-                    "financialYear": financial_year
-                })
-                
-                if not plant_report:
-                    continue
-                
-                plant_answer = plant_report.get("answers", {}).get(question_id, {})
-                plant_data = plant_answer.get("updatedData", [])
-                
-                # Skip if no data or invalid structure
-                if not isinstance(plant_data, list):
-                    logger.warning(f"Invalid data structure for plant {plant['id']}")
-                    continue
-                
-                # Aggregate each row's data
-                for i, (row_data, row_metadata) in enumerate(zip(plant_data, table_rows)):
-                    if i >= len(aggregated_data):
-                        break
-                        
-                    # Skip rows that shouldn't be aggregated
-                    if not self._should_aggregate_row(row_metadata):
-                        continue
-                    
-                    try:
-                        # Convert and add current year values
-                        current_year_sum = self._safe_float_conversion(row_data.get("current_year"))
-                        previous_year_sum = self._safe_float_conversion(row_data.get("previous_year"))
-                        
-                        # Update aggregated data with formatted values
-                        aggregated_data[i]["current_year"] = f"{current_year_sum:.2f}"
-                        aggregated_data[i]["previous_year"] = f"{previous_year_sum:.2f}"
-                    except Exception as e:
-                        logger.error(f"Error aggregating row {i}: {str(e)}")
-                        continue
-            
-            # Calculate totals for rows marked as totals
-            for i, row_metadata in enumerate(table_rows):
-                if "total" in row_metadata.get("parameter", "").lower():
-                    try:
-                        # Find the rows to sum (usually the rows above until the previous total)
-                        start_idx = 0
-                        for j in range(i-1, -1, -1):
-                            if "total" in table_rows[j].get("parameter", "").lower():
-                                start_idx = j + 1
-                                break
-                        
-                        # Sum the values
-                        current_year_total = sum(
-                            self._safe_float_conversion(aggregated_data[j]["current_year"])
-                            for j in range(start_idx, i)
-                        )
-                        previous_year_total = sum(
-                            self._safe_float_conversion(aggregated_data[j]["previous_year"])
-                            for j in range(start_idx, i)
-                        )
-                        
-                        # Update the total row
-                        aggregated_data[i]["current_year"] = f"{current_year_total:.2f}"
-                        aggregated_data[i]["previous_year"] = f"{previous_year_total:.2f}"
-                    except Exception as e:
-                        logger.error(f"Error calculating totals for row {i}: {str(e)}")
-                        continue
-
-            # If C001 has existing data, add it to our aggregated data
-            if c001_report and c001_report.get("answers", {}).get(question_id):
-                c001_data = c001_report["answers"][question_id].get("updatedData", [])
-                if isinstance(c001_data, list):
-                    for i, (c001_row, row_metadata) in enumerate(zip(c001_data, table_rows)):
-                        if i >= len(aggregated_data):
-                            break
-                            
-                        # Skip rows that shouldn't be aggregated
-                        if not self._should_aggregate_row(row_metadata):
-                            continue
-                        
-                        try:
-                            # Add C001's existing values to our aggregated values
-                            current_year_sum = self._safe_float_conversion(aggregated_data[i]["current_year"]) + \
-                                             self._safe_float_conversion(c001_row.get("current_year"))
-                            previous_year_sum = self._safe_float_conversion(aggregated_data[i]["previous_year"]) + \
-                                              self._safe_float_conversion(c001_row.get("previous_year"))
-                            
-                            # Update aggregated data with formatted values
-                            aggregated_data[i]["current_year"] = f"{current_year_sum:.2f}"
-                            aggregated_data[i]["previous_year"] = f"{previous_year_sum:.2f}"
-                        except Exception as e:
-                            logger.error(f"Error adding C001's existing values for row {i}: {str(e)}")
-                            continue
-            
-            # Create question answer object for aggregated data
-            question_answer = {
+    async def discard_table_rollup(self, company_id: str, financial_year: str, question_id: str) -> None:
+        """Drop C001's roll-up shadow of a question, so its next roll-up is a full rebuild"""
+        await self.collection.update_one(
+            {
+                "companyId": company_id,
+                "financialYear": financial_year,
+                f"rollups.{question_id}": {"$exists": True}
+            },
+            {"$unset": {f"rollups.{question_id}": ""}}
+        )
+        logger.warning(f"Discarded roll-up shadow of question {question_id} for company {company_id}")
+
+    async def aggregate_table_units(
+        self,
+        company_id: str,
+        financial_year: str,
+        question_id: str,
+        question_title: str,
+        source_plant_id: str
+    ) -> Optional[List[Dict[str, str]]]:
+        """
+        Sum a table answer cell by cell over every regular plant, keeping units,
+        and write it to C001. The source plant's table fixes the number of rows
+        and its units take precedence over the other plants'.
+        """
+        aggregator_plant = await self.get_company_aggregator_plant(company_id)
+        if not aggregator_plant:
+            logger.warning(f"Aggregator plant not found for company {company_id}")
+            return None
+
+        all_plants = await self.get_all_regular_plants(company_id)
+        plant_ids = [source_plant_id] + [plant["id"] for plant in all_plants if plant["id"] != source_plant_id]
+        cursor = self._iter_plant_reports(company_id, financial_year, plant_ids, [question_id])
+        plant_tables = {}
+        async for plant_report in cursor:
+            plant_tables[plant_report["plantId"]] = plant_report.get("answers", {}).get(question_id, {}).get("updatedData")
+
+        source_table = plant_tables.get(source_plant_id)
+        row_count = len(source_table) if isinstance(source_table, list) else 0
+        tables = table_math.to_array([plant_tables.get(plant_id) for plant_id in plant_ids], row_count, with_units=True)
+        aggregated_data = table_math.format_table(
+            table_math.sum_plants(tables),
+            units=table_math.first_units(tables)
+        )
+
+        now = datetime.utcnow()
+        c001_answer = QuestionAnswer(
+            questionId=question_id,
+            questionTitle=question_title,
+            updatedData=aggregated_data,
+            lastUpdated=now
+        )
+        await self.collection.update_one(
+            {
+                "companyId": company_id,
+                "plantId": aggregator_plant["id"],
+                "financialYear": financial_year
+            },
+            {
+                "$set": {
+                    f"answers.{question_id}": c001_answer.dict(),
+                    "updatedAt": now
+                },
+                # These unit-aware totals bypass the roll-up shadow,
+                # so the next incremental roll-up must rebuild it
+                "$unset": {f"rollups.{question_id}": ""}
+            }
+        )
+        logger.info(f"Updated unit-aware totals in C001 for question {question_id}")
+        return aggregated_data
+
+    async def verify_table_rollup(
+        self,
+        company_id: str,
+        financial_year: str,
+        question_id: str
+    ) -> Dict[str, Any]:
+        """Compare C001's incrementally maintained totals against a full recomputation"""
+        aggregator_plant = await self.get_company_aggregator_plant(company_id)
+        question = self._get_question(question_id)
+        if not aggregator_plant or not question or not question.rows:
+            return {"consistent": False, "drift": [], "reason": "Aggregator plant or table structure not found"}
+
+        c001_report = await self.collection.find_one(
+            {
+                "companyId": company_id,
+                "plantId": aggregator_plant["id"],
+                "financialYear": financial_year
+            },
+            {f"rollups.{question_id}": 1}
+        )
+        shadow = ((c001_report or {}).get("rollups") or {}).get(question_id)
+        if not shadow:
+            return {"consistent": False, "drift": [], "reason": "No roll-up shadow for this question"}
+
+        expected = await self._compute_table_rollup(company_id, financial_year, question)
+        drift = []
+        for key in YEAR_KEYS:
+            stored_values = shadow.get(key, [])
+            for i, expected_value in enumerate(expected[key]):
+                stored_value = stored_values[i] if i < len(stored_values) else None
+                if stored_value is None or abs(stored_value - expected_value) > ROLLUP_TOLERANCE:
+                    drift.append({
+                        "row_index": i,
+                        "column": key,
+                        "stored": stored_value,
+                        "expected": expected_value
+                    })
+        return {"consistent": not drift, "drift": drift}
+
+    async def aggregate_answers_batch(
+        self,
+        company_id: str,
+        financial_year: str,
+        question_titles: Dict[str, str]
+    ) -> None:
+        """
+        Aggregate several changed questions into C001 at once.
+        Each plant report is read once with a projection covering every question,
+        all roll-ups are computed in memory and C001 is written with one update.
+        """
+        aggregator_plant = await self.get_company_aggregator_plant(company_id)
+        if not aggregator_plant:
+            logger.warning(f"Aggregator plant not found for company {company_id}")
+            return
+
+        home_plant = await self.get_company_home_plant(company_id)
+        if not home_plant:
+            logger.warning(f"Home plant not found for company {company_id}")
+            return
+
+        subjective_ids = []
+        table_questions = []
+        for question_id in question_titles:
+            question_type = self.get_question_type(question_id)
+            question = self._get_question(question_id)
+            if question_type == QuestionType.SUBJECTIVE.value:
+                subjective_ids.append(question_id)
+            elif question_type == QuestionType.TABLE.value and question.rows:
+                table_questions.append(question)
+            else:
+                logger.warning(f"Skipping aggregation for {question_id}: no subjective or table metadata in moduleData.json")
+
+        if not subjective_ids and not table_questions:
+            return
+
+        all_plants = await self.get_all_regular_plants(company_id)
+        logger.info(
+            f"Aggregating {len(table_questions)} table and {len(subjective_ids)} subjective questions "
+            f"from {len(all_plants)} regular plants"
+        )
+
+        plant_tables = {question.question_id: [] for question in table_questions}
+        home_answers = {}
+        cursor = self._iter_plant_reports(
+            company_id,
+            financial_year,
+            [plant["id"] for plant in all_plants],
+            subjective_ids + [question.question_id for question in table_questions]
+        )
+        async for plant_report in cursor:
+            answers = plant_report.get("answers", {})
+            for question in table_questions:
+                plant_tables[question.question_id].append(answers.get(question.question_id, {}).get("updatedData"))
+            if plant_report.get("plantId") == home_plant["id"]:
+                home_answers = plant_report.get("answers", {})
+
+        now = datetime.utcnow()
+        set_fields = {"updatedAt": now}
+        inc_fields = {}
+        for question in table_questions:
+            question_id = question.question_id
+            rollup = self._rollup_from_tables(question, plant_tables[question_id])
+            set_fields[f"answers.{question_id}"] = {
                 "questionId": question_id,
-                "questionTitle": question_title,
-                "updatedData": aggregated_data,
+                "questionTitle": question_titles[question_id],
+                "updatedData": self._materialize_rollup(question, rollup),
                 "lastUpdated": now
             }
-            
-            # Update C001's answer with aggregated data
-            await self.collection.update_one(
-                {
-                    "companyId": company_id,
-                    "plantId": aggregator_plant["id"],
-                    "financialYear": financial_year
+            set_fields[f"rollups.{question_id}.current_year"] = rollup["current_year"]
+            set_fields[f"rollups.{question_id}.previous_year"] = rollup["previous_year"]
+            inc_fields[f"rollups.{question_id}.version"] = 1
+
+        # Subjective answers are copied from P001, as in aggregate_answers
+        for question_id in subjective_ids:
+            home_data = home_answers.get(question_id, {}).get("updatedData")
+            if not isinstance(home_data, dict) or "text" not in home_data:
+                logger.warning(f"No answer found in P001 for question {question_id}")
+                continue
+            set_fields[f"answers.{question_id}"] = {
+                "questionId": question_id,
+                "questionTitle": question_titles[question_id],
+                "updatedData": {
+                    "type": "subjective",
+                    "text": home_data["text"]
                 },
-                {
-                    "$set": {
-                        f"answers.{question_id}": question_answer,
-                        "updatedAt": now
-                    }
-                }
-            )
-            logger.info(f"Updated aggregated data in C001 for question {question_id}") 
\ No newline at end of file
+                "lastUpdated": now
+            }
+
+        update = {"$set": set_fields}
+        if inc_fields:
+            update["$inc"] = inc_fields
+        await self.collection.update_one(
+            {
+                "companyId": company_id,
+                "plantId": aggregator_plant["id"],
+                "financialYear": financial_year
+            },
+            update
+        )
+        logger.info(f"Updated aggregated data in C001 for {len(question_titles)} bulk-updated questions")
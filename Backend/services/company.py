@@ -9,6 +9,7 @@ import uuid
 from fastapi import HTTPException, status
 from bson.objectid import ObjectId
 from bson.errors import InvalidId
+from services.name_index import COMPANY_NAMES, PLANT_NAMES, invalidate_name_index, with_name_key
 class CompanyService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
@@ -29,6 +30,7 @@ class CompanyService:
         company_dict["plant_ids"] = []
         company_dict["active_reports"] = []
         company_dict["financialYear"] = company_data.financialYear  # Add financialYear from input data
+        with_name_key(COMPANY_NAMES, company_dict)
 
         # Create default plants with UUIDs
         c001_id = str(uuid.uuid4())  # UUID for aggregator plant
@@ -63,6 +65,7 @@ class CompanyService:
         c001_dict["plant_code"] = c001_dict.pop("code")
         c001_dict["plant_name"] = c001_dict.pop("name")
         c001_dict.pop("type")  # Remove type as it's replaced by plant_type
+        with_name_key(PLANT_NAMES, c001_dict)
         
         # Prepare P001 plant document
         p001_dict = p001.model_dump()
@@ -74,6 +77,7 @@ class CompanyService:
         p001_dict["plant_code"] = p001_dict.pop("code")
         p001_dict["plant_name"] = p001_dict.pop("name")
         p001_dict.pop("type")  # Remove type as it's replaced by plant_type
+        with_name_key(PLANT_NAMES, p001_dict)
         
         company_dict["plant_ids"] = [c001_id, p001_id]
 
@@ -112,6 +116,8 @@ class CompanyService:
                 await self.db.companies.insert_one(company_dict, session=session)
                 await self.db.plants.insert_many([c001_dict, p001_dict], session=session)
                 await self.db.environment.insert_many(environment_reports, session=session)
+        invalidate_name_index(COMPANY_NAMES)
+        invalidate_name_index(PLANT_NAMES)
         
         return Company(**company_dict)
 
@@ -142,9 +148,12 @@ class CompanyService:
         update_data = company_data.model_dump(exclude_unset=True)
         if update_data:
             update_data["updated_at"] = datetime.utcnow()
+            with_name_key(COMPANY_NAMES, update_data)
             result = await self.collection.update_one({"id": company_id}, {"$set": update_data})
             if result.modified_count == 0:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Company not found")
+            if "name" in update_data:
+                invalidate_name_index(COMPANY_NAMES)
         doc = await self.collection.find_one({"id": company_id})
         return Company(**doc)
 
@@ -326,4 +335,4 @@ class CompanyService:
             {"$pull": {"active_reports": {"report_id": report_id}}, "$set": {"updated_at": datetime.utcnow()}}
         )
         
-        return await self.get_company(company_id)
\ No newline at end of file
+        return await self.get_company(company_id)
\ No newline at end of file
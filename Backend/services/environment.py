@@ -6,6 +6,7 @@ from models.environment import EnvironmentReport, QuestionAnswer, TableResponse,
 from bson import ObjectId
 from fastapi import HTTPException, status
 from .aggregation_service import AggregationService
+from .aggregation_queue import UNIT_SUM, get_aggregation_queue
 
 class EnvironmentService:
     def __init__(self, db: AsyncIOMotorDatabase):
@@ -21,6 +22,21 @@ class EnvironmentService:
         await self.collection.create_index([("financialYear", 1)])
         await self.collection.create_index([("status", 1)])
 
+    async def _aggregate(self, kind: Optional[str] = None, **kwargs) -> None:
+        """
+        Hand a C001 roll-up to the background aggregation queue, so the write
+        returns without waiting for it. Runs inline when no queue is running.
+        """
+        queue = get_aggregation_queue()
+        if queue is not None:
+            if kind:
+                kwargs["kind"] = kind
+            queue.submit(**kwargs)
+        elif kind == UNIT_SUM:
+            await self.aggregation_service.aggregate_table_units(**kwargs)
+        else:
+            await self.aggregation_service.aggregate_answers(**kwargs)
+
     async def create_report(
         self, 
         company_id: str,
@@ -128,7 +144,8 @@ class EnvironmentService:
             updatedData=answer_data,
             lastUpdated=now
         )
-        result = await self.collection.update_one(
+        # Return the previous answer so aggregation can apply only the difference
+        previous_report = await self.collection.find_one_and_update(
             {
                 "companyId": company_id,
                 "plantId": plant_id,
@@ -139,20 +156,27 @@ class EnvironmentService:
                     f"answers.{question_id}": question_answer.dict(),
                     "updatedAt": now
                 }
-            }
+            },
+            projection={f"answers.{question_id}.updatedData": 1},
+            return_document=False
         )
+        previous_data = None
+        if previous_report:
+            previous_data = previous_report.get("answers", {}).get(question_id, {}).get("updatedData")
 
         # After updating the answer, trigger aggregation
-        await self.aggregation_service.aggregate_answers(
+        await self._aggregate(
             company_id=company_id,
             financial_year=financial_year,
             question_id=question_id,
             question_title=question_title,
             answer_data=answer_data,
-            source_plant_id=plant_id  # Pass the plant_id to identify the source of the update
+            source_plant_id=plant_id,  # Pass the plant_id to identify the source of the update
+            previous_data=previous_data,
+            incremental=previous_report is not None
         )
 
-        return result.modified_count > 0
+        return previous_report is not None
 
     async def add_comment(
         self, 
@@ -257,18 +281,50 @@ class EnvironmentService:
             {"$set": update_dict}
         )
 
-        # After bulk updating answers, trigger aggregation for each answer
-        for question_id, answer_data in answers.items():
-            await self.aggregation_service.aggregate_answers(
-                company_id=company_id,
-                financial_year=financial_year,
-                question_id=question_id,
-                question_title=answer_data.get("questionTitle", ""),
-                answer_data=answer_data.get("answer_data", {})
-            )
+        # After bulk updating answers, aggregate all of them in one pass
+        await self.aggregation_service.aggregate_answers_batch(
+            company_id=company_id,
+            financial_year=financial_year,
+            question_titles={
+                question_id: answer_data.get("questionTitle", "")
+                for question_id, answer_data in answers.items()
+            }
+        )
 
         return result.modified_count > 0
 
+    async def rebuild_table_rollup(
+        self,
+        company_id: str,
+        financial_year: str,
+        question_id: str,
+        question_title: Optional[str] = None,
+        verify_only: bool = False
+    ) -> Dict[str, Any]:
+        """Check C001's incremental roll-up for a table question against the plants and repair it"""
+        # Queued deltas would otherwise show up as drift
+        queue = get_aggregation_queue()
+        if queue is not None:
+            await queue.flush()
+
+        verification = await self.aggregation_service.verify_table_rollup(
+            company_id=company_id,
+            financial_year=financial_year,
+            question_id=question_id
+        )
+        if verify_only:
+            return verification
+
+        aggregated_data = await self.aggregation_service.rebuild_table_rollup(
+            company_id=company_id,
+            financial_year=financial_year,
+            question_id=question_id,
+            question_title=question_title
+        )
+        if aggregated_data is None:
+            raise ValueError(f"Could not rebuild roll-up for question {question_id}")
+        return {**verification, "updatedData": aggregated_data}
+
     async def update_table_answer(
         self,
         company_id: str,
@@ -281,23 +337,6 @@ class EnvironmentService:
         """Update table answer for a specific question"""
         now = datetime.utcnow()
 
-        def extract_number_and_unit(value: str) -> Tuple[float, str]:
-            """Extract numeric value and unit from a string like '10 joule' or '10'"""
-            if not value or value.strip() == "":
-                return 0.0, ""
-                
-            # Split the string into parts
-            parts = value.strip().split(maxsplit=1)
-            
-            try:
-                # Try to convert first part to float
-                number = float(parts[0].replace(',', ''))
-                # Get unit if it exists
-                unit = parts[1] if len(parts) > 1 else ""
-                return number, unit
-            except (ValueError, IndexError):
-                return 0.0, ""
-
         # If this is C001 plant, we should not trigger aggregation
         is_c001 = await self.aggregation_service.is_aggregator_plant(company_id, plant_id)
         
@@ -348,94 +387,15 @@ class EnvironmentService:
         )
 
         if result.modified_count > 0:
-            # After updating the plant's data, get all plants' data
-            all_plants = await self.aggregation_service.get_all_regular_plants(company_id)
-            aggregated_data = []
-
-            # First, initialize with zeros and store units from current plant's data
-            if isinstance(table_data, list):
-                # Initialize with zeros and empty units
-                aggregated_data = [
-                    {
-                        "current_year": {"value": 0.0, "unit": ""},
-                        "previous_year": {"value": 0.0, "unit": ""}
-                    } 
-                    for _ in table_data
-                ]
-                
-                # Add current plant's data and capture units
-                for i, row in enumerate(table_data):
-                    current_value, current_unit = extract_number_and_unit(row.get("current_year", "0"))
-                    previous_value, previous_unit = extract_number_and_unit(row.get("previous_year", "0"))
-                    
-                    aggregated_data[i]["current_year"]["value"] = current_value
-                    aggregated_data[i]["current_year"]["unit"] = current_unit
-                    aggregated_data[i]["previous_year"]["value"] = previous_value
-                    aggregated_data[i]["previous_year"]["unit"] = previous_unit
-
-            # Then add data from other regular plants
-            for other_plant in all_plants:
-                if other_plant["id"] != plant_id:  # Skip the current plant
-                    plant_report = await self.collection.find_one({
-                        "companyId": company_id,
-                        "plantId": other_plant["id"],
-                        "financialYear": financial_year
-                    })
-                    
-                    if plant_report and plant_report.get("answers", {}).get(question_id):
-                        plant_data = plant_report["answers"][question_id].get("updatedData", [])
-                        if isinstance(plant_data, list):
-                            for i, row in enumerate(plant_data):
-                                if i < len(aggregated_data):
-                                    current_value, current_unit = extract_number_and_unit(row.get("current_year", "0"))
-                                    previous_value, previous_unit = extract_number_and_unit(row.get("previous_year", "0"))
-                                    
-                                    # Add values
-                                    aggregated_data[i]["current_year"]["value"] += current_value
-                                    aggregated_data[i]["previous_year"]["value"] += previous_value
-                                    
-                                    # Keep units if not already set
-                                    if not aggregated_data[i]["current_year"]["unit"] and current_unit:
-                                        aggregated_data[i]["current_year"]["unit"] = current_unit
-                                    if not aggregated_data[i]["previous_year"]["unit"] and previous_unit:
-                                        aggregated_data[i]["previous_year"]["unit"] = previous_unit
-
-            # Format the final data with units
-            final_data = []
-            for row in aggregated_data:
-                current_value = f"{row['current_year']['value']:.2f}"
-                current_unit = row['current_year']['unit']
-                previous_value = f"{row['previous_year']['value']:.2f}"
-                previous_unit = row['previous_year']['unit']
-                
-                final_data.append({
-                    "current_year": f"{current_value} {current_unit}".strip(),
-                    "previous_year": f"{previous_value} {previous_unit}".strip()
-                })
-
-            # Update C001 with aggregated data
-            c001_plant = await self.aggregation_service.get_company_aggregator_plant(company_id)
-            if c001_plant:
-                c001_answer = QuestionAnswer(
-                    questionId=question_id,
-                    questionTitle=question_title,
-                    updatedData=final_data,
-                    lastUpdated=now
-                )
-
-                await self.collection.update_one(
-                    {
-                        "companyId": company_id,
-                        "plantId": c001_plant["id"],
-                        "financialYear": financial_year
-                    },
-                    {
-                        "$set": {
-                            f"answers.{question_id}": c001_answer.dict(),
-                            "updatedAt": now
-                        }
-                    }
-                )
+            # Sum every plant's table, units included, into C001
+            await self._aggregate(
+                kind=UNIT_SUM,
+                company_id=company_id,
+                financial_year=financial_year,
+                question_id=question_id,
+                question_title=question_title,
+                source_plant_id=plant_id
+            )
 
         return result.modified_count > 0
 
@@ -518,7 +478,7 @@ class EnvironmentService:
         )
 
         # After updating the answer, trigger aggregation
-        await self.aggregation_service.aggregate_answers(
+        await self._aggregate(
             company_id=company_id,
             financial_year=financial_year,
             question_id=question_id,
@@ -1,12 +1,11 @@
 import os
 import logging
 from typing import Optional, Dict, Any
-from google import genai
 from google.genai import types
 
 
 from dotenv import load_dotenv
-import asyncio
+from services.llm_gateway import CHAT_GATEWAY_LIMITS, get_llm_gateway
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,8 +23,8 @@ class GeminiService:
             logger.error("API key not found in environment variables (checked GEMINI_API_KEY and VITE_API_KEY)")
             raise ValueError("API key not found in environment variables")
         
-        # Initialize the Gemini client
-        self.client = genai.Client(api_key=self.api_key)
+        # Shared, rate-limited async Gemini endpoint
+        self.gateway = get_llm_gateway("gemini_chat", api_key=self.api_key, **CHAT_GATEWAY_LIMITS)
         self.model = "gemini-1.5-flash"
 
     def create_prompt_with_context(self, message: str, context: Optional[Dict[Any, Any]] = None) -> str:
@@ -60,38 +59,19 @@ Please provide a detailed response considering the above context."""
                 response_mime_type="text/plain",
             )
             
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt,
-                config=generate_content_config,
-            )
-            
-            if not response or not hasattr(response, 'text'):
-                return ""
-            return str(response.text)
+            return await self.gateway.generate(self.model, prompt, generate_content_config)
         except Exception as e:
             logger.error(f"Error generating content: {str(e)}")
             raise
 
     async def generate_content_stream(self, prompt: str):
-        """Generate streaming content using the Gemini model."""
+        """Generate streaming content using the Gemini model; yields text chunks."""
         try:
             generate_content_config = types.GenerateContentConfig(
                 response_mime_type="text/plain",
             )
             
-            # Wrap synchronous iterator in an async generator
-            async def stream_wrapper():
-                for chunk in self.client.models.generate_content_stream(
-                    model=self.model,
-                    contents=prompt,
-                    config=generate_content_config,
-                ):
-                    yield chunk
-                    # Small delay to prevent blocking the event loop
-                    await asyncio.sleep(0)
-            
-            return stream_wrapper()
+            return self.gateway.stream(self.model, prompt, generate_content_config)
         except Exception as e:
             logger.error(f"Error generating content stream: {str(e)}")
             raise
@@ -115,18 +95,9 @@ Please provide an improved version of the response."""
                 response_mime_type="text/plain",
             )
             
-            stream =  self.client.models.generate_content_stream(
-                model=self.model,
-                contents=brsr_prompt,
-                config=generate_content_config,
-            )
-
             # Stream the response asynchronously
-            for chunk in stream:
-                if chunk.text:
-                    yield chunk.text
-                    # Small delay to prevent blocking the event loop
-                    await asyncio.sleep(0)
+            async for chunk in self.gateway.stream(self.model, brsr_prompt, generate_content_config):
+                yield chunk
         except Exception as e:
             logger.error(f"Error generating streaming BRSR response: {str(e)}")
             raise
\ No newline at end of file
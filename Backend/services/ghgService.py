@@ -1,12 +1,121 @@
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models.ghgModel import GHGReport
-from typing import Optional
+from pymongo import ReplaceOne, ReturnDocument
+from models.ghgModel import GHGCategory, GHGReport
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
+from .ghg_totals import (
+    GHG_REPORTS_COLLECTION,
+    GHG_TOTALS_COLLECTION,
+    TOTALS_INDEX,
+    rebuild_pipeline,
+    scope_breakdown,
+    to_co2e,
+    totals_by_scope_pipeline,
+    totals_entry,
+    totals_key,
+    totals_match
+)
+from fastapi import HTTPException, status
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Optimistic-concurrency retries before upsert_report gives up with a 409
+MAX_UPSERT_ATTEMPTS = 5
+
+
+def _category_total(subcategories: List[dict]) -> float:
+    return sum(to_co2e(subcategory.get("emissions_co2e")) for subcategory in subcategories)
+
+
+def _first_positions(items: List[dict], key: str) -> Dict[Any, int]:
+    """Name -> index of the first item with that name"""
+    positions = {}
+    for i, item in enumerate(items):
+        positions.setdefault(item.get(key), i)
+    return positions
+
+
+def _merge_categories(existing_categories: List[dict], new_categories: List[GHGCategory]) -> Tuple[dict, float]:
+    """
+    Merge new categories into stored ones, keyed by category and subcategory
+    name. Subcategories that already exist are partially updated with the
+    fields that were provided.
+
+    Returns the $set fields for what changed, addressed by array position,
+    and the recomputed scope total.
+    """
+    categories = [dict(category, subcategories=list(category.get("subcategories") or [])) for category in existing_categories]
+    category_positions = _first_positions(categories, "category_name")
+    subcategory_positions: Dict[int, Dict[Any, int]] = {}
+    added_categories = set()
+    changed_subcategories = set()
+
+    for new_category in new_categories:
+        i = category_positions.get(new_category.category_name)
+        if i is None:
+            i = category_positions[new_category.category_name] = len(categories)
+            categories.append(new_category.dict())
+            added_categories.add(i)
+            continue
+
+        subcategories = categories[i]["subcategories"]
+        if i not in subcategory_positions:
+            subcategory_positions[i] = _first_positions(subcategories, "subcategory_name")
+        positions = subcategory_positions[i]
+        for new_subcategory in new_category.subcategories:
+            j = positions.get(new_subcategory.subcategory_name)
+            if j is None:
+                j = positions[new_subcategory.subcategory_name] = len(subcategories)
+                subcategories.append(new_subcategory.dict())
+                changed_subcategories.add((i, j))
+                continue
+            # Partial update: only update provided fields
+            changes = {
+                k: v for k, v in new_subcategory.dict(exclude_unset=True).items()
+                if k not in subcategories[j] or subcategories[j][k] != v
+            }
+            if changes:
+                subcategories[j] = {**subcategories[j], **changes}
+                changed_subcategories.add((i, j))
+
+    set_fields = {}
+    scope_total = 0.0
+    for i, category in enumerate(categories):
+        total = _category_total(category["subcategories"])
+        scope_total += total
+        if i in added_categories:
+            category["total_category_emissions_co2e"] = total
+            set_fields[f"categories.{i}"] = category
+        elif category.get("total_category_emissions_co2e") != total:
+            set_fields[f"categories.{i}.total_category_emissions_co2e"] = total
+    for i, j in changed_subcategories:
+        if i not in added_categories:
+            set_fields[f"categories.{i}.subcategories.{j}"] = categories[i]["subcategories"][j]
+    return set_fields, scope_total
 
 class GHGService:
     def __init__(self, db):  # Remove type annotation for compatibility
         self.db = db
-        self.collection = db["ghg_reports"]
+        self.collection = db[GHG_REPORTS_COLLECTION]
+        self.totals = db[GHG_TOTALS_COLLECTION]
+
+    async def create_indices(self):
+        """Create indices for report upserts and the ghg_totals view"""
+        await self.collection.create_index(TOTALS_INDEX)
+        await self.totals.create_index(TOTALS_INDEX, unique=True)
+
+    async def ensure_totals(self) -> int:
+        """
+        Build ghg_totals from scratch when it is empty but there are reports,
+        e.g. on the first start after upgrading or after a restore. Returns
+        the number of totals documents written.
+        """
+        if await self.totals.find_one({}, projection={"_id": 1}) is not None:
+            return 0
+        if await self.collection.find_one({}, projection={"_id": 1}) is None:
+            return 0
+        return await self.rebuild_totals()
 
     async def get_report(self, company_id: str, financial_year: str, plant_id: Optional[str], scope: Optional[str]) -> Optional[GHGReport]:
         query = {"company_id": company_id, "financial_year": financial_year}
@@ -34,62 +143,98 @@ class GHGService:
         if not report.created_at:
             report.created_at = now
 
-        # Fetch existing report
-        existing_doc = await self.collection.find_one(query)
-        if existing_doc:
-            # Merge categories and subcategories with partial update support
-            existing_categories = existing_doc.get("categories", [])
-            new_categories = report.categories
-            merged_categories = existing_categories.copy()
-            for new_cat in new_categories:
-                match = next((cat for cat in merged_categories if cat["category_name"] == new_cat.category_name), None)
-                if match:
-                    existing_subs = match.get("subcategories", [])
-                    for new_sub in new_cat.subcategories:
-                        sub_match = next((sub for sub in existing_subs if sub["subcategory_name"] == new_sub.subcategory_name), None)
-                        if sub_match:
-                            # Partial update: only update provided fields
-                            for k, v in new_sub.dict(exclude_unset=True).items():
-                                sub_match[k] = v
-                        else:
-                            existing_subs.append(new_sub.dict())
-                    match["subcategories"] = existing_subs
-                    if hasattr(new_cat, "total_category_emissions_co2e"):
-                        match["total_category_emissions_co2e"] = new_cat.total_category_emissions_co2e
-                else:
-                    merged_categories.append(new_cat.dict())
-            update_data = report.dict(by_alias=True, exclude={"id", "_id", "categories"})
-            update_data["categories"] = merged_categories
-        else:
-            update_data = report.dict(by_alias=True, exclude={"id", "_id"})
+        for _ in range(MAX_UPSERT_ATTEMPTS):
+            # Fetch existing report
+            existing_doc = await self.collection.find_one(query)
+            if existing_doc:
+                stored = await self._merge_into(existing_doc, report)
+            else:
+                stored = await self._insert(query, report)
+            if stored is not None:
+                await self.totals.update_one(
+                    totals_key(stored),
+                    {"$set": totals_entry(stored, now)},
+                    upsert=True
+                )
+                return report
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="GHG report is being updated concurrently, please retry"
+        )
+
+    async def _insert(self, query: dict, report: GHGReport) -> Optional[dict]:
+        """Insert a new report with version 1; None when another request inserted it first"""
+        doc = report.dict(by_alias=True, exclude={"id", "_id"})
+        for category in doc["categories"]:
+            category["total_category_emissions_co2e"] = _category_total(category["subcategories"])
+        doc["total_scope_emissions_co2e"] = sum(
+            category["total_category_emissions_co2e"] for category in doc["categories"]
+        )
+        doc["version"] = 1
+        result = await self.collection.update_one(query, {"$setOnInsert": doc}, upsert=True)
+        if result.upserted_id is None:
+            return None
+        return {**doc, "_id": result.upserted_id}
+
+    async def _merge_into(self, existing_doc: dict, report: GHGReport) -> Optional[dict]:
+        """
+        Merge the report's categories into the stored report and write only the
+        subcategories that changed, with category and scope totals recomputed,
+        in one update. The update only applies if the stored version is still the
+        one that was read, which also keeps the array positions it writes valid.
+        Returns None when the report changed in between.
+        """
+        set_fields, scope_total = _merge_categories(existing_doc.get("categories") or [], report.categories)
+        update_data = report.dict(by_alias=True, exclude={"id", "_id", "categories"})
+        update_data.update(set_fields)
+        update_data["total_scope_emissions_co2e"] = scope_total
 
-        await self.collection.update_one(
-            query,
-            {"$set": update_data},
-            upsert=True
+        version = existing_doc.get("version")
+        return await self.collection.find_one_and_update(
+            {
+                "_id": existing_doc["_id"],
+                "version": version if version is not None else {"$exists": False}
+            },
+            {"$set": update_data, "$inc": {"version": 1}},
+            projection={"company_id": 1, "plant_id": 1, "financial_year": 1, "scope": 1, "total_scope_emissions_co2e": 1},
+            return_document=ReturnDocument.AFTER
         )
-        return report
+
+    async def rebuild_totals(self, company_id: Optional[str] = None) -> int:
+        """
+        Regenerate ghg_totals from ghg_reports, for one company or from scratch.
+        Returns the number of totals documents written.
+        """
+        if company_id is None:
+            # $out swaps the collection in atomically and keeps its indexes
+            await self.collection.aggregate(rebuild_pipeline() + [{"$out": GHG_TOTALS_COLLECTION}]).to_list(length=None)
+            count = await self.totals.count_documents({})
+        else:
+            entries = await self.collection.aggregate(rebuild_pipeline(company_id)).to_list(length=None)
+            # Replaced in place, so readers never see the company without totals
+            if entries:
+                await self.totals.bulk_write(
+                    [ReplaceOne(totals_key(entry), entry, upsert=True) for entry in entries],
+                    ordered=False
+                )
+            stale = {"company_id": company_id}
+            if entries:
+                stale["$nor"] = [totals_key(entry) for entry in entries]
+            await self.totals.delete_many(stale)
+            count = len(entries)
+        logger.info(f"Rebuilt {count} ghg_totals documents" + (f" for company {company_id}" if company_id else ""))
+        return count
 
     async def get_total_co2_emissions(self, company_id: str, financial_year: Optional[str] = None, scope: Optional[str] = None) -> float:
-        query = {"company_id": company_id}
-        if financial_year:
-            query["financial_year"] = financial_year
-        if scope:
-            query["scope"] = scope
-        cursor = self.collection.find(query)
-        total = 0.0
-        async for doc in cursor:
-            total += float(doc.get("total_scope_emissions_co2e", 0))
-        return total
+        by_scope = await self._sum_totals(company_id, financial_year, scope)
+        return sum(by_scope.values())
 
     async def get_total_co2_emissions_by_scope(self, company_id: str, financial_year: str, scopes: Optional[list] = None):
-        query = {"company_id": company_id, "financial_year": financial_year}
-        if scopes:
-            query["scope"] = {"$in": list(scopes)}
-        cursor = self.collection.find(query)
-        result = {}
-        async for doc in cursor:
-            scope = doc.get("scope", "Unknown")
-            total = float(doc.get("total_scope_emissions_co2e", 0))
-            result[scope] = total
-        return result
+        return await self._sum_totals(company_id, financial_year, scopes)
+
+    async def _sum_totals(self, company_id: str, financial_year: Optional[str], scope) -> dict:
+        """Per-scope emission totals, summed by the database in one indexed read of ghg_totals"""
+        match = totals_match(company_id, financial_year, scope)
+        groups = await self.totals.aggregate(totals_by_scope_pipeline(match)).to_list(length=None)
+        return scope_breakdown(groups)
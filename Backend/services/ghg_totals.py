@@ -0,0 +1,98 @@
+"""
+The ghg_totals collection: one small document per GHG report holding its
+scope total, keyed by company, plant, financial year and scope.
+
+GHGService keeps it in step with ghg_reports on every upsert, so totals are
+summed by the database over a narrow, indexed collection instead of
+streaming whole reports to Python. It is built from ghg_reports at startup
+when empty (see GHGService.ensure_totals) and per company by
+GHGService.rebuild_totals; reads never fall back to scanning ghg_reports.
+The helpers here only build documents and pipelines, so both the API
+service and the MCP tools can use them.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Union
+from datetime import datetime
+
+GHG_REPORTS_COLLECTION = "ghg_reports"
+GHG_TOTALS_COLLECTION = "ghg_totals"
+
+# Unique key of a ghg_totals document
+TOTALS_KEY_FIELDS = ("company_id", "financial_year", "scope", "plant_id")
+TOTALS_INDEX = [(field, 1) for field in TOTALS_KEY_FIELDS]
+
+
+def to_co2e(value: Any) -> float:
+    """Report totals may be missing or stored as strings; anything unparseable counts as 0"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def totals_key(report: Dict[str, Any]) -> Dict[str, Any]:
+    """ghg_totals key of a ghg_reports document; company-level reports have plant_id None"""
+    return {field: report.get(field) for field in TOTALS_KEY_FIELDS}
+
+
+def totals_entry(report: Dict[str, Any], now: Optional[datetime] = None) -> Dict[str, Any]:
+    return {
+        **totals_key(report),
+        "report_id": report.get("_id"),
+        "total_co2e": to_co2e(report.get("total_scope_emissions_co2e")),
+        "updated_at": now or datetime.utcnow()
+    }
+
+
+def totals_match(
+    company_id: str,
+    financial_year: Optional[str] = None,
+    scope: Union[str, Sequence[str], None] = None,
+    plant_ids: Optional[Sequence[str]] = None
+) -> Dict[str, Any]:
+    match: Dict[str, Any] = {"company_id": company_id}
+    if financial_year:
+        match["financial_year"] = financial_year
+    if isinstance(scope, str):
+        match["scope"] = scope
+    elif scope:
+        match["scope"] = {"$in": list(scope)}
+    if plant_ids:
+        match["plant_id"] = {"$in": list(plant_ids)}
+    return match
+
+
+def totals_by_scope_pipeline(match: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Sum ghg_totals per scope; the $match is served by the key index"""
+    return [
+        {"$match": match},
+        {"$group": {"_id": "$scope", "total_co2e": {"$sum": "$total_co2e"}, "reports": {"$sum": 1}}}
+    ]
+
+
+def rebuild_pipeline(company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Recompute ghg_totals documents from ghg_reports"""
+    pipeline: List[Dict[str, Any]] = []
+    if company_id:
+        pipeline.append({"$match": {"company_id": company_id}})
+    pipeline.extend([
+        {"$group": {
+            "_id": {field: {"$ifNull": [f"${field}", None]} for field in TOTALS_KEY_FIELDS},
+            "report_id": {"$last": "$_id"},
+            "total_co2e": {"$sum": {"$convert": {
+                "input": "$total_scope_emissions_co2e", "to": "double", "onError": 0.0, "onNull": 0.0
+            }}}
+        }},
+        {"$replaceRoot": {"newRoot": {"$mergeObjects": [
+            "$_id", {"report_id": "$report_id", "total_co2e": "$total_co2e"}
+        ]}}},
+        {"$addFields": {"updated_at": "$$NOW"}}
+    ])
+    return pipeline
+
+
+def scope_breakdown(groups: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    """Turn totals_by_scope_pipeline output into {scope: total}"""
+    return {
+        (group["_id"] if group["_id"] is not None else "Unknown"): group["total_co2e"]
+        for group in groups
+    }
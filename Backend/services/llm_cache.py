@@ -0,0 +1,228 @@
+# Bounded cache for LLM responses
+#
+# Responses are cached under a hash of the model and the full prompt, expire
+# after a TTL, and the least recently used ones are evicted once the cache
+# holds more than its byte or entry budget. The default backend is in-process;
+# LLM_CACHE_BACKEND=sqlite keeps the cache in a SQLite file instead, so cached
+# answers survive restarts and are shared by every uvicorn worker on the host;
+# its calls run in a worker thread so file I/O never blocks the event loop.
+
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")  # memory | sqlite
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm_cache.sqlite")
+)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))  # Seconds
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+# Reads of the SQLite backend stamp last_used in batches of this many, or on the next write
+LLM_CACHE_TOUCH_BATCH = int(os.getenv("LLM_CACHE_TOUCH_BATCH", "64"))
+
+
+def cache_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """Per-process LRU of (value, expires_at) keyed by cache key"""
+
+    blocking = False  # Cheap enough to call on the event loop
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.time() + ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "evictions": self.evictions}
+
+
+class SQLiteCacheBackend:
+    """
+    Cache table in a SQLite file shared by every process that opens it. Reads
+    collect their last_used stamps and write them in batches, and writes evict
+    expired entries, then the least recently used ones while the table is over
+    budget.
+    """
+
+    blocking = True  # File I/O; ResponseCache calls it from a worker thread
+
+    def __init__(self, path: str, max_bytes: int, max_entries: int, touch_batch: int = LLM_CACHE_TOUCH_BATCH):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.touch_batch = touch_batch
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last read time, not yet written
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch:
+                self._write_touched()
+                self._db.commit()
+            return row[0]
+
+    def _write_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE responses SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def set(self, key: str, value: str, ttl: float):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            # Eviction must see recent reads
+            self._write_touched()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, expires_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl, now)
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            while total > self.max_bytes or entries > self.max_entries:
+                # Evict the least recently used tenth at a time rather than row by row
+                batch = max(1, entries // 10)
+                evicted = self._db.execute(
+                    "SELECT key, size FROM responses ORDER BY last_used LIMIT ?", (batch,)
+                ).fetchall()
+                if not evicted:
+                    break
+                self._db.executemany("DELETE FROM responses WHERE key = ?", [(row[0],) for row in evicted])
+                self.evictions += len(evicted)
+                entries -= len(evicted)
+                total -= sum(row[1] for row in evicted)
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": entries, "bytes": total, "evictions": self.evictions, "path": self.path}
+
+
+class ResponseCache:
+    """TTL cache of LLM responses over a pluggable backend, counting hits and misses"""
+
+    def __init__(self, backend, ttl: float = LLM_CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[str]:
+        try:
+            value = await self._call(self.backend.get, key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        try:
+            await self._call(self.backend.set, key, value, self.ttl)
+        except Exception as e:
+            # A cache that cannot be written must not fail the request
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "max_bytes": self.backend.max_bytes,
+            "max_entries": self.backend.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            **self.backend.stats()
+        }
+
+
+_response_cache = None
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        if LLM_CACHE_BACKEND == "sqlite":
+            backend = SQLiteCacheBackend(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_ENTRIES)
+        else:
+            backend = MemoryCacheBackend(LLM_CACHE_MAX_BYTES, LLM_CACHE_MAX_ENTRIES)
+        _response_cache = ResponseCache(backend)
+        logger.info(f"LLM response cache: {type(backend).__name__}")
+    return _response_cache
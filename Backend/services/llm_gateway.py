@@ -0,0 +1,302 @@
+# Async gateway for Gemini calls
+#
+# Every LLM call goes through a named endpoint (gemini_qa, gemini_chat,
+# gemini_mcp...) that owns a token-bucket rate limiter and a semaphore capping
+# its concurrent requests. Calls use the google-genai async client, so waiting
+# on the API, the limiter or a retry backoff never blocks the event loop.
+# Requests time out after LLM_TIMEOUT seconds and rate-limit (429) or
+# overload (503) errors are retried with exponential backoff.
+#
+# A long, fixed system instruction can be uploaded once as Gemini cached
+# content (cached_prefix) and referenced by name from later requests, which
+# then only send their own text. Backends without caching, and prefixes below
+# the API's minimum size, are sent inline as before.
+#
+# Set LLM_FAKE_BACKEND=1 to answer every call locally without network access,
+# e.g. for offline tests; FakeBackend can also be given canned responses.
+
+import os
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+LLM_RATE_PER_SEC = float(os.getenv("LLM_RATE_PER_SEC", "1.0"))  # Sustained requests per second per endpoint
+LLM_BURST = int(os.getenv("LLM_BURST", "3"))  # Requests an idle endpoint may send at once
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # Seconds per request (per chunk when streaming)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))  # Seconds before the first retry, doubling after
+LLM_FAKE_BACKEND = os.getenv("LLM_FAKE_BACKEND", "0") == "1"
+# Interactive chat endpoints answer one user message per request, so they get a budget of their own
+LLM_CHAT_RATE_PER_SEC = float(os.getenv("LLM_CHAT_RATE_PER_SEC", "10"))
+LLM_CHAT_BURST = int(os.getenv("LLM_CHAT_BURST", "20"))
+LLM_CHAT_MAX_CONCURRENCY = int(os.getenv("LLM_CHAT_MAX_CONCURRENCY", "16"))
+CHAT_GATEWAY_LIMITS = {
+    "rate_per_sec": LLM_CHAT_RATE_PER_SEC,
+    "burst": LLM_CHAT_BURST,
+    "max_concurrency": LLM_CHAT_MAX_CONCURRENCY
+}
+LLM_PREFIX_CACHE_TTL = int(os.getenv("LLM_PREFIX_CACHE_TTL", "3600"))  # Seconds a cached prefix lives on the API
+LLM_PREFIX_CACHE_MIN_TOKENS = int(os.getenv("LLM_PREFIX_CACHE_MIN_TOKENS", "4096"))  # Smallest prefix the API will cache
+
+RETRYABLE_STATUS = {429, 503}
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails for good, after any retries"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+def _status_of(error: Exception) -> Optional[int]:
+    """HTTP status of a google-genai error, falling back to the message for other clients"""
+    status = getattr(error, "code", None)
+    if isinstance(status, int):
+        return status
+    message = str(error)
+    if "429" in message or "RESOURCE_EXHAUSTED" in message:
+        return 429
+    if "503" in message or "UNAVAILABLE" in message:
+        return 503
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of English text and JSON (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                logger.info(f"Rate limiting: waiting {wait:.2f} seconds before API call")
+                await asyncio.sleep(wait)
+
+
+class GeminiBackend:
+    """google-genai async client"""
+
+    def __init__(self, api_key: Optional[str]):
+        from google import genai
+
+        self.client = genai.Client(api_key=api_key)
+
+    async def generate(self, model: str, prompt, config=None) -> str:
+        response = await self.client.aio.models.generate_content(model=model, contents=prompt, config=config)
+        if not response or not getattr(response, "text", None):
+            return ""
+        return str(response.text)
+
+    async def stream(self, model: str, prompt, config=None) -> AsyncIterator[str]:
+        stream = await self.client.aio.models.generate_content_stream(model=model, contents=prompt, config=config)
+        async for chunk in stream:
+            if getattr(chunk, "text", None):
+                yield chunk.text
+
+    async def create_cache(self, model: str, system_instruction: str, ttl_seconds: int) -> str:
+        """Upload system_instruction as cached content; returns the name requests refer to it by"""
+        from google.genai import types
+
+        cache = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(system_instruction=system_instruction, ttl=f"{ttl_seconds}s")
+        )
+        return cache.name
+
+
+class FakeBackend:
+    """
+    Offline stand-in for GeminiBackend. Answers with the queued responses in
+    order, then with a fixed echo of the prompt; every prompt is recorded.
+    """
+
+    def __init__(self, responses: Optional[List[str]] = None):
+        self.responses = list(responses or [])
+        self.prompts = []
+
+    def _next(self, prompt) -> str:
+        self.prompts.append(prompt)
+        if self.responses:
+            return self.responses.pop(0)
+        return f"FAKE_RESPONSE: {str(prompt)[:200]}"
+
+    async def generate(self, model: str, prompt, config=None) -> str:
+        return self._next(prompt)
+
+    async def stream(self, model: str, prompt, config=None) -> AsyncIterator[str]:
+        for word in self._next(prompt).split(" "):
+            yield word + " "
+
+
+class LLMGateway:
+    """One named endpoint: its backend, rate limiter, concurrency cap and retry policy"""
+
+    def __init__(
+        self,
+        name: str,
+        backend,
+        rate_per_sec: float = LLM_RATE_PER_SEC,
+        burst: int = LLM_BURST,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        timeout: float = LLM_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES
+    ):
+        self.name = name
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate_per_sec, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        # Hash of (model, prefix) -> (cached content name or None if it could not be cached, refresh time)
+        self._prefix_caches: Dict[str, Tuple[Optional[str], float]] = {}
+        self._prefix_lock = asyncio.Lock()
+        self.prefix_cache_hits = 0
+
+    async def _backoff(self, attempt: int, error: Exception):
+        delay = LLM_BACKOFF_BASE * 2 ** attempt * (1 + random.random() / 2)
+        self.retries += 1
+        logger.warning(f"[{self.name}] {error}; retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+        await asyncio.sleep(delay)
+
+    def _give_up(self, error: Exception) -> LLMError:
+        self.failures += 1
+        if isinstance(error, asyncio.TimeoutError):
+            return LLMError(f"{self.name} request timed out after {self.timeout:.0f}s", status=504)
+        return LLMError(str(error), status=_status_of(error))
+
+    async def generate(self, model: str, prompt, config=None) -> str:
+        """Response text for prompt; raises LLMError once retries are exhausted"""
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            try:
+                async with self._semaphore:
+                    return await asyncio.wait_for(self.backend.generate(model, prompt, config), self.timeout)
+            except Exception as e:
+                if attempt < self.max_retries and _status_of(e) in RETRYABLE_STATUS:
+                    await self._backoff(attempt, e)
+                    continue
+                raise self._give_up(e) from e
+
+    async def stream(self, model: str, prompt, config=None) -> AsyncIterator[str]:
+        """
+        Response text chunks for prompt. Failures before the first chunk are
+        retried like generate; once text has been yielded they raise LLMError.
+        """
+        self.calls += 1
+        for attempt in range(self.max_retries + 1):
+            await self._bucket.acquire()
+            started = False
+            try:
+                async with self._semaphore:
+                    chunks = self.backend.stream(model, prompt, config).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                        except StopAsyncIteration:
+                            return
+                        started = True
+                        yield chunk
+            except Exception as e:
+                if not started and attempt < self.max_retries and _status_of(e) in RETRYABLE_STATUS:
+                    await self._backoff(attempt, e)
+                    continue
+                raise self._give_up(e) from e
+
+    async def cached_prefix(self, model: str, system_instruction: str) -> Optional[str]:
+        """
+        Name of the cached content holding system_instruction, uploaded on
+        first use and again shortly before it expires. None when the backend
+        cannot cache or the prefix is too short to; the caller then sends the
+        instruction inline. A failed upload is not retried until the TTL ends.
+        """
+        create = getattr(self.backend, "create_cache", None)
+        if create is None or estimate_tokens(system_instruction) < LLM_PREFIX_CACHE_MIN_TOKENS:
+            return None
+        key = hashlib.sha256(f"{model}\x1f{system_instruction}".encode()).hexdigest()
+        async with self._prefix_lock:
+            entry = self._prefix_caches.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                if entry[0] is not None:
+                    self.prefix_cache_hits += 1
+                return entry[0]
+            await self._bucket.acquire()
+            try:
+                name = await asyncio.wait_for(create(model, system_instruction, LLM_PREFIX_CACHE_TTL), self.timeout)
+                logger.info(f"[{self.name}] Cached a {len(system_instruction)}-character prompt prefix as {name}")
+            except Exception as e:
+                name = None
+                logger.warning(f"[{self.name}] Could not cache prompt prefix, sending it inline: {e}")
+            # Refresh a minute early so a request never refers to content the API just dropped
+            self._prefix_caches[key] = (name, time.monotonic() + max(LLM_PREFIX_CACHE_TTL - 60, 0))
+            return name
+
+    def drop_cached_prefix(self, name: str):
+        """Forget a cached content name the API rejected, so the next request uploads it again"""
+        for key in [key for key, entry in self._prefix_caches.items() if entry[0] == name]:
+            del self._prefix_caches[key]
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "cached_prefixes": sum(1 for name, _ in self._prefix_caches.values() if name is not None),
+            "prefix_cache_hits": self.prefix_cache_hits
+        }
+
+
+_gateways: Dict[str, LLMGateway] = {}
+
+def get_llm_gateway(name: str, api_key: Optional[str] = None, **limits) -> LLMGateway:
+    """
+    The process-wide gateway for an endpoint, created on first use with
+    api_key and any limits overriding the LLM_* defaults.
+    """
+    gateway = _gateways.get(name)
+    if gateway is None:
+        backend = FakeBackend() if LLM_FAKE_BACKEND else GeminiBackend(api_key)
+        gateway = _gateways[name] = LLMGateway(name, backend, **limits)
+        logger.info(f"Created LLM gateway {name} ({type(backend).__name__})")
+    return gateway
+
+def set_llm_backend(name: str, backend):
+    """Swap an endpoint's backend, e.g. for a FakeBackend with canned responses in tests"""
+    gateway = _gateways.get(name)
+    if gateway is None:
+        _gateways[name] = LLMGateway(name, backend)
+    else:
+        gateway.backend = backend
+
+def llm_gateway_stats() -> dict:
+    return {name: gateway.stats() for name, gateway in _gateways.items()}
@@ -1,10 +1,13 @@
 
 import json
 import os
-from google import genai
+import time
 from google.genai import types
+from services.llm_gateway import CHAT_GATEWAY_LIMITS, LLMError, get_llm_gateway
 from services.mcpServices.LLMs.Groq.Context import GroqContext
 from services.mcpServices.LLMs.Groq.LoggerService import get_logger
+from services.mcpServices.LLMs.Groq.PromptService import assemble_prompt, record_prompt_usage
+from services.mcpServices.LLMs.Groq.IntentRouter import route_message, record_fast_path, record_llm_fallback
 
 logger = get_logger("MCP.OpenRouterService")
 
@@ -18,7 +21,7 @@ class GeminiService:
     def __init__(self):
         self.api_key = GEMINI_API_KEY_MCP
         self.model = GEMINI_MODEL
-        self.client = genai.Client(api_key=self.api_key)
+        self.gateway = get_llm_gateway("gemini_mcp", api_key=self.api_key, **CHAT_GATEWAY_LIMITS)
 
 
     @staticmethod
@@ -35,42 +38,51 @@ class GeminiService:
         return content.strip()
 
 
-    # ...existing code for query method...
-
-
+    async def _generate(self, user_input):
+        """
+        Ask the model with only the prompt sections the message needs. The
+        sections go in as the system instruction, from Gemini's context cache
+        when it holds them, so only the user's message is sent each time.
+        """
+        prompt = assemble_prompt(user_input)
+        contents = f"User Input: {user_input}"
+        cache_name = await self.gateway.cached_prefix(self.model, prompt.system_instruction)
+        if cache_name:
+            try:
+                response_text = await self.gateway.generate(self.model, contents, types.GenerateContentConfig(
+                    response_mime_type="text/plain",
+                    cached_content=cache_name
+                ))
+                record_prompt_usage(prompt, cached=True)
+                return response_text
+            except LLMError as e:
+                if e.status not in (400, 403, 404):
+                    raise
+                # The cached content expired or was deleted on the API side; send the sections inline
+                logger.warning("Cached prompt %s rejected (%s), sending it inline", cache_name, e)
+                self.gateway.drop_cached_prefix(cache_name)
+        response_text = await self.gateway.generate(self.model, contents, types.GenerateContentConfig(
+            response_mime_type="text/plain",
+            system_instruction=prompt.system_instruction
+        ))
+        record_prompt_usage(prompt, cached=False)
+        return response_text
 
     async def query(self, messages):
         user_input = messages[0].get("content", "") if messages else ""
-        system_warning = (
-            "🚨 FOR EMPLOYEE CREATION: ONLY output {\"operation\": \"create_employee\", ...}. "
-            "Never use 'update', 'upsert', 'insert', 'insert_one', or 'hashed_password'. "
-            "If you do, your response will be rejected. "
-            "ALWAYS follow this format for employee creation.\n"
-            "🚨 FOR PLANT CREATION: ONLY output {\"operation\": \"create_plant\", ...}. "
-            "Never use 'update', 'upsert', 'insert', 'insert_one', or 'plant_code'. "
-            "If you do, your response will be rejected. "
-            "ALWAYS follow this format for plant creation."
-        )
-        combined_context = f"{system_warning}\n\n{self.get_context()}\n\nUser Input: {user_input}"
-        prompt = combined_context
-        generate_content_config = types.GenerateContentConfig(
-            response_mime_type="text/plain",
-        )
+        # Templated plant-count and emissions questions go straight to their tool operation
+        started = time.perf_counter()
+        routed = route_message(user_input)
+        if routed is not None:
+            record_fast_path(routed.intent, (time.perf_counter() - started) * 1000)
+            logger.info("Fast path %s: %s", routed.intent, routed.query)
+            return {"isDbRelated": True, "response": routed.query}
         try:
-            import asyncio
-            loop = asyncio.get_event_loop()
-            def run_gemini():
-                # Use streaming for consistency with reference
-                result = ""
-                for chunk in self.client.models.generate_content_stream(
-                    model=self.model,
-                    contents=prompt,
-                    config=generate_content_config,
-                ):
-                    if hasattr(chunk, "text") and chunk.text:
-                        result += chunk.text
-                return result
-            response_text = await loop.run_in_executor(None, run_gemini)
+            started = time.perf_counter()
+            try:
+                response_text = await self._generate(user_input)
+            finally:
+                record_llm_fallback((time.perf_counter() - started) * 1000)
             logger.info("Gemini client content: %s", response_text)
             try:
                 clean_content = self._strip_code_block(response_text)
@@ -0,0 +1,181 @@
+import os
+import re
+import threading
+from typing import Any, Dict, NamedTuple, Optional
+
+from rag.instrumentation import StageHistogram
+from services.mcpServices.LLMs.Groq.LoggerService import get_logger
+
+logger = get_logger("MCP.IntentRouter")
+
+# Set MCP_FAST_PATH=0 to send every chat message to the LLM
+MCP_FAST_PATH = os.getenv("MCP_FAST_PATH", "1") == "1"
+# Longer names are more likely a sentence the templates misread than a company
+MAX_NAME_WORDS = 8
+
+_ID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{24}"
+_SCOPE = r"scope ?(?:1|2|one|two)|both scopes|all scopes"
+_YEAR = r"20\d{2} ?[-/–] ?(?:20)?\d{2}"
+_ASK = r"(?:what (?:is|are|was|were) |what's |show (?:me )?|get |tell me |give me )?(?:the )?"
+
+# Each template has to match the whole message; anything else goes to the LLM
+PLANT_COUNT_TEMPLATES = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r"how many plants (?:does|do|did) (?:the )?(?P<entity>.+?) (?:have|own|operate|run)",
+    r"how many plants (?:are there |are |exist )?(?:in|for|at|under|belong to|belonging to) (?:the )?(?P<entity>.+?)",
+    _ASK + r"(?:total )?(?:number|count) of plants (?:in|for|at|of|under) (?:the )?(?P<entity>.+?)",
+    _ASK + r"plant count (?:in|for|at|of) (?:the )?(?P<entity>.+?)",
+    r"count (?:the )?plants (?:in|for|at|of|under) (?:the )?(?P<entity>.+?)",
+)]
+EMISSIONS_TEMPLATES = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    _ASK + rf"(?:total )?(?:(?P<scope>{_SCOPE}) )?(?:co2e? |ghg |carbon )?emissions?"
+    rf"(?: (?:in|for|during) (?:fy ?|financial year )?(?P<year>{_YEAR}))?"
+    r" (?:of|for|at|by|from) (?:the )?(?P<entity>.+?)"
+    rf"(?: (?:in|for|during) (?:fy ?|financial year )?(?P<year2>{_YEAR}))?"
+    rf"(?: (?:for|in) (?P<scope2>{_SCOPE}))?",
+)]
+
+# Words that mean the "name" is really part of a longer question ("... over the last 3 years", "... compared to X"),
+# or a financial year the templates did not pick up ("emissions of Acme 2023-24")
+_NOT_A_NAME_RE = re.compile(
+    r"\b(and|or|but|which|that|where|whose|with|than|each|every|all|in|for|during|fy|years?|months?|scope|emissions?"
+    r"|over|last|past|previous|since|between|from|to|vs|versus|compared?|comparison|trend|per)\b|[,;?]"
+    rf"|\b(?:{_YEAR})\b",
+    re.IGNORECASE
+)
+_PRONOUNS = {"we", "i", "you", "they", "it", "us", "me", "company", "my company", "our company", "this company"}
+_ID_RE = re.compile(rf"(?:(?:my |our |the )?(?P<kind>company|plant) )?(?:with )?(?:id )?(?P<id>{_ID})", re.IGNORECASE)
+_PLANT_NAME_RE = re.compile(r"plant (?P<name>.+)|(?P<name2>.+) plant", re.IGNORECASE)
+_COMPANY_NAME_RE = re.compile(r"company (?P<name>.+)", re.IGNORECASE)
+
+
+class RouteMatch(NamedTuple):
+    intent: str
+    query: Dict[str, Any]  # The ToolService operation, as the LLM would have written it
+
+
+def _clean(message: str) -> str:
+    return re.sub(r"\s+", " ", message or "").strip().rstrip("?.! ")
+
+
+def _entity(text: str) -> Optional[Dict[str, str]]:
+    """Company or plant fields for the name or id in a message; None when it does not look like one"""
+    text = text.strip().strip("'\"")
+    id_match = _ID_RE.fullmatch(text)
+    if id_match:
+        kind = (id_match.group("kind") or "company").lower()
+        return {f"{kind}_id": id_match.group("id")}
+    if text.lower() in _PRONOUNS or _NOT_A_NAME_RE.search(text) or len(text.split()) > MAX_NAME_WORDS:
+        return None
+    plant = _PLANT_NAME_RE.fullmatch(text)
+    if plant:
+        return {"plant_name": (plant.group("name") or plant.group("name2")).strip()}
+    company = _COMPANY_NAME_RE.fullmatch(text)
+    return {"company_name": (company.group("name") if company else text).strip()}
+
+
+def _financial_year(text: str) -> Optional[str]:
+    """ "2023-24", "2023/2024" -> "2023-2024", the form GHG reports store; None for anything else"""
+    start, end = re.split(r" ?[-/–] ?", text)
+    if int(end) % 100 != (int(start) + 1) % 100:
+        return None
+    return f"{start}-{int(start) + 1}"
+
+
+def _scope(text: str):
+    text = text.lower()
+    if text in ("both scopes", "all scopes"):
+        return ["Scope 1", "Scope 2"]
+    return "Scope 1" if text.replace(" ", "") in ("scope1", "scopeone") else "Scope 2"
+
+
+def _route_plant_count(message: str) -> Optional[RouteMatch]:
+    for template in PLANT_COUNT_TEMPLATES:
+        match = template.fullmatch(message)
+        if match:
+            entity = _entity(match.group("entity"))
+            # count_plants is per company
+            if entity is None or not ("company_id" in entity or "company_name" in entity):
+                return None
+            return RouteMatch("plant_count", {"operation": "count_plants", **entity})
+    return None
+
+
+def _route_emissions(message: str) -> Optional[RouteMatch]:
+    for template in EMISSIONS_TEMPLATES:
+        match = template.fullmatch(message)
+        if match:
+            entity = _entity(match.group("entity"))
+            if entity is None:
+                return None
+            query = {"operation": "get_total_emissions", **entity}
+            year = match.group("year") or match.group("year2")
+            if year:
+                query["financial_year"] = _financial_year(year)
+                if query["financial_year"] is None:
+                    return None
+            scope = match.group("scope") or match.group("scope2")
+            if scope:
+                query["scope"] = _scope(scope)
+            return RouteMatch("emissions", query)
+    return None
+
+
+def route_message(user_input: str) -> Optional[RouteMatch]:
+    """
+    The ToolService operation for a templated plant-count or emissions
+    question, with its parameters filled in from the message. None unless a
+    template matches the whole message and the name in it looks like one.
+    """
+    if not MCP_FAST_PATH:
+        return None
+    message = _clean(user_input)
+    if not message:
+        return None
+    return _route_plant_count(message) or _route_emissions(message)
+
+
+class RouterStats:
+    """How many messages took the fast path, per intent, and the latency of each path"""
+
+    def __init__(self):
+        self.hits: Dict[str, int] = {}
+        self.misses = 0
+        self.fast_path = StageHistogram()  # Routing a message the templates answered
+        self.llm = StageHistogram()  # LLM round trip of a message they did not
+        self._lock = threading.Lock()
+
+    def record_hit(self, intent: str, elapsed_ms: float):
+        with self._lock:
+            self.hits[intent] = self.hits.get(intent, 0) + 1
+            self.fast_path.observe(elapsed_ms)
+
+    def record_miss(self, llm_ms: float):
+        with self._lock:
+            self.misses += 1
+            self.llm.observe(llm_ms)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                "messages": total,
+                "fast_path_hits": hits,
+                "llm_fallbacks": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "hits_by_intent": dict(self.hits),
+                "fast_path_latency": self.fast_path.to_dict(),
+                "llm_latency": self.llm.to_dict()
+            }
+
+
+_router_stats = RouterStats()
+
+def record_fast_path(intent: str, elapsed_ms: float):
+    _router_stats.record_hit(intent, elapsed_ms)
+
+def record_llm_fallback(elapsed_ms: float):
+    _router_stats.record_miss(elapsed_ms)
+
+def router_stats() -> dict:
+    return _router_stats.to_dict()
@@ -0,0 +1,140 @@
+import os
+import re
+import threading
+from typing import Dict, NamedTuple, Tuple
+
+from services.llm_gateway import estimate_tokens
+from services.mcpServices.LLMs.Groq import Context
+from services.mcpServices.LLMs.Groq.LoggerService import get_logger
+
+logger = get_logger("MCP.PromptService")
+
+# Set MCP_PROMPT_SLIMMING=0 to send every section with every request
+MCP_PROMPT_SLIMMING = os.getenv("MCP_PROMPT_SLIMMING", "1") == "1"
+
+# Sections in the order they appear in the prompt. A set of sections always
+# assembles to the same text, so requests with the same intents share one
+# cached prefix.
+SECTION_ORDER = (
+    "CREATION_WARNING",
+    "ENVIRONMENT_UPDATE_RULES",
+    "AUDIT_STATUS_RULES",
+    "COMPANY_ID_RULES",
+    "ASSISTANT_INSTRUCTIONS",
+    "FIELD_REFERENCE",
+    "COMPANY_NAME_MAPPING",
+    "RESPONSE_FORMAT"
+)
+SECTIONS = {name: getattr(Context, name).strip() for name in SECTION_ORDER}
+
+# Role, schema, query rules and answer format go with every request
+CORE_SECTIONS = ("ASSISTANT_INSTRUCTIONS", "RESPONSE_FORMAT")
+# Added when no intent matched, so a general question still sees every collection's fields
+GENERAL_SECTIONS = ("FIELD_REFERENCE",)
+
+# What every request used to send before the prompt was split
+FULL_PROMPT_TOKENS = estimate_tokens(f"{SECTIONS['CREATION_WARNING']}\n\n{Context.GroqContext}")
+
+_PEOPLE = r"(employees?|users?|admins?|staff|members?)"
+
+
+class Intent(NamedTuple):
+    name: str
+    pattern: "re.Pattern"  # Matched against the lowercased user message
+    sections: Tuple[str, ...]
+
+
+INTENTS = (
+    Intent("plant_creation", re.compile(r"\b(create|add|new|register|onboard)\b.*\bplants?\b"), ("CREATION_WARNING",)),
+    Intent("employee_creation", re.compile(rf"\b(create|add|new|register|onboard|invite)\b.*\b{_PEOPLE}\b"), ("CREATION_WARNING",)),
+    Intent("environment_update", re.compile(r"\b(update|set|change|modify|edit|mark|attach|bulk)\b"), ("ENVIRONMENT_UPDATE_RULES", "COMPANY_ID_RULES")),
+    Intent("audit_status", re.compile(r"\baudit(ed|s|ing)?\b"), ("AUDIT_STATUS_RULES", "COMPANY_ID_RULES")),
+    Intent("environment_query", re.compile(r"\b(answers?|environment|questions?|[a-z]{2,3}-\d+)\b"), ("FIELD_REFERENCE", "COMPANY_ID_RULES", "COMPANY_NAME_MAPPING")),
+    Intent("company_lookup", re.compile(r"\b(compan(y|ies)|ltd|pvt|limited|inc|corp|corporation|industries|llp)\b"), ("COMPANY_ID_RULES", "COMPANY_NAME_MAPPING")),
+)
+
+
+class AssembledPrompt(NamedTuple):
+    system_instruction: str
+    intents: Tuple[str, ...]
+    sections: Tuple[str, ...]
+    tokens: int  # Estimated tokens of system_instruction
+
+
+def classify_intents(user_input: str) -> Tuple[str, ...]:
+    """Names of the intents whose keywords appear in the message; a message can have several"""
+    text = (user_input or "").lower()
+    return tuple(intent.name for intent in INTENTS if intent.pattern.search(text))
+
+
+def assemble_prompt(user_input: str) -> AssembledPrompt:
+    """The system instruction for a message: the core sections plus those of its intents"""
+    intents = classify_intents(user_input)
+    if not MCP_PROMPT_SLIMMING:
+        wanted = set(SECTION_ORDER)
+    else:
+        wanted = set(CORE_SECTIONS)
+        for intent in INTENTS:
+            if intent.name in intents:
+                wanted.update(intent.sections)
+        if not intents:
+            wanted.update(GENERAL_SECTIONS)
+    sections = tuple(name for name in SECTION_ORDER if name in wanted)
+    system_instruction = "\n\n".join(SECTIONS[name] for name in sections)
+    return AssembledPrompt(system_instruction, intents, sections, estimate_tokens(system_instruction))
+
+
+class PromptStats:
+    """Running totals of the prompt tokens sent, served from the cache and saved"""
+
+    def __init__(self):
+        self.requests = 0
+        self.full_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.intents: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, prompt: AssembledPrompt, cached: bool) -> dict:
+        """Count one request and return its own report"""
+        report = {
+            "intents": list(prompt.intents),
+            "sections": list(prompt.sections),
+            "full_prompt_tokens": FULL_PROMPT_TOKENS,
+            "prompt_tokens": prompt.tokens,
+            "tokens_saved": FULL_PROMPT_TOKENS - prompt.tokens,
+            "cached_tokens": prompt.tokens if cached else 0
+        }
+        with self._lock:
+            self.requests += 1
+            self.full_prompt_tokens += FULL_PROMPT_TOKENS
+            self.prompt_tokens += prompt.tokens
+            self.cached_tokens += report["cached_tokens"]
+            for intent in prompt.intents or ("general",):
+                self.intents[intent] = self.intents.get(intent, 0) + 1
+        logger.info(
+            "Prompt for %s: %d of %d prefix tokens (%d saved, %d from cache)",
+            ", ".join(prompt.intents) or "general", prompt.tokens, FULL_PROMPT_TOKENS,
+            report["tokens_saved"], report["cached_tokens"]
+        )
+        return report
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "full_prompt_tokens": self.full_prompt_tokens,
+                "prompt_tokens": self.prompt_tokens,
+                "tokens_saved": self.full_prompt_tokens - self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "intents": dict(self.intents)
+            }
+
+
+_prompt_stats = PromptStats()
+
+def record_prompt_usage(prompt: AssembledPrompt, cached: bool) -> dict:
+    return _prompt_stats.record(prompt, cached)
+
+def prompt_stats() -> dict:
+    return _prompt_stats.to_dict()
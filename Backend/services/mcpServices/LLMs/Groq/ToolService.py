@@ -1,17 +1,49 @@
 
+import os
+import asyncio
+from bson import ObjectId
 from services.mcpServices.LLMs.Groq.LoggerService import get_logger
+from services.ghgService import GHGService
+from services.ghg_totals import (
+    GHG_REPORTS_COLLECTION,
+    GHG_TOTALS_COLLECTION,
+    scope_breakdown,
+    totals_by_scope_pipeline,
+    totals_match
+)
+from services.name_index import COMPANY_NAMES, PLANT_NAMES, invalidate_name_index, resolve_name, with_name_key
 
 logger = get_logger("MCP.ToolService")
 
+# Every tool call must finish within this time; reads also pass it to the server as maxTimeMS
+MCP_TOOL_TIMEOUT_MS = int(os.getenv("MCP_TOOL_TIMEOUT_MS", "10000"))
+# Documents a find returns in one reply; larger result sets are streamed in pages
+MCP_TOOL_MAX_RESULTS = int(os.getenv("MCP_TOOL_MAX_RESULTS", "200"))
+MCP_TOOL_PAGE_SIZE = int(os.getenv("MCP_TOOL_PAGE_SIZE", "100"))
+MCP_TOOL_STREAM_MAX_RESULTS = int(os.getenv("MCP_TOOL_STREAM_MAX_RESULTS", "10000"))
+
+# Operations with a dedicated handler rather than a generic query
+HANDLED_OPERATIONS = frozenset(["create_employee", "create_plant", "delete_plant", "count_plants", "get_total_emissions"])
+
 def print_debug_query(query, user_prompt, projection=None, collection=None, operation=None):
     logger.info(f"Executing MongoDB query: {query} | Projection: {projection} | Collection: {collection} | Operation: {operation} | User prompt: {user_prompt}")
 
+def name_not_found(kind, name, suggestions):
+    if suggestions:
+        return {"error": f"{kind} '{name}' is ambiguous", "did_you_mean": suggestions}
+    return {"error": f"{kind} '{name}' not found"}
+
+def company_id_filter(company_id):
+    """Companies keep their UUID in 'id'; a 24-hex id may also be the document's ObjectId"""
+    if ObjectId.is_valid(company_id):
+        return {"$or": [{"id": company_id}, {"_id": ObjectId(company_id)}, {"_id": company_id}]}
+    return {"$or": [{"id": company_id}, {"_id": company_id}]}
+
 class ToolService:
 
-    def _handle_get_total_emissions(self, query_obj, user_prompt=""):
+    async def _handle_get_total_emissions(self, query_obj, user_prompt=""):
         """Handle total CO2 emissions queries by company/plant name or ID, year, and scope."""
         try:
-            import re
             db = self.db
             if db is None:
                 return {"error": "Database connection not initialized."}
@@ -23,30 +55,21 @@ class ToolService:
             financial_year = query_obj.get("financial_year")
             scope = query_obj.get("scope")  # Can be "Scope 1", "Scope 2", or None (for both)
 
-            def normalize_name(name):
-                # Remove periods, spaces, and lowercase
-                return re.sub(r'[^a-z0-9]', '', name.lower()) if name else ''
-
             # Resolve company_name to company_id if needed
             if not company_id and company_name:
-                companies = list(db["companies"].find({}))
-                norm_input = normalize_name(company_name)
-                matched = None
-                for c in companies:
-                    db_name = c.get("name", "")
-                    if normalize_name(db_name) == norm_input:
-                        matched = c
-                        break
-                if not matched:
-                    return {"error": f"Company '{company_name}' not found"}
+                match = await resolve_name(db, COMPANY_NAMES, company_name)
+                if match.doc is None:
+                    return name_not_found("Company", company_name, match.suggestions)
+                matched = match.doc
                 # Use the normal 'id' field (not _id) for company_id matching in ghg_reports
                 company_id = matched.get("id") or str(matched.get("_id"))
 
             # Resolve plant_name to plant_id if needed
             if not plant_id and plant_name:
-                plant_doc = db["plants"].find_one({"plant_name": {"$regex": f"^{plant_name}$", "$options": "i"}})
-                if not plant_doc:
-                    return {"error": f"Plant '{plant_name}' not found"}
+                match = await resolve_name(db, PLANT_NAMES, plant_name, company_id)
+                if match.doc is None:
+                    return name_not_found("Plant", plant_name, match.suggestions)
+                plant_doc = match.doc
                 plant_id = plant_doc["id"]
                 # If company_id not set, get from plant
                 if not company_id:
@@ -57,7 +80,7 @@ class ToolService:
             plant_ids = []
             if company_id and not plant_id:
                 # Find company by 'id' field (not _id)
-                company_doc = db["companies"].find_one({"id": company_id})
+                company_doc = await db["companies"].find_one({"id": company_id})
                 if not company_doc:
                     return {"error": f"Company with id '{company_id}' not found"}
                 plant_ids = company_doc.get("plant_ids", [])
@@ -66,36 +89,16 @@ class ToolService:
             else:
                 return {"error": "No company or plant specified for emissions query"}
 
-            # Build query for ghg_reports (must include company_id for robust matching)
-            ghg_query = {"company_id": company_id}
-            if plant_ids:
-                ghg_query["plant_id"] = {"$in": plant_ids}
-            if financial_year:
-                ghg_query["financial_year"] = financial_year
-            if scope:
-                if isinstance(scope, str):
-                    # For a single scope, match exactly
-                    ghg_query["scope"] = {"$eq": scope}
-                elif isinstance(scope, list):
-                    # For multiple scopes, use $in
-                    ghg_query["scope"] = {"$in": scope}
-
-            ghg_reports = list(db["ghg_reports"].find(ghg_query))
-            if not ghg_reports:
+            # Sum the materialized per-report totals (must include company_id for robust matching)
+            ghg_match = totals_match(company_id, financial_year, scope, plant_ids)
+            groups = await db[GHG_TOTALS_COLLECTION].aggregate(
+                totals_by_scope_pipeline(ghg_match), maxTimeMS=MCP_TOOL_TIMEOUT_MS
+            ).to_list(length=None)
+            if not groups:
                 return {"error": "No GHG reports found for the specified criteria"}
 
-            # Sum total_scope_emissions_co2e by scope
-            total = 0.0
-            scope_totals = {}
-            for report in ghg_reports:
-                s = report.get("scope", "Unknown")
-                val = report.get("total_scope_emissions_co2e", 0.0)
-                try:
-                    val = float(val)
-                except Exception:
-                    val = 0.0
-                total += val
-                scope_totals[s] = scope_totals.get(s, 0.0) + val
+            scope_totals = scope_breakdown(groups)
+            total = sum(scope_totals.values())
 
             result = {
                 "company_id": company_id,
@@ -109,32 +112,38 @@ class ToolService:
         except Exception as e:
             logger.error(f"Error in get_total_emissions: {str(e)}")
             return {"error": f"Failed to get total emissions: {str(e)}"}
-    def _handle_count_plants(self, query_obj, user_prompt=""):
+    async def _handle_count_plants(self, query_obj, user_prompt=""):
         """Handle count_plants operation: returns the number of plants for a company."""
         try:
             # Accept company_id, company_code, or company_name
             company_id = query_obj.get("company_id")
             company_code = query_obj.get("company_code")
             company_name = query_obj.get("company_name")
-            company_query = {}
+            collection = self.db["companies"]
             if company_id:
-                company_query["_id"] = company_id
+                company_doc = await collection.find_one(company_id_filter(company_id))
             elif company_code:
-                company_query["code"] = company_code
+                company_doc = await collection.find_one({"code": company_code})
             elif company_name:
-                company_query["name"] = company_name
+                match = await resolve_name(self.db, COMPANY_NAMES, company_name)
+                if match.doc is None and match.suggestions:
+                    return name_not_found("Company", company_name, match.suggestions)
+                company_doc = match.doc
             else:
                 return {"error": "No company identifier provided for count_plants operation"}
-            collection = self.db["companies"]
-            company_doc = collection.find_one(company_query)
             if not company_doc:
                 return {"error": "Company not found"}
             plant_ids = company_doc.get("plant_ids", [])
-            return {"plant_count": len(plant_ids), "plant_ids": plant_ids, "company_id": str(company_doc.get("_id")), "company_name": company_doc.get("name")}
+            return {
+                "plant_count": len(plant_ids),
+                "plant_ids": plant_ids,
+                "company_id": company_doc.get("id") or str(company_doc.get("_id")),
+                "company_name": company_doc.get("name")
+            }
         except Exception as e:
             logger.error(f"Error counting plants: {str(e)}")
             return {"error": f"Failed to count plants: {str(e)}"}
-    def _handle_delete_plant(self, query_obj, user_prompt=""):
+    async def _handle_delete_plant(self, query_obj, user_prompt=""):
         """Handle delete_plant operation specifically"""
         try:
             plant_id = query_obj.get("plant_id")
@@ -142,41 +151,116 @@ class ToolService:
                 logger.error("No plant_id provided for delete_plant operation")
                 return {"error": "No plant_id provided for delete_plant operation"}
             collection = self.db["plants"]
-            result = collection.delete_one({"id": plant_id})
+            result = await collection.delete_one({"id": plant_id})
             logger.info(f"Delete plant result: deleted={result.deleted_count}")
             return {"deleted": result.deleted_count, "plant_id": plant_id}
         except Exception as e:
             logger.error(f"Error deleting plant: {str(e)}")
             return {"error": f"Failed to delete plant: {str(e)}"}
     def __init__(self, db=None):
-        from services.mcpServices.LLMs.Groq.DatabaseService import DatabaseService
+        from services.mcpServices.LLMs.Groq.DatabaseService import get_database_service
         if db is not None:
             self.db = db
         else:
-            db_service = DatabaseService()
-            self.db = db_service.get_db()
+            self.db = get_database_service().get_db()
 
-    def db_call(self, query_obj, user_prompt=""):
+    async def db_call(self, query_obj, user_prompt=""):
+        """Run one tool call against the Motor database, giving up after MCP_TOOL_TIMEOUT_MS"""
+        try:
+            return await asyncio.wait_for(self._execute(query_obj, user_prompt), MCP_TOOL_TIMEOUT_MS / 1000)
+        except asyncio.TimeoutError:
+            logger.error("db_call timed out after %d ms: %s", MCP_TOOL_TIMEOUT_MS, query_obj)
+            return {"error": f"Database operation timed out after {MCP_TOOL_TIMEOUT_MS} ms"}
+
+    @staticmethod
+    def _generic_request(query_obj):
+        """(collection, query, projection, operation, update) of a query that has no dedicated handler"""
+        # Support for new format: {"collection": ..., "query": {...}, "projection": {...}, "operation": ...}
+        if isinstance(query_obj, dict) and "query" in query_obj and "collection" in query_obj:
+            return (
+                query_obj.get("collection"),
+                query_obj.get("query", {}),
+                query_obj.get("projection"),
+                query_obj.get("operation"),
+                query_obj.get("update")
+            )
+        # fallback to modules if not specified
+        if isinstance(query_obj, dict):
+            return "modules", query_obj.get("query", query_obj), query_obj.get("projection"), query_obj.get("operation"), query_obj.get("update")
+        return "modules", query_obj, None, None, None
+
+    def find_spec(self, query_obj, user_prompt=""):
+        """(collection, query, projection) when db_call would run a plain find, else None"""
+        if isinstance(query_obj, dict) and (
+            query_obj.get("operation") in HANDLED_OPERATIONS
+            or (query_obj.get("collection") == "users" and query_obj.get("operation") == "create")
+        ):
+            return None
+        collection_name, query, projection, operation, update = self._generic_request(query_obj)
+        if update is not None or operation in ("insert_one", "delete_one", "delete", "count"):
+            return None
+        if user_prompt and "count" in user_prompt.lower():
+            return None
+        return collection_name, query, projection
+
+    def _find_cursor(self, collection_name, query, projection):
+        if projection:
+            cursor = self.db[collection_name].find(query, projection)
+        else:
+            cursor = self.db[collection_name].find(query)
+        return cursor.max_time_ms(MCP_TOOL_TIMEOUT_MS)
+
+    @staticmethod
+    def _format_document(doc):
+        # Convert ObjectId and datetime fields to string/isoformat
+        if "id" in doc:
+            doc["id"] = str(doc.get("id", ""))
+        if "created_at" in doc and doc["created_at"]:
+            doc["created_at"] = doc["created_at"].isoformat()
+        if "updated_at" in doc and doc["updated_at"]:
+            doc["updated_at"] = doc["updated_at"].isoformat()
+        return doc
+
+    async def iter_find_pages(self, collection_name, query, projection=None, page_size=MCP_TOOL_PAGE_SIZE):
+        """
+        Yield the documents of a find page by page, up to
+        MCP_TOOL_STREAM_MAX_RESULTS in all; each page must arrive within
+        MCP_TOOL_TIMEOUT_MS.
+        """
+        print_debug_query(query, "", projection, collection_name, "find (streamed)")
+        cursor = self._find_cursor(collection_name, query, projection).limit(MCP_TOOL_STREAM_MAX_RESULTS).batch_size(page_size)
+        try:
+            while True:
+                page = await asyncio.wait_for(cursor.to_list(length=page_size), MCP_TOOL_TIMEOUT_MS / 1000)
+                if not page:
+                    break
+                yield [self._format_document(doc) for doc in page]
+                if len(page) < page_size:
+                    break
+        finally:
+            await cursor.close()
+
+    async def _execute(self, query_obj, user_prompt=""):
         try:
             # Handle create_employee operation specially
             if isinstance(query_obj, dict) and query_obj.get("operation") == "create_employee":
-                return self._handle_create_employee(query_obj, user_prompt)
+                return await self._handle_create_employee(query_obj, user_prompt)
 
             # Handle create_plant operation specially
             if isinstance(query_obj, dict) and query_obj.get("operation") == "create_plant":
-                return self._handle_create_plant(query_obj, user_prompt)
+                return await self._handle_create_plant(query_obj, user_prompt)
 
             # Handle delete_plant operation specially
             if isinstance(query_obj, dict) and query_obj.get("operation") == "delete_plant":
-                return self._handle_delete_plant(query_obj, user_prompt)
+                return await self._handle_delete_plant(query_obj, user_prompt)
 
             # Handle count_plants operation specially
             if isinstance(query_obj, dict) and query_obj.get("operation") == "count_plants":
-                return self._handle_count_plants(query_obj, user_prompt)
+                return await self._handle_count_plants(query_obj, user_prompt)
 
             # Handle get_total_emissions operation
             if isinstance(query_obj, dict) and query_obj.get("operation") == "get_total_emissions":
-                return self._handle_get_total_emissions(query_obj, user_prompt)
+                return await self._handle_get_total_emissions(query_obj, user_prompt)
             
             # Handle the case where LLM uses "create" operation on "users" collection (employee creation)
             if (isinstance(query_obj, dict) and 
@@ -194,22 +278,9 @@ class ToolService:
                     "employee": employee_data
                 }
                 logger.info(f"Converting LLM 'create' operation to 'create_employee': {converted_query}")
-                return self._handle_create_employee(converted_query, user_prompt)
+                return await self._handle_create_employee(converted_query, user_prompt)
             
-            # Support for new format: {"collection": ..., "query": {...}, "projection": {...}, "operation": ...}
-            if isinstance(query_obj, dict) and "query" in query_obj and "collection" in query_obj:
-                collection_name = query_obj.get("collection")
-                query = query_obj.get("query", {})
-                projection = query_obj.get("projection")
-                operation = query_obj.get("operation")
-                update = query_obj.get("update")
-            else:
-                # fallback to modules if not specified
-                collection_name = "modules"
-                query = query_obj.get("query", query_obj) if isinstance(query_obj, dict) else query_obj
-                projection = query_obj.get("projection") if isinstance(query_obj, dict) else None
-                operation = query_obj.get("operation") if isinstance(query_obj, dict) else None
-                update = query_obj.get("update") if isinstance(query_obj, dict) else None
+            collection_name, query, projection, operation, update = self._generic_request(query_obj)
             collection = self.db[collection_name]
             print_debug_query(query, user_prompt, projection, collection_name, operation)
 
@@ -235,8 +306,12 @@ class ToolService:
                     return val
                 update_doc = replace_datetime(update_doc)
                 logger.info(f"Running update_one: filter={query}, update={update_doc}")
-                result = collection.update_one(query, update_doc)
+                ghg_company = await self._ghg_report_company(collection_name, query)
+                result = await collection.update_one(query, update_doc)
                 logger.info(f"Update result: matched={result.matched_count}, modified={result.modified_count}")
+                if result.modified_count:
+                    moved_to = update_doc.get("$set", {}).get("company_id") if isinstance(update_doc, dict) else None
+                    await self._refresh_ghg_totals(collection_name, ghg_company, moved_to)
                 return {"matched": result.matched_count, "modified": result.modified_count}
 
             # If this is an insert_one operation (employee creation)
@@ -246,8 +321,9 @@ class ToolService:
                     logger.error("No document provided for insert_one operation.")
                     return {"error": "No document provided for insert_one operation."}
                 logger.info(f"Running insert_one: document={document}")
-                result = collection.insert_one(document)
+                result = await collection.insert_one(document)
                 logger.info(f"Insert result: inserted_id={result.inserted_id}")
+                await self._refresh_ghg_totals(collection_name, document.get("company_id") if isinstance(document, dict) else None)
                 return {"inserted_id": str(result.inserted_id)}
 
             # If this is a delete_one operation (robust to LLM mistakes)
@@ -255,35 +331,57 @@ class ToolService:
                 if operation == "delete":
                     logger.warning("Received 'delete' operation from LLM, expected 'delete_one'. Proceeding with delete_one for robustness.")
                 logger.info(f"Running delete_one: filter={query}")
-                result = collection.delete_one(query)
+                ghg_company = await self._ghg_report_company(collection_name, query)
+                result = await collection.delete_one(query)
                 logger.info(f"Delete result: deleted={result.deleted_count}")
+                if result.deleted_count:
+                    await self._refresh_ghg_totals(collection_name, ghg_company)
                 return {"deleted": result.deleted_count}
 
             # For count queries
             if operation == "count" or (user_prompt and "count" in user_prompt.lower()):
-                count = collection.count_documents(query)
+                count = await collection.count_documents(query, maxTimeMS=MCP_TOOL_TIMEOUT_MS)
                 return {"count": count}
-            # For fetching documents
-            if projection:
-                docs = collection.find(query, projection)
-            else:
-                docs = collection.find(query)
-            docs_list = list(docs)
-            # Convert ObjectId and datetime fields to string/isoformat
-            for doc in docs_list:
-                if "id" in doc:
-                    doc["id"] = str(doc.get("id", ""))
-                if "created_at" in doc and doc["created_at"]:
-                    doc["created_at"] = doc["created_at"].isoformat()
-                if "updated_at" in doc and doc["updated_at"]:
-                    doc["updated_at"] = doc["updated_at"].isoformat()
-            logger.info("Database query result: %s", docs_list)
+            # For fetching documents; one extra is read to tell whether the result was cut off
+            cursor = self._find_cursor(collection_name, query, projection).limit(MCP_TOOL_MAX_RESULTS + 1)
+            docs_list = [self._format_document(doc) for doc in await cursor.to_list(length=None)]
+            if len(docs_list) > MCP_TOOL_MAX_RESULTS:
+                logger.warning("Find on %s matched more than %d documents, truncating", collection_name, MCP_TOOL_MAX_RESULTS)
+                return {
+                    "documents": docs_list[:MCP_TOOL_MAX_RESULTS],
+                    "truncated": True,
+                    "message": f"Showing the first {MCP_TOOL_MAX_RESULTS} matches; send the request with stream=true for all of them"
+                }
+            logger.info("Database query returned %d documents", len(docs_list))
             return docs_list
         except Exception as e:
             logger.error("Error executing db_call: %s", e)
             return f"Failed to execute query: {str(e)}"
 
-    def _handle_create_employee(self, query_obj, user_prompt=""):
+    async def _ghg_report_company(self, collection_name, query):
+        """Company of the ghg_reports document a write is about to touch, read before the write changes it"""
+        if collection_name != GHG_REPORTS_COLLECTION:
+            return None
+        doc = await self.db[collection_name].find_one(query, {"company_id": 1}, max_time_ms=MCP_TOOL_TIMEOUT_MS)
+        return doc.get("company_id") if doc else None
+
+    async def _refresh_ghg_totals(self, collection_name, *company_ids):
+        """
+        Recompute the ghg_totals view of the given companies after a generic
+        write to ghg_reports. Never rebuilds the whole view inside a chat
+        request: a write whose company is unknown is only logged.
+        """
+        if collection_name != GHG_REPORTS_COLLECTION:
+            return
+        company_ids = {company_id for company_id in company_ids if isinstance(company_id, str) and company_id}
+        if not company_ids:
+            logger.warning("ghg_reports write without a company_id, ghg_totals not refreshed; run GHGService.rebuild_totals")
+            return
+        ghg_service = GHGService(self.db)
+        for company_id in sorted(company_ids):
+            await ghg_service.rebuild_totals(company_id)
+
+    async def _handle_create_employee(self, query_obj, user_prompt=""):
         """Handle create_employee operation specifically"""
         try:
             import datetime
@@ -307,7 +405,7 @@ class ToolService:
             
             # Check if email already exists
             collection = self.db["users"]
-            existing_user = collection.find_one({"email": employee_data["email"]})
+            existing_user = await collection.find_one({"email": employee_data["email"]})
             if existing_user:
                 logger.error(f"Email {employee_data['email']} already exists")
                 return {"error": f"Email {employee_data['email']} already registered"}
@@ -318,7 +416,8 @@ class ToolService:
                 "email": employee_data["email"],
                 "full_name": employee_data["full_name"],
                 "role": employee_data["role"],
-                "hashed_password": get_password_hash(employee_data["password"]),
+                # Password hashing is deliberately slow; keep it off the event loop
+                "hashed_password": await asyncio.to_thread(get_password_hash, employee_data["password"]),
                 "is_active": True,
                 "access_modules": [],
                 "created_at": datetime.datetime.utcnow(),
@@ -337,7 +436,7 @@ class ToolService:
             
             # Insert the user
             logger.info(f"Creating employee with document: {user_doc}")
-            result = collection.insert_one(user_doc)
+            result = await collection.insert_one(user_doc)
             
             logger.info(f"Employee created successfully with ID: {result.inserted_id}")
             return {
@@ -353,7 +452,7 @@ class ToolService:
             logger.error(f"Error creating employee: {str(e)}")
             return {"error": f"Failed to create employee: {str(e)}"}
     
-    def _handle_create_plant(self, query_obj, user_prompt=""):
+    async def _handle_create_plant(self, query_obj, user_prompt=""):
         """Handle create_plant operation specifically"""
         try:
             import datetime
@@ -375,7 +474,7 @@ class ToolService:
                 return {"error": "Reserved plant codes (C001, P001) cannot be used"}
             # Check for duplicate code
             collection = self.db["plants"]
-            if collection.find_one({"plant_code": plant_data["code"]}):
+            if await collection.find_one({"plant_code": plant_data["code"]}):
                 logger.error(f"Plant code {plant_data['code']} already exists")
                 return {"error": f"Plant code {plant_data['code']} already exists"}
             now = datetime.datetime.utcnow()
@@ -394,7 +493,8 @@ class ToolService:
                 "updated_at": now
             }
             # Insert plant
-            collection.insert_one(plant_doc)
+            await collection.insert_one(with_name_key(PLANT_NAMES, plant_doc))
+            invalidate_name_index(PLANT_NAMES)
             # Insert environment report
             env_report = {
                 "id": str(uuid.uuid4()),
@@ -408,9 +508,9 @@ class ToolService:
                 "updatedAt": now,
                 "version": 1
             }
-            self.db["environment"].insert_one(env_report)
+            await self.db["environment"].insert_one(env_report)
             # Update company's plant_ids
-            self.db["companies"].update_one(
+            await self.db["companies"].update_one(
                 {"_id": plant_data["company_id"]},
                 {"$push": {"plant_ids": plant_id}, "$set": {"updated_at": now}}
             )
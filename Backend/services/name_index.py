@@ -0,0 +1,157 @@
+"""
+Lookup of companies and plants by the name a user typed.
+
+Names are compared in normalized form: case-folded, accents stripped,
+letters and digits only (in any script), so "ACME Ltd." and "acme ltd" are
+the same company, and so are "Société" and "societe". CompanyService and
+PlantService store that form next to the name (normalized_name on
+companies, normalized_plant_name on plants) and both fields are indexed,
+so an exact lookup is a single index seek. Names the user only typed the
+start of are matched against an in-process sorted index of the normalized
+names, searched by bisection; it is rebuilt after NAME_INDEX_TTL seconds or
+as soon as this process creates or renames a company or plant.
+"""
+import os
+import time
+import unicodedata
+import logging
+from bisect import bisect_left
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+NAME_INDEX_TTL = float(os.getenv("NAME_INDEX_TTL", "300"))  # Seconds
+# Candidates listed back to the user when a partial name is ambiguous
+MAX_SUGGESTIONS = 5
+BACKFILL_BATCH = 500
+
+
+def normalize_name(name: Optional[str]) -> str:
+    if not name:
+        return ''
+    # NFKD splits accents off their letters as combining marks, which are not alphanumeric
+    return ''.join(char for char in unicodedata.normalize('NFKD', name).casefold() if char.isalnum())
+
+
+class NameField(NamedTuple):
+    collection: str
+    name_field: str  # Field holding the display name
+    key_field: str  # Field holding its normalized form
+    scope_field: Optional[str]  # Field a lookup can be narrowed by, e.g. the plant's company
+
+
+COMPANY_NAMES = NameField("companies", "name", "normalized_name", None)
+PLANT_NAMES = NameField("plants", "plant_name", "normalized_plant_name", "company_id")
+
+
+def with_name_key(names: NameField, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Set a document's normalized name field from its name, for inserts and $set updates"""
+    if doc.get(names.name_field) is not None:
+        doc[names.key_field] = normalize_name(doc[names.name_field])
+    return doc
+
+
+class PrefixIndex:
+    """Sorted normalized names; the names starting with a prefix are found by bisection"""
+
+    def __init__(self, entries: List[Tuple[str, Dict[str, Any]]]):
+        entries = sorted(entries, key=lambda entry: entry[0])
+        self._keys = [key for key, _ in entries]
+        self._docs = [doc for _, doc in entries]
+        self.built_at = time.monotonic()
+
+    def starting_with(self, prefix: str, scope: Optional[Tuple[str, Any]] = None) -> List[Dict[str, Any]]:
+        matches = []
+        for i in range(bisect_left(self._keys, prefix), len(self._keys)):
+            if not self._keys[i].startswith(prefix):
+                break
+            doc = self._docs[i]
+            if scope is None or doc.get(scope[0]) == scope[1]:
+                matches.append(doc)
+        return matches
+
+
+class NameMatch(NamedTuple):
+    doc: Optional[Dict[str, Any]]  # The matching document, if exactly one matched
+    suggestions: List[str]  # Names of the candidates when a partial name was ambiguous
+
+
+_prefix_indexes: Dict[Tuple[str, str], PrefixIndex] = {}
+
+
+def invalidate_name_index(names: NameField):
+    """Drop the cached prefix index of a collection after one of its names changed"""
+    for key in [key for key in _prefix_indexes if key[1] == names.collection]:
+        del _prefix_indexes[key]
+
+
+async def _prefix_index(db, names: NameField) -> PrefixIndex:
+    cache_key = (db.name, names.collection)
+    index = _prefix_indexes.get(cache_key)
+    if index is None or time.monotonic() - index.built_at > NAME_INDEX_TTL:
+        projection = {"_id": 1, "id": 1, names.name_field: 1, names.key_field: 1}
+        if names.scope_field:
+            projection[names.scope_field] = 1
+        docs = await db[names.collection].find({}, projection).to_list(length=None)
+        entries = [(doc.get(names.key_field) or normalize_name(doc.get(names.name_field)), doc) for doc in docs]
+        # Names without a letter or digit can never be looked up
+        index = PrefixIndex([(key, doc) for key, doc in entries if key])
+        _prefix_indexes[cache_key] = index
+    return index
+
+
+async def resolve_name(db, names: NameField, name: str, scope_value: Any = None) -> NameMatch:
+    """
+    Find the company or plant a user means by name: an exact normalized match
+    if there is one, otherwise the only name starting with what they typed.
+    scope_value narrows plants to one company.
+    """
+    key = normalize_name(name)
+    if not key:
+        return NameMatch(None, [])
+    query = {names.key_field: key}
+    scope = None
+    if names.scope_field and scope_value is not None:
+        query[names.scope_field] = scope_value
+        scope = (names.scope_field, scope_value)
+    doc = await db[names.collection].find_one(query)
+    if doc is not None:
+        return NameMatch(doc, [])
+
+    candidates = (await _prefix_index(db, names)).starting_with(key, scope)
+    if len(candidates) == 1:
+        # The prefix index holds a projection; return the whole document like the exact match
+        return NameMatch(await db[names.collection].find_one({"_id": candidates[0]["_id"]}), [])
+    return NameMatch(None, [candidate.get(names.name_field) for candidate in candidates[:MAX_SUGGESTIONS]])
+
+
+async def ensure_name_keys(db):
+    """
+    Index the normalized name fields and fill them in on documents written
+    before they existed or normalized differently at the time
+    """
+    for names in (COMPANY_NAMES, PLANT_NAMES):
+        keys = [(names.key_field, 1)] + ([(names.scope_field, 1)] if names.scope_field else [])
+        await db[names.collection].create_index(keys)
+        named = db[names.collection].find(
+            {names.name_field: {"$exists": True}},
+            {names.name_field: 1, names.key_field: 1}
+        )
+        batch = []
+        updated = 0
+        async for doc in named:
+            key = normalize_name(doc[names.name_field])
+            if doc.get(names.key_field) == key:
+                continue
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {names.key_field: key}}))
+            if len(batch) >= BACKFILL_BATCH:
+                await db[names.collection].bulk_write(batch, ordered=False)
+                updated += len(batch)
+                batch = []
+        if batch:
+            await db[names.collection].bulk_write(batch, ordered=False)
+            updated += len(batch)
+        if updated:
+            logger.info(f"Backfilled {names.key_field} on {updated} {names.collection}")
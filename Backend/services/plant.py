@@ -6,6 +6,7 @@ from datetime import datetime
 from fastapi import HTTPException, status
 import uuid
 from bson import ObjectId
+from services.name_index import PLANT_NAMES, invalidate_name_index, with_name_key
 
 class PlantService:
     def __init__(self, db: AsyncIOMotorDatabase):  # type: ignore
@@ -67,7 +68,8 @@ class PlantService:
             plant_dict["access_level"] = list(set(calc_modules))
 
         # Insert plant and update company
-        await self.db.plants.insert_one(plant_dict)
+        await self.db.plants.insert_one(with_name_key(PLANT_NAMES, plant_dict))
+        invalidate_name_index(PLANT_NAMES)
         await self.db.companies.update_one(
             {"_id": plant_data.company_id},
             {
@@ -129,6 +131,10 @@ class PlantService:
         update_data = plant_data.model_dump(exclude_unset=True)
         if update_data:
             update_data["updated_at"] = datetime.utcnow()
+            if update_data.get("name") is not None:
+                # Plants store their name as plant_name
+                update_data["plant_name"] = update_data["name"]
+                with_name_key(PLANT_NAMES, update_data)
             result = await self.db.plants.update_one(
                 {"_id": plant_id},
                 {"$set": update_data}
@@ -138,6 +144,8 @@ class PlantService:
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Plant not found"
                 )
+            if "plant_name" in update_data:
+                invalidate_name_index(PLANT_NAMES)
 
         plant = await self.db.plants.find_one({"_id": plant_id})
         return Plant(**plant)
@@ -359,4 +367,4 @@ class PlantService:
             "company_id": company_id,
             "plant_id": plant_id
         })
-        return result.deleted_count > 0
\ No newline at end of file
+        return result.deleted_count > 0
\ No newline at end of file
@@ -0,0 +1,137 @@
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, NamedTuple, Optional, Tuple
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+MODULE_DATA_PATH = os.path.join(
+    os.path.dirname(__file__),
+    "..",
+    "..",
+    "Frontend",
+    "BRSR",
+    "Environment",
+    "data",
+    "moduleData.json"
+)
+
+
+def is_total_row(row_metadata: Mapping[str, Any]) -> bool:
+    """Total rows sum the rows above them until the previous total"""
+    return "total" in row_metadata.get("parameter", "").lower()
+
+
+def should_aggregate_row(row_metadata: Mapping[str, Any]) -> bool:
+    """Determine if a row should be aggregated based on its metadata"""
+    # Don't aggregate header rows
+    if row_metadata.get("isHeader"):
+        return False
+
+    # Don't aggregate rows that are marked as totals (containing "Total" in parameter)
+    if is_total_row(row_metadata):
+        return False
+
+    # Don't aggregate intensity metrics (containing "intensity" in parameter)
+    if "intensity" in row_metadata.get("parameter", "").lower():
+        return False
+
+    return True
+
+
+def _freeze(value: Any) -> Any:
+    """Recursively turn dicts and lists into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class QuestionEntry(NamedTuple):
+    """Read-only metadata for one question, with per-row flags precomputed"""
+    question_id: str
+    type: Optional[str]
+    metadata: Mapping[str, Any]
+    rows: Tuple[Mapping[str, Any], ...]
+    columns: Tuple[Mapping[str, Any], ...]
+    aggregate_rows: Tuple[bool, ...]
+    total_rows: Tuple[bool, ...]
+
+
+class QuestionIndex:
+    """Immutable id -> QuestionEntry lookup built from one read of moduleData.json"""
+
+    def __init__(self, entries: Dict[str, QuestionEntry], mtime: Optional[int] = None):
+        self._entries = MappingProxyType(dict(entries))
+        self.mtime = mtime
+
+    @classmethod
+    def from_module_data(cls, module_data: Dict[str, Any], mtime: Optional[int] = None) -> "QuestionIndex":
+        entries = {}
+        for submodule in module_data.get("submodules", []):
+            for category in submodule.get("categories", []):
+                for question in category.get("questions", []):
+                    question_id = question.get("id")
+                    if not question_id:
+                        continue
+                    metadata = _freeze(question.get("metadata") or {})
+                    rows = metadata.get("rows", ())
+                    entries[question_id] = QuestionEntry(
+                        question_id=question_id,
+                        type=metadata.get("type"),
+                        metadata=metadata,
+                        rows=rows,
+                        columns=metadata.get("columns", ()),
+                        aggregate_rows=tuple(should_aggregate_row(row) for row in rows),
+                        total_rows=tuple(is_total_row(row) for row in rows)
+                    )
+        return cls(entries, mtime)
+
+    def get(self, question_id: str) -> Optional[QuestionEntry]:
+        return self._entries.get(question_id)
+
+    def __contains__(self, question_id: str) -> bool:
+        return question_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_index: Optional[QuestionIndex] = None
+_index_lock = threading.Lock()
+
+
+def _build_index(path: str, mtime: Optional[int]) -> QuestionIndex:
+    try:
+        with open(path, 'r') as f:
+            module_data = json.load(f)
+        index = QuestionIndex.from_module_data(module_data, mtime)
+        logger.info(f"Indexed {len(index)} questions from moduleData.json")
+        return index
+    except Exception as e:
+        logger.error(f"Error loading moduleData.json: {str(e)}")
+        return QuestionIndex({}, mtime)
+
+
+def get_question_index(path: str = MODULE_DATA_PATH) -> QuestionIndex:
+    """
+    Return the process-wide question index, rebuilding it only when
+    moduleData.json's modification time has changed since it was built.
+    """
+    global _index
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    index = _index
+    if index is not None and index.mtime == mtime:
+        return index
+
+    with _index_lock:
+        if _index is None or _index.mtime != mtime:
+            _index = _build_index(path, mtime)
+        return _index
@@ -0,0 +1,138 @@
+"""
+Vectorized arithmetic for table-question roll-ups.
+
+Plant tables are parsed once into a (plants x rows x year-columns) float array
+with a validity mask; sums, section totals and row exclusions are array
+operations, and values are formatted back to strings only at the end.
+"""
+from typing import Any, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import numpy as np
+
+# Year columns summed across plants for table questions
+YEAR_KEYS = ("current_year", "previous_year")
+
+
+def parse_number(value: Any) -> float:
+    """Parse a whole cell as a number ("1,234.5"); NaN when it is not one"""
+    if value is None or value == "":
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", ""))
+    except ValueError:
+        return np.nan
+
+
+def parse_number_and_unit(value: Any) -> Tuple[float, str]:
+    """Parse a cell like '10 joule' or '10' into (10.0, 'joule'); (NaN, '') when it has no leading number"""
+    if isinstance(value, (int, float)):
+        return float(value), ""
+    parts = str(value).split(None, 1) if value is not None else []
+    number = parse_number(parts[0]) if parts else np.nan
+    return number, parts[1].rstrip() if len(parts) > 1 and not np.isnan(number) else ""
+
+
+class TableArray(NamedTuple):
+    values: np.ndarray  # (plants, rows, years) float64, 0 where the cell is not a number
+    mask: np.ndarray  # (plants, rows, years) bool, True where the cell held a number
+    units: Optional[np.ndarray] = None  # (plants, rows, years) object, only when parsed with units
+
+
+def _unwrap(table: Any) -> Any:
+    if isinstance(table, dict) and isinstance(table.get("updatedData"), list):
+        return table["updatedData"]
+    return table
+
+
+def _cells(tables: Sequence[Any], row_count: int, keys: Sequence[str]) -> Iterator[Any]:
+    """Every cell of every table in (plant, row, year) order; None for missing cells"""
+    for table in tables:
+        table = _unwrap(table)
+        rows = table[:row_count] if isinstance(table, list) else []
+        for row in rows:
+            if isinstance(row, dict):
+                for key in keys:
+                    yield row.get(key)
+            else:
+                yield from [None] * len(keys)
+        yield from [None] * ((row_count - len(rows)) * len(keys))
+
+
+def to_array(
+    tables: Sequence[Any],
+    row_count: int,
+    with_units: bool = False,
+    keys: Sequence[str] = YEAR_KEYS
+) -> TableArray:
+    """
+    Parse plant tables (lists of row dicts) into a TableArray of shape
+    (len(tables), row_count, len(keys)). Rows beyond row_count are ignored,
+    missing rows and anything that is not a list count as empty. With
+    with_units, a cell's number is its first word and the rest its unit.
+    """
+    shape = (len(tables), row_count, len(keys))
+    count = shape[0] * shape[1] * shape[2]
+    cells = _cells(tables, row_count, keys)
+    units = None
+    if with_units:
+        parsed = [parse_number_and_unit(cell) for cell in cells]
+        values = np.fromiter((number for number, _ in parsed), dtype=np.float64, count=count).reshape(shape)
+        units = np.array([unit for _, unit in parsed], dtype=object).reshape(shape)
+    else:
+        values = np.fromiter(map(parse_number, cells), dtype=np.float64, count=count).reshape(shape)
+    mask = ~np.isnan(values)
+    return TableArray(np.where(mask, values, 0.0), mask, units)
+
+
+def sum_plants(table: TableArray, aggregate_rows: Optional[Sequence[bool]] = None) -> np.ndarray:
+    """Sum across plants -> (rows, years); rows not flagged in aggregate_rows are zeroed"""
+    sums = table.values.sum(axis=0)
+    if aggregate_rows is not None:
+        sums = sums * np.asarray(aggregate_rows, dtype=bool)[:, None]
+    return sums
+
+
+def first_units(table: TableArray) -> np.ndarray:
+    """First non-empty unit per cell across plants, in plant order -> (rows, years)"""
+    first = (table.units != "").argmax(axis=0)
+    return np.take_along_axis(table.units, first[None], axis=0)[0]
+
+
+def section_totals(sums: np.ndarray, total_rows: Sequence[bool]) -> np.ndarray:
+    """
+    Fill total rows with the sum of the rows above them until the previous
+    total row. Non-total rows are returned unchanged.
+    """
+    total_rows = np.asarray(total_rows, dtype=bool)
+    totals_at = np.flatnonzero(total_rows)
+    if not totals_at.size:
+        return sums
+
+    body = np.where(total_rows[:, None], 0.0, sums)
+    running = np.vstack([np.zeros((1, sums.shape[1])), np.cumsum(body, axis=0)])
+    starts = np.concatenate([[0], totals_at[:-1] + 1])
+
+    result = sums.copy()
+    result[totals_at] = running[totals_at] - running[starts]
+    return result
+
+
+def format_table(
+    sums: np.ndarray,
+    units: Optional[np.ndarray] = None,
+    blank_rows: Optional[Sequence[bool]] = None,
+    keys: Sequence[str] = YEAR_KEYS
+) -> List[dict]:
+    """Format a (rows, years) array as table rows of "%.2f" strings, with optional units; blank rows get "0" """
+    formatted = []
+    for i, row in enumerate(sums.tolist()):
+        if blank_rows is not None and blank_rows[i]:
+            formatted.append({key: "0" for key in keys})
+            continue
+        cells = {}
+        for j, key in enumerate(keys):
+            unit = units[i, j] if units is not None else ""
+            cells[key] = f"{row[j]:.2f} {unit}".strip()
+        formatted.append(cells)
+    return formatted
@@ -28,7 +28,7 @@ async def test_employee_creation():
         print(f"\n2️⃣ Testing ToolService with Groq response...")
         
         tool_service = ToolService()
-        tool_response = tool_service.db_call(groq_response["response"], test_prompt)
+        tool_response = await tool_service.db_call(groq_response["response"], test_prompt)
         
         print(f"✅ Tool Response: {json.dumps(tool_response, indent=2)}")
         
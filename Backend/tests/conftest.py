@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import the app's packages the way main.py does, from Backend/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# services/auth.py refuses to import without a signing key
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
@@ -0,0 +1,111 @@
+"""The aggregation queue coalesces edits per question and repairs failed roll-ups."""
+import asyncio
+
+from mongomock_motor import AsyncMongoMockClient
+
+from services.aggregation_queue import ROLLUP, UNIT_SUM, AggregationQueue
+
+COMPANY_ID = "company-1"
+FY = "2024-2025"
+
+
+class RecordingService:
+    """Stands in for AggregationService, recording every roll-up it is asked for"""
+
+    def __init__(self, fail_incremental=False, fail_rebuild=False):
+        self.calls = []
+        self.discarded = []
+        self.fail_incremental = fail_incremental
+        self.fail_rebuild = fail_rebuild
+
+    async def aggregate_answers(self, **kwargs):
+        self.calls.append((ROLLUP, kwargs))
+        if kwargs["incremental"] and self.fail_incremental:
+            raise RuntimeError("delta failed")
+        if not kwargs["incremental"] and self.fail_rebuild:
+            raise RuntimeError("rebuild failed")
+
+    async def aggregate_table_units(self, **kwargs):
+        self.calls.append((UNIT_SUM, kwargs))
+
+    async def discard_table_rollup(self, company_id, financial_year, question_id):
+        self.discarded.append((company_id, financial_year, question_id))
+
+
+def make_queue(service):
+    queue = AggregationQueue(AsyncMongoMockClient()["queue_test"])
+    queue.aggregation_service = service
+    return queue
+
+
+def submit(queue, plant_id, previous, current, question_id="Q1", **kwargs):
+    queue.submit(
+        company_id=COMPANY_ID, financial_year=FY, question_id=question_id, question_title="Title",
+        answer_data=current, source_plant_id=plant_id, previous_data=previous, **kwargs
+    )
+
+
+def test_edits_of_one_plant_collapse_into_one_net_delta():
+    service = RecordingService()
+    queue = make_queue(service)
+    submit(queue, "p001", "1", "2", incremental=True)
+    submit(queue, "p001", "2", "3", incremental=True)
+    submit(queue, "p001", "3", "5", incremental=True)
+    asyncio.run(queue.flush())
+
+    assert len(service.calls) == 1
+    kind, call = service.calls[0]
+    assert kind == ROLLUP
+    assert (call["previous_data"], call["answer_data"], call["incremental"]) == ("1", "5", True)
+    status = queue.status()
+    assert (status["submitted"], status["coalesced"], status["processed"], status["depth"]) == (3, 2, 1, 0)
+
+
+def test_plants_apply_in_last_write_order_and_questions_separately():
+    service = RecordingService()
+    queue = make_queue(service)
+    submit(queue, "p001", "0", "1", incremental=True)
+    submit(queue, "p002", "0", "2", incremental=True)
+    submit(queue, "p001", "1", "3", incremental=True)
+    submit(queue, "p001", "0", "9", question_id="Q2", incremental=True)
+    asyncio.run(queue.flush())
+
+    q1 = [(call["source_plant_id"], call["answer_data"]) for _, call in service.calls if call["question_id"] == "Q1"]
+    assert q1 == [("p002", "2"), ("p001", "3")]
+    assert [call["answer_data"] for _, call in service.calls if call["question_id"] == "Q2"] == ["9"]
+
+
+def test_a_non_incremental_edit_or_a_kind_change_forces_a_full_rollup():
+    service = RecordingService()
+    queue = make_queue(service)
+    submit(queue, "p001", "1", "2", incremental=True)
+    submit(queue, "p001", "2", "3", incremental=False)
+    submit(queue, "p002", "1", "2", incremental=True)
+    submit(queue, "p002", None, None, kind=UNIT_SUM)
+    asyncio.run(queue.flush())
+
+    assert [(kind, call["source_plant_id"]) for kind, call in service.calls] == [(ROLLUP, "p001"), (UNIT_SUM, "p002")]
+    assert service.calls[0][1]["incremental"] is False
+
+
+def test_a_failed_delta_is_repaired_by_a_full_rollup():
+    service = RecordingService(fail_incremental=True)
+    queue = make_queue(service)
+    submit(queue, "p001", "1", "2", incremental=True)
+    asyncio.run(queue.flush())
+
+    assert [call["incremental"] for _, call in service.calls] == [True, False]
+    assert service.discarded == []
+    status = queue.status()
+    assert (status["processed"], status["repaired"], status["failed"]) == (0, 1, 0)
+
+
+def test_a_failed_repair_discards_the_rollup_shadow():
+    service = RecordingService(fail_incremental=True, fail_rebuild=True)
+    queue = make_queue(service)
+    submit(queue, "p001", "1", "2", incremental=True)
+    asyncio.run(queue.flush())
+
+    assert service.discarded == [(COMPANY_ID, FY, "Q1")]
+    status = queue.status()
+    assert (status["repaired"], status["failed"]) == (0, 1)
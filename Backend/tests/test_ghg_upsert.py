@@ -0,0 +1,82 @@
+"""Concurrent GHG report upserts merge instead of overwriting each other, and keep ghg_totals in step."""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+from models.ghgModel import GHGCategory, GHGReport, GHGSubcategory
+from services import ghgService
+from services.ghgService import GHGService
+
+COMPANY_ID = "company-1"
+FY = "2024-2025"
+
+
+def report(*subcategories):
+    return GHGReport(
+        company_id=COMPANY_ID, plant_id="p001", financial_year=FY, scope="Scope 1",
+        categories=[GHGCategory(category_name="Fuel", subcategories=[
+            GHGSubcategory(subcategory_name=name, emissions_co2e=co2e) for name, co2e in subcategories
+        ])]
+    )
+
+
+async def stored(service):
+    doc = await service.collection.find_one({"company_id": COMPANY_ID})
+    subcategories = {
+        subcategory["subcategory_name"]: subcategory["emissions_co2e"]
+        for subcategory in doc["categories"][0]["subcategories"]
+    }
+    totals = await service.totals.find_one({"company_id": COMPANY_ID})
+    return doc, subcategories, totals
+
+
+def test_a_write_that_lost_the_race_is_merged_into_the_newer_report():
+    service = GHGService(AsyncMongoMockClient()["ghg_test"])
+    read_report = service.collection.find_one
+    raced = []
+
+    async def find_one_then_race(*args, **kwargs):
+        doc = await read_report(*args, **kwargs)
+        if doc is not None and not raced:
+            # Another request updates the report between this read and its write
+            raced.append(True)
+            await service.upsert_report(report(("Petrol", 5.0)))
+        return doc
+
+    async def scenario():
+        await service.upsert_report(report(("Diesel", 10.0)))
+        service.collection.find_one = find_one_then_race
+        await service.upsert_report(report(("Diesel", 12.0)))
+        return await stored(service)
+
+    doc, subcategories, totals = asyncio.run(scenario())
+    assert subcategories == {"Diesel": 12.0, "Petrol": 5.0}
+    assert doc["categories"][0]["total_category_emissions_co2e"] == 17.0
+    assert doc["total_scope_emissions_co2e"] == 17.0
+    assert doc["version"] == 3
+    assert totals["total_co2e"] == 17.0
+
+
+def test_an_upsert_that_keeps_losing_the_race_gives_up_with_409(monkeypatch):
+    monkeypatch.setattr(ghgService, "MAX_UPSERT_ATTEMPTS", 3)
+    service = GHGService(AsyncMongoMockClient()["ghg_test"])
+    read_report = service.collection.find_one
+    attempts = []
+
+    async def find_one_then_bump(*args, **kwargs):
+        doc = await read_report(*args, **kwargs)
+        attempts.append(True)
+        await service.collection.update_one({"_id": doc["_id"]}, {"$inc": {"version": 1}})
+        return doc
+
+    async def scenario():
+        await service.upsert_report(report(("Diesel", 10.0)))
+        service.collection.find_one = find_one_then_bump
+        await service.upsert_report(report(("Diesel", 12.0)))
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(scenario())
+    assert error.value.status_code == 409
+    assert len(attempts) == 3
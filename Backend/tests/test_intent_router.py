@@ -0,0 +1,55 @@
+"""Templated chat questions are routed to their ToolService operation; anything else goes to the LLM."""
+import pytest
+
+from services.mcpServices.LLMs.Groq import IntentRouter
+from services.mcpServices.LLMs.Groq.IntentRouter import route_message
+
+COMPANY_ID = "3f2b8c1e-9a4d-4e6f-8b7a-1c2d3e4f5a6b"
+
+
+@pytest.mark.parametrize("message, query", [
+    ("How many plants does Acme Steel have?", {"operation": "count_plants", "company_name": "Acme Steel"}),
+    ("how many plants are in the Tata Power", {"operation": "count_plants", "company_name": "Tata Power"}),
+    ("What is the number of plants for company Acme", {"operation": "count_plants", "company_name": "Acme"}),
+    (f"count plants of company {COMPANY_ID}", {"operation": "count_plants", "company_id": COMPANY_ID}),
+    ("Total emissions of Acme Steel", {"operation": "get_total_emissions", "company_name": "Acme Steel"}),
+    (
+        "What were the scope 1 emissions of plant Pune in FY 2023-24?",
+        {"operation": "get_total_emissions", "plant_name": "Pune", "financial_year": "2023-2024", "scope": "Scope 1"}
+    ),
+    (
+        "show me emissions for Acme in 2023/2024 for both scopes",
+        {"operation": "get_total_emissions", "company_name": "Acme", "financial_year": "2023-2024",
+         "scope": ["Scope 1", "Scope 2"]}
+    ),
+    (
+        f"ghg emissions of company {COMPANY_ID}",
+        {"operation": "get_total_emissions", "company_id": COMPANY_ID}
+    ),
+])
+def test_templated_questions_take_the_fast_path(message, query):
+    match = route_message(message)
+    assert match is not None
+    assert match.query == query
+
+
+@pytest.mark.parametrize("message", [
+    "How many plants do we have",
+    "How many plants does Acme have in each state",
+    "Total emissions of Acme over the last 3 years",
+    "emissions of Acme compared to Tata",
+    "emissions of Acme and Tata",
+    "emissions of Acme in 2023-25",
+    "emissions for Acme 2023/2024",
+    "How many plants does plant Pune have",
+    "Create a plant called Pune for Acme",
+    "emissions of a company whose name is far longer than any real company name would be",
+    "",
+])
+def test_other_questions_go_to_the_llm(message):
+    assert route_message(message) is None
+
+
+def test_the_fast_path_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(IntentRouter, "MCP_FAST_PATH", False)
+    assert route_message("How many plants does Acme Steel have?") is None
@@ -0,0 +1,70 @@
+"""The SQLite LLM response cache expires entries and evicts the least recently used ones over budget."""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from services import llm_cache
+from services.llm_cache import ResponseCache, SQLiteCacheBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Every time.time() call in the cache is one second after the previous one"""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def backend(tmp_path, **kwargs):
+    options = {"max_bytes": 1_000_000, "max_entries": 1_000}
+    options.update(kwargs)
+    return SQLiteCacheBackend(str(tmp_path / "cache.sqlite"), **options)
+
+
+def test_entries_over_the_budget_are_evicted_least_recently_read_first(tmp_path, clock):
+    cache = backend(tmp_path, max_entries=10)
+    for i in range(10):
+        cache.set(f"k{i}", f"v{i}", ttl=3600)
+    # Read stamps are still batched in memory when the next write evicts
+    assert cache.get("k0") == "v0"
+    cache.set("k10", "v10", ttl=3600)
+
+    assert cache.get("k1") is None
+    assert cache.get("k0") == "v0"
+    assert cache.get("k10") == "v10"
+    assert cache.stats()["entries"] == 10
+    assert cache.evictions == 1
+
+
+def test_entries_are_evicted_until_they_fit_the_byte_budget(tmp_path, clock):
+    cache = backend(tmp_path, max_bytes=100)
+    for i in range(4):
+        cache.set(f"k{i}", "x" * 30, ttl=3600)
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 100
+    assert cache.get("k0") is None
+    assert cache.get("k3") == "x" * 30
+    # A value larger than the whole budget is never stored
+    cache.set("huge", "x" * 101, ttl=3600)
+    assert cache.get("huge") is None
+
+
+def test_expired_entries_are_misses_and_are_removed_on_write(tmp_path, clock):
+    cache = backend(tmp_path)
+    cache.set("old", "v", ttl=2)
+    cache.set("new", "v", ttl=3600)
+    assert cache.get("old") is None
+    cache.set("newer", "v", ttl=3600)
+    assert cache.stats()["entries"] == 2
+
+
+def test_the_cache_file_is_shared_by_every_backend_that_opens_it(tmp_path):
+    writer, reader = backend(tmp_path), backend(tmp_path)
+    cache = ResponseCache(writer)
+    asyncio.run(cache.set("key", "answer"))
+
+    assert asyncio.run(ResponseCache(reader).get("key")) == "answer"
+    assert asyncio.run(cache.get("missing")) is None
+    assert (cache.hits, cache.misses) == (0, 1)
@@ -0,0 +1,167 @@
+"""Incremental C001 table roll-ups must match a full rebuild from every plant."""
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from services import aggregation_service
+from services.aggregation_queue import AggregationQueue
+from services.aggregation_service import AggregationService
+from services.question_index import QuestionIndex
+
+COMPANY_ID = "company-1"
+FY = "2024-2025"
+QUESTION_ID = "Q-ROLLUP"
+
+MODULE_DATA = {"submodules": [{"categories": [{"questions": [{
+    "id": QUESTION_ID,
+    "metadata": {
+        "type": "table",
+        "rows": [
+            {"parameter": "Electricity"},
+            {"parameter": "Fuel"},
+            {"parameter": "Total energy"},
+            {"parameter": "Energy intensity"},
+            {"parameter": "Water"},
+            {"parameter": "Total water"}
+        ]
+    }
+}]}]}]}
+
+PLANT_TABLES = {
+    "p001": ["10", "2.5", "0", "0.4", "1,000", "0"],
+    "p002": ["4", "", "0", "0.1", "250.75", "0"],
+    "p003": ["0", "7", "0", "0.9", "n/a", "0"],
+}
+
+
+def table(values, previous_offset=1.0):
+    rows = []
+    for value in values:
+        try:
+            previous = str(float(value.replace(",", "")) + previous_offset)
+        except ValueError:
+            previous = value
+        rows.append({"current_year": value, "previous_year": previous})
+    return rows
+
+
+@pytest.fixture
+def service(monkeypatch):
+    index = QuestionIndex.from_module_data(MODULE_DATA)
+    monkeypatch.setattr(aggregation_service, "get_question_index", lambda: index)
+    db = AsyncMongoMockClient()["rollup_test"]
+    return AggregationService(db)
+
+
+async def seed(db):
+    await db.plants.insert_many([
+        {"id": "c001", "company_id": COMPANY_ID, "plant_code": "C001", "plant_type": "C001"},
+        {"id": "p001", "company_id": COMPANY_ID, "plant_code": "P001", "plant_type": "P001"},
+        {"id": "p002", "company_id": COMPANY_ID, "plant_code": "P002", "plant_type": "regular"},
+        {"id": "p003", "company_id": COMPANY_ID, "plant_code": "P003", "plant_type": "regular"},
+    ])
+    await db.environment.insert_one({
+        "companyId": COMPANY_ID, "plantId": "c001", "financialYear": FY,
+        "answers": {QUESTION_ID: {"questionId": QUESTION_ID, "questionTitle": "Energy and water"}}
+    })
+    for plant_id, values in PLANT_TABLES.items():
+        await db.environment.insert_one({
+            "companyId": COMPANY_ID, "plantId": plant_id, "financialYear": FY,
+            "answers": {QUESTION_ID: {"questionId": QUESTION_ID, "updatedData": table(values)}}
+        })
+
+
+async def save_plant_table(service, plant_id, values):
+    """Store a plant's new table and apply its delta the way update_table_answer does"""
+    report = await service.collection.find_one({"plantId": plant_id, "financialYear": FY})
+    previous = report["answers"][QUESTION_ID]["updatedData"]
+    current = table(values)
+    await service.collection.update_one(
+        {"_id": report["_id"]},
+        {"$set": {f"answers.{QUESTION_ID}.updatedData": current}}
+    )
+    await service.aggregate_answers(
+        company_id=COMPANY_ID,
+        financial_year=FY,
+        question_id=QUESTION_ID,
+        question_title="Energy and water",
+        answer_data=current,
+        source_plant_id=plant_id,
+        previous_data=previous,
+        incremental=True
+    )
+
+
+async def c001_state(service):
+    report = await service.collection.find_one({"plantId": "c001", "financialYear": FY})
+    return report["answers"][QUESTION_ID], report["rollups"][QUESTION_ID]
+
+
+def test_incremental_deltas_match_full_rebuild(service):
+    async def run():
+        await seed(service.db)
+        await service.rebuild_table_rollup(COMPANY_ID, FY, QUESTION_ID, "Energy and water")
+
+        await save_plant_table(service, "p002", ["6", "1.25", "0", "0.2", "300", "0"])
+        await save_plant_table(service, "p003", ["", "7", "0", "0.9", "12", "0"])
+        await save_plant_table(service, "p001", ["10", "-0.5", "0", "0.4", "1,000.5", "0"])
+        await save_plant_table(service, "p002", ["6", "1.25", "0", "0.2", "300", "0"])  # No change
+
+        incremental_answer, incremental_shadow = await c001_state(service)
+        # One $inc per changed table: the deltas were applied, not rebuilt
+        assert incremental_shadow["version"] == 4
+        await service.rebuild_table_rollup(COMPANY_ID, FY, QUESTION_ID)
+        rebuilt_answer, rebuilt_shadow = await c001_state(service)
+
+        assert incremental_answer["updatedData"] == rebuilt_answer["updatedData"]
+        for key in ("current_year", "previous_year"):
+            assert incremental_shadow[key] == pytest.approx(rebuilt_shadow[key])
+        verification = await service.verify_table_rollup(COMPANY_ID, FY, QUESTION_ID)
+        assert verification["consistent"], verification["drift"]
+        # The first data row sums every plant; the total row sums its section
+        assert rebuilt_answer["updatedData"][0] == {"current_year": "16.00", "previous_year": "18.00"}
+        assert rebuilt_answer["updatedData"][2]["current_year"] == "23.75"
+
+    asyncio.run(run())
+
+
+def test_rebuild_without_title_keeps_stored_title(service):
+    async def run():
+        await seed(service.db)
+        await service.rebuild_table_rollup(COMPANY_ID, FY, QUESTION_ID)
+        answer, _ = await c001_state(service)
+        assert answer["questionTitle"] == "Energy and water"
+        assert answer["updatedData"][4]["current_year"] == "1250.75"
+
+    asyncio.run(run())
+
+
+def test_failed_delta_is_repaired_by_a_rebuild(service, monkeypatch):
+    async def fail(**kwargs):
+        raise RuntimeError("delta lost")
+
+    async def run():
+        await seed(service.db)
+        await service.rebuild_table_rollup(COMPANY_ID, FY, QUESTION_ID, "Energy and water")
+        monkeypatch.setattr(service, "apply_table_delta", fail)
+
+        queue = AggregationQueue(service.db)
+        queue.aggregation_service = service
+        report = await service.collection.find_one({"plantId": "p002", "financialYear": FY})
+        previous = report["answers"][QUESTION_ID]["updatedData"]
+        current = table(["6", "1.25", "0", "0.2", "300", "0"])
+        await service.collection.update_one(
+            {"_id": report["_id"]},
+            {"$set": {f"answers.{QUESTION_ID}.updatedData": current}}
+        )
+        queue.submit(COMPANY_ID, FY, QUESTION_ID, "Energy and water", current, "p002", previous, incremental=True)
+        await queue.flush()
+
+        assert queue.status()["repaired"] == 1
+        verification = await service.verify_table_rollup(COMPANY_ID, FY, QUESTION_ID)
+        assert verification["consistent"], verification["drift"]
+        answer, _ = await c001_state(service)
+        assert answer["updatedData"][0]["current_year"] == "16.00"
+
+    asyncio.run(run())
@@ -948,7 +948,8 @@ export const apiSlice = createApi({
         const formData = new FormData();
         formData.append('file', file);
         return {
-          url: '/rag/upload/',
+          // Wait for indexing so the returned file_id is ready to query
+          url: '/rag/upload/?wait=true',
           method: 'POST',
           body: formData,
         };